@@ -1,10 +1,55 @@
+from .async_caldav import AsyncCalDavCalendar
 from .caldav_code import CalDavCalendar
+from .connection import CONNECTION_ERRORS, DEFAULT_CONNECT_TIMEOUT, DEFAULT_POOL_SIZE, DEFAULT_READ_TIMEOUT
+from .discovery_cache import DiscoveryCache
+from .event_cache import EventCache
+from .payload_log import enable_payload_logging
+from .prefetch import EventPrefetcher
+from .tracing import MetricsServer, tracer
 import datetime
 from mycroft.util.time import default_timezone
-from mycroft.util.parse import extract_datetime, extract_number
+from mycroft.util.parse import extract_datetime, extract_duration, extract_number
 from mycroft import MycroftSkill, intent_file_handler
 import os
+import threading
 from datetime import timedelta
+from functools import wraps
+
+# seconds between two synchronizations that keep the connection and the event stores warm
+KEEP_WARM_INTERVAL = 60
+# number of free slots that are suggested
+SLOT_SUGGESTIONS = 3
+# days searched for a free slot if the user names no period
+SLOT_SEARCH_DAYS = 7
+
+
+def traced_intent(handler):
+    """
+    Decorator for intent handlers, tags the tracing spans of the handler with its name
+    """
+    @wraps(handler)
+    def wrapper(self, message):
+        with tracer.intent(handler.__name__):
+            return handler(self, message)
+    return wrapper
+
+
+def requires_calendar(handler):
+    """
+    Decorator for intent handlers that use the calendar. Waits for a connect running in the background or
+    connects first, and tells the user if no calendar can be opened or the server is not reachable.
+    """
+    @wraps(handler)
+    def wrapper(self, message):
+        with tracer.intent(handler.__name__):
+            if not self.ensure_calendar():
+                return
+            try:
+                return handler(self, message)
+            except CONNECTION_ERRORS as e:
+                self.log.error(f"Calendar server is not reachable: {e}")
+                self.speak_dialog('connect.failed')
+    return wrapper
 
 
 class SiCalendar(MycroftSkill):
@@ -16,47 +61,207 @@ class SiCalendar(MycroftSkill):
     def __init__(self):
         MycroftSkill.__init__(self)
         self.caldav_instance = None
+        # runs calendar requests in the background, e.g. while the user answers a prompt
+        self.async_instance = None
+        # events of the days a dialog will likely ask for, fetched while the user answers
+        self.prefetcher = None
+        # credentials and connection settings of the open calendar instance
+        self.connection_settings = None
         self.timezone = None
+        # events of the calendars persisted across restarts of the skill
+        self.event_cache = None
+        # serializes connecting, handlers wait for a connect running in the background
+        self.connect_lock = threading.Lock()
+        # serves the span histograms if tracing and a metrics port are configured
+        self.metrics_server = None
 
     def initialize(self):
         self.timezone = default_timezone()
+        self.event_cache = EventCache(os.path.join(self.file_system.path, 'events.sqlite'))
+        self.settings_change_callback = self.on_settings_changed
+        self.configure_logging()
+        self.configure_tracing()
+        self.connect_in_background()
+        self.schedule_repeating_event(self.keep_warm, None, KEEP_WARM_INTERVAL, name='KeepCalendarWarm')
+
+    def on_settings_changed(self):
+        """
+        Reconnects with the changed credentials or connection settings
+        """
+        self.configure_logging()
+        self.configure_tracing()
+        self.connect_in_background()
 
-    @intent_file_handler('connect.calendar.intent')
-    def connect_calendar(self, message):
+    def configure_logging(self):
         """
-        Creates connection to NextCloud calendar when user calls "Connect my calendar"
-        Reads credentials from a text file on the raspberry pi /mycroft-core/credentials
+        Switches the dumps of the ical payloads (PAYLOAD log level, see payload_log) on or off.
+        Without them only counts and timings of the requests are logged.
         """
-        path = os.path.join(self.file_system.path, "../../../../mycroft-core/credentials")
-        path_to_file = os.path.join(path, "nextcloud.txt")
-        if os.path.isfile(path_to_file):
-            f = open(path_to_file, "r")
-            username = f.readline()
-            username = username.strip()
-            password = f.readline()
-            password = password.strip()
+        enable_payload_logging(bool(self.settings.get('log_payloads')))
+
+    def configure_tracing(self):
+        """
+        Switches the tracing spans on or off as configured in the settings. The histograms are written to
+        spans.json in the file system of the skill and, if a metrics port is configured, served at
+        http://127.0.0.1:<port>/metrics
+        """
+        if self.settings.get('tracing'):
+            tracer.enable()
         else:
-            f = open(path_to_file, "w")
-            f.close()
+            tracer.disable()
+        port = int(self.settings.get('metrics_port') or 0) if self.settings.get('tracing') else 0
+        if self.metrics_server is not None and self.metrics_server.httpd.server_address[1] != port:
+            self.metrics_server.close()
+            self.metrics_server = None
+        if port and self.metrics_server is None:
+            try:
+                self.metrics_server = MetricsServer(tracer, port)
+            except OSError as e:
+                self.log.error(f"Metrics endpoint could not be opened on port {port}: {e}")
+
+    def export_spans(self):
+        if tracer.enabled:
+            tracer.export(os.path.join(self.file_system.path, 'spans.json'))
+
+    def connect_in_background(self):
+        """
+        Connects to the calendar in a background thread, so the first query does not wait for the
+        connection and the discovery of the calendars
+        """
+        threading.Thread(target=self.connect, name='caldav-connect', daemon=True).start()
+
+    def keep_warm(self):
+        """
+        Synchronizes the event stores in the background, which keeps the pooled connections alive and
+        the stores up to date. Retries to connect if the calendar could not be opened yet, e.g. because
+        the network was not up at startup.
+        """
+        caldav_instance = self.caldav_instance
+        if caldav_instance is not None:
+            caldav_instance.refresh_in_background()
+        elif not self.connect_lock.locked():
+            self.connect_in_background()
+        self.export_spans()
+
+    def ensure_calendar(self):
+        """
+        Makes sure a calendar instance is open, waits for a connect running in the background
+
+        Returns:
+            :return: true if the calendar is open, otherwise the user was told why it is not
+        """
+        if self.connect():
+            return True
+        if self.read_credentials() is None:
             self.speak_dialog('missing.credentials')
+        else:
+            self.speak_dialog('connect.failed')
+        return False
 
+    def connect(self):
+        """
+        Opens the calendar with the credentials of the settings or the credentials file. An open instance and
+        its kept-alive connections are kept if credentials and connection settings did not change.
+        A new instance is restored from the event cache and synchronized in the background. It replaces the
+        old instance before that is closed, so handlers never find the calendar missing during a reconnect;
+        handlers that are in a dialog keep using the instance they started with.
+
+        Returns:
+            :return: true if a calendar instance is open
+        """
+        with self.connect_lock:
+            credentials = self.read_credentials()
+            if credentials is None:
+                self.close_calendar()
+                return False
+            settings = (credentials, self.calendar_options())
+            if self.caldav_instance is not None and self.connection_settings == settings:
+                return True
+            try:
+                with tracer.span('connect'):
+                    caldav_instance = self.create_calendar(*credentials)
+            except Exception as e:
+                self.log.error(f"Calendar could not be opened: {e}")
+                self.close_calendar()
+                return False
+            previous = self.caldav_instance, self.async_instance
+            self.caldav_instance = caldav_instance
+            self.async_instance = AsyncCalDavCalendar(caldav_instance)
+            self.prefetcher = EventPrefetcher(self.async_instance)
+            self.connection_settings = settings
+            self.close_instances(*previous)
+            self.log.info(f"Opened the calendars {self.caldav_instance.calendars} of user {credentials[0]}")
+            # answer the first queries from the events cached by the last run and synchronize meanwhile
+            if self.caldav_instance.restore_cache():
+                self.log.info("Restored the events from the event cache")
+            self.caldav_instance.refresh_in_background()
+            return True
+
+    def read_credentials(self):
+        """
+        Reads username and password from the skill settings or, if they are empty, from a text file
+        on the raspberry pi /mycroft-core/credentials
+
+        Returns:
+            :return: (username, password) or None if no complete credentials are found
+        """
+        username = (self.settings.get('username') or '').strip()
+        password = (self.settings.get('password') or '').strip()
+        if username and password:
+            return username, password
+        path = os.path.join(self.file_system.path, "../../../../mycroft-core/credentials")
+        path_to_file = os.path.join(path, "nextcloud.txt")
+        if not os.path.isfile(path_to_file):
+            return None
+        with open(path_to_file, "r") as f:
+            username = f.readline().strip()
+            password = f.readline().strip()
         if not username or not password:
+            return None
+        return username, password
+
+    def calendar_options(self):
+        """
+        Returns the connection settings of the skill as keyword arguments of CalDavCalendar
+        """
+        pool_size = int(self.settings.get('pool_size') or DEFAULT_POOL_SIZE)
+        timeout = (float(self.settings.get('connect_timeout') or DEFAULT_CONNECT_TIMEOUT),
+                   float(self.settings.get('read_timeout') or DEFAULT_READ_TIMEOUT))
+        # comma separated names of the calendars to read, all calendars if empty
+        calendar_names = tuple(name.strip() for name in (self.settings.get('calendar_names') or '').split(',')
+                               if name.strip()) or None
+        # url of the CalDAV server, the NextCloud server of the lab if empty
+        url = (self.settings.get('caldav_url') or '').strip() or None
+        return {'pool_size': pool_size, 'timeout': timeout, 'calendar_names': calendar_names, 'url': url}
+
+    @intent_file_handler('connect.calendar.intent')
+    @traced_intent
+    def connect_calendar(self, message):
+        """
+        Creates connection to NextCloud calendar when user calls "Connect my calendar".
+        The skill connects on its own at startup, the intent reconnects e.g. after the credentials file changed.
+        """
+        credentials = self.read_credentials()
+        if credentials is None:
+            path = os.path.join(self.file_system.path, "../../../../mycroft-core/credentials", "nextcloud.txt")
+            if not os.path.isfile(path):
+                f = open(path, "w")
+                f.close()
             self.speak_dialog('missing.credentials')
-        else:
-            self.caldav_instance = CalDavCalendar(username, password)
+        elif self.ensure_calendar():
+            username = credentials[0]
             self.speak_dialog('connect.successful', {'username': username})
             self.log.info(f"Successfully created CalDavCalendar instance with username {username}")
-            self.log.info(self.caldav_instance.calendar)
 
     @intent_file_handler('calendar.si.next.appointment.intent')
+    @requires_calendar
     def get_next_appointment(self, message):
         """
         Handler to get next appointment of the current user.
         """
         event_list, events = self.caldav_instance.fetch_next_n_events(1)
-        self.log.info("Next event (list): ", event_list)
+        self.log.info(f"Found {len(event_list)} next events")
         if event_list:
-            self.log.info("Summary of next appointment: ", event_list[0].summary)
             date_response = event_list[0].date_response
             self.speak_dialog('calendar.si.next.appointment', {'summary': event_list[0].summary,
                                                                'date_response': date_response})
@@ -64,6 +269,7 @@ class SiCalendar(MycroftSkill):
             self.speak_dialog('calendar.si.no.planned.events')
 
     @intent_file_handler('calendar.si.next.appointment.number.intent')
+    @requires_calendar
     def get_next_n_appointments(self, message):
         """
         Handler to get the next n appointments of the user.
@@ -71,7 +277,7 @@ class SiCalendar(MycroftSkill):
         """
         number = extract_number(message.data.get('number'))
         parsed_events_list, events_list = self.caldav_instance.fetch_next_n_events(number)
-        self.log.info(f"Next {number} events (list):  {events_list}")
+        self.log.info(f"Found {len(events_list)} of the next {number} events")
         if parsed_events_list:
             self.speak_dialog('calendar.si.next.appointment.number', {'number': number})
             for parsed_event in parsed_events_list:
@@ -86,19 +292,21 @@ class SiCalendar(MycroftSkill):
             self.speak_dialog('calendar.si.no.planned.events')
 
     @intent_file_handler('calendar.si.appointment.date.intent')
+    @requires_calendar
     def get_appointment_date(self, message):
         """
         Handler to get the next appointment on a specific date.
         The given date is parsed with extract_datetime and can be a weekday or a specific date e.g. March, 26th 2022
         """
+        caldav_instance = self.caldav_instance
         self.log.info(f"Calling get_appointment_date")
         input_date = message.data.get('date')
         parsed_date = extract_datetime(input_date)
         while parsed_date is None:
             parsed_date = self.get_response('calendar.si.repeat.date')
 
-        parsed_events, events = self.caldav_instance.fetch_events_for_date(parsed_date[0])
-        self.log.info(f"Events on given date: {events}")
+        parsed_events, events = caldav_instance.fetch_events_for_date(parsed_date[0])
+        self.log.info(f"Found {len(events)} events on the given date")
         if events:
             self.speak_dialog('calendar.si.appointment.date', {'date': parsed_events[0].date_response})
             for parsed_event in parsed_events:
@@ -112,6 +320,7 @@ class SiCalendar(MycroftSkill):
             self.speak_dialog('calendar.si.no.planned.events')
 
     @intent_file_handler('calendar.si.create.event.intent')
+    @requires_calendar
     def create_event_mycroft(self, message):
         """
         This method is used to activate the create.event.intent by voice input via Mycroft and execute the dialog
@@ -120,8 +329,10 @@ class SiCalendar(MycroftSkill):
         It is possible to create a fullday event as well as one for a specific time.
         The attributes title, date, full_day, start_time and end_time can be set by voice input.
         """
+        caldav_instance = self.caldav_instance
+        prefetcher = self.prefetcher
 
-        self.log.info("Create_event Dialog startet with message: ", message)
+        self.log.info("Create_event dialog started")
         # asking for the event title
         event_title = self.get_response('calendar.si.ask.title')
         self.log.info(f"Get event title: {event_title}")
@@ -133,7 +344,7 @@ class SiCalendar(MycroftSkill):
             spoken_date = self.get_response('calendar.si.ask.date')
             self.log.info(f"Get Spoken Date: {spoken_date}")
             # extract the datetime with mycrofts extract_datetime() method
-            date = extract_datetime(spoken_date, datetime.datetime.today())
+            date = extract_datetime(spoken_date, caldav_instance.now().replace(tzinfo=None))
 
 
         date, date_str = date
@@ -156,7 +367,7 @@ class SiCalendar(MycroftSkill):
 
             # create a parsed event object, to use it for the spoken dialog
 
-            events = self.caldav_instance.create_parsed_events(event_title, begin_time, end_time)
+            events = caldav_instance.create_parsed_events(event_title, begin_time, end_time)
 
             # check if the fullday event should be created
 
@@ -188,7 +399,7 @@ class SiCalendar(MycroftSkill):
 
             self.log.info(f"End: {end_time}")
 
-            events = self.caldav_instance.create_parsed_events(event_title, begin_time, end_time)
+            events = caldav_instance.create_parsed_events(event_title, begin_time, end_time)
 
             confirmation = self.ask_yesno('calendar.si.check.event.to.add',
                                           {'event_title': events[0].summary,
@@ -203,7 +414,8 @@ class SiCalendar(MycroftSkill):
             self.log.info("Create event ")
             self.log.info(f"Type of Begin:{type(begin_time)}")
             self.log.info(f"Type of End:{type(end_time)}")
-            self.caldav_instance.add_event(event_title, begin_time, end_time, None, fullday)
+            caldav_instance.add_event(event_title, begin_time, end_time, None, fullday)
+            prefetcher.invalidate()
             self.speak_dialog('calendar.si.success.add.event')
 
         elif confirmation == 'no' and confirm_count <= 3:
@@ -216,63 +428,83 @@ class SiCalendar(MycroftSkill):
             self.log.info("I did not catch your answer")
 
     @intent_file_handler('calendar.si.remove.last.event.intent')
+    @requires_calendar
     def remove_last_event_mycroft(self, message):
         """
             Handler to remove the last appointment of the current user
         """
-        parsed_events, events = self.caldav_instance.fetch_last_n_events(1)
+        caldav_instance = self.caldav_instance
+        prefetcher = self.prefetcher
+        parsed_events, events = caldav_instance.fetch_last_n_events(1)
         if len(events) > 0:
             event = events[0]
             parsed_event = parsed_events[0]
             answer = self.ask_yesno('calendar.si.check.event.to.remove',
                                     {'event_title': parsed_event.summary, 'dateResponse': parsed_event.date_response})
             if answer == "yes" or answer == 'I confirm':
-                self.caldav_instance.remove_events([event])
-                self.speak_dialog('calendar.si.event.was.removed',
-                                  {'event_title': parsed_event.summary, 'dateResponse': parsed_event.date_response})
+                results = caldav_instance.remove_events([event])
+                prefetcher.invalidate()
+                if results[0].ok:
+                    self.speak_dialog('calendar.si.event.was.removed',
+                                      {'event_title': parsed_event.summary,
+                                       'dateResponse': parsed_event.date_response})
+                else:
+                    self.speak_dialog('calendar.si.event.was.not.removed')
             else:
                 self.speak_dialog('calendar.si.event.was.not.removed')
         else:
             self.speak_dialog('calendar.si.no.planned.events')
 
     @intent_file_handler('calendar.si.remove.next.event.intent')
+    @requires_calendar
     def remove_next_event_mycroft(self, message):
         """
             Handler to remove the next appointment of the current user
         """
-        parsed_events, events = self.caldav_instance.fetch_next_n_events(1)
+        caldav_instance = self.caldav_instance
+        prefetcher = self.prefetcher
+        parsed_events, events = caldav_instance.fetch_next_n_events(1)
         if len(events) > 0:
             event = events[0]
             parsed_event = parsed_events[0]
             answer = self.ask_yesno('calendar.si.check.event.to.remove',
                                     {'event_title': parsed_event.summary, 'dateResponse': parsed_event.date_response})
             if answer == "yes" or answer == "I confirm":
-                self.caldav_instance.remove_events([event])
-                self.speak_dialog('calendar.si.event.was.removed',
-                                  {'event_title': parsed_event.summary, 'dateResponse': parsed_event.date_response})
+                results = caldav_instance.remove_events([event])
+                prefetcher.invalidate()
+                if results[0].ok:
+                    self.speak_dialog('calendar.si.event.was.removed',
+                                      {'event_title': parsed_event.summary,
+                                       'dateResponse': parsed_event.date_response})
+                else:
+                    self.speak_dialog('calendar.si.event.was.not.removed')
             else:
                 self.speak_dialog('calendar.si.event.was.not.removed')
         else:
             self.speak_dialog('calendar.si.no.planned.events')
 
     @intent_file_handler('calendar.si.remove.event.intent')
+    @requires_calendar
     def remove_event_date(self, message):
         """
             Handler to remove an appointment of the current user for a specific date
         """
+        caldav_instance = self.caldav_instance
+        prefetcher = self.prefetcher
         self.log.info(f"Remove event")
+        prefetcher.prefetch_upcoming(datetime.datetime.now(caldav_instance.zone))
 
         date = None
         while date is None:
             spoken_date = self.get_response('calendar.si.ask.date.delete')
             self.log.info(f"Get Spoken Date: {spoken_date}")
-            date = extract_datetime(spoken_date, datetime.datetime.today())
+            date = extract_datetime(spoken_date, caldav_instance.now().replace(tzinfo=None))
 
         date, date_str = date
 
         self.log.info(f"Get Parsed Date:{date}")
-        parsed_events, events = self.caldav_instance.fetch_events_for_date(date)
-        self.log.info(f"Events on given date: {events}")
+        parsed_events, events = prefetcher.fetch_events_for_date(date)
+        self.log.info(f"Found {len(events)} events on the given date")
         if events:
             self.speak_dialog('calendar.si.appointment.date', {'date': parsed_events[0].date_response})
             index = 0
@@ -295,15 +527,21 @@ class SiCalendar(MycroftSkill):
             answer = self.ask_yesno('calendar.si.check.event.to.remove',
                                     {'event_title': parsed_event.summary, 'dateResponse': parsed_event.date_response})
             if answer == "yes" or answer == "I confirm":
-                self.caldav_instance.remove_events([event])
-                self.speak_dialog('calendar.si.event.was.removed',
-                                  {'event_title': parsed_event.summary, 'dateResponse': parsed_event.date_response})
+                results = caldav_instance.remove_events([event])
+                prefetcher.invalidate()
+                if results[0].ok:
+                    self.speak_dialog('calendar.si.event.was.removed',
+                                      {'event_title': parsed_event.summary,
+                                       'dateResponse': parsed_event.date_response})
+                else:
+                    self.speak_dialog('calendar.si.event.was.not.removed')
             else:
                 self.speak_dialog('calendar.si.event.was.not.removed')
         else:
             self.speak_dialog('calendar.si.no.planned.events')
 
     @intent_file_handler('calendar.si.rename.event.intent')
+    @requires_calendar
     def rename_event_date(self, message):
         """
         Handler to rename an existing event in the calendar.
@@ -311,8 +549,11 @@ class SiCalendar(MycroftSkill):
         The user can choose the event by saying the index of the desired event.
         After confirming the new name, the event will be renamed.
         """
+        caldav_instance = self.caldav_instance
+        prefetcher = self.prefetcher
 
         self.log.info(f"Rename event")
+        prefetcher.prefetch_upcoming(datetime.datetime.now(caldav_instance.zone))
 
         date = None
 
@@ -321,13 +562,13 @@ class SiCalendar(MycroftSkill):
         while date is None:
             spoken_date = self.get_response('calendar.si.ask.date.rename')
             self.log.info(f"Get Spoken Date: {spoken_date}")
-            date = extract_datetime(spoken_date, datetime.datetime.today())
+            date = extract_datetime(spoken_date, caldav_instance.now().replace(tzinfo=None))
             self.log.info(f"Get Parsed Date:{date}")
 
         # fetch all events for the spoken_date
         date, date_str = date
-        parsed_events, events = self.caldav_instance.fetch_events_for_date(date)
-        self.log.info(f"Events on given date: {events}")
+        parsed_events, events = prefetcher.fetch_events_for_date(date)
+        self.log.info(f"Found {len(events)} events on the given date")
         if events:
             # mycroft should list all events for the spoken_date by index. So the user can choose the event to rename easily.
             self.speak_dialog('calendar.si.appointment.date', {'date': parsed_events[0].date_response})
@@ -363,9 +604,12 @@ class SiCalendar(MycroftSkill):
                                         {'old_title': parsed_event.summary, 'event_title': new_title})
 
                 if answer == "yes" or answer == "I confirm":
-                    self.caldav_instance.rename_event(event, new_title)
-
-                    self.speak_dialog('calendar.si.event.success.renamed')
+                    result = caldav_instance.rename_event(event, new_title)
+                    prefetcher.invalidate()
+                    if result.ok:
+                        self.speak_dialog('calendar.si.event.success.renamed')
+                    else:
+                        self.speak_dialog('calendar.si.event.was.not.renamed')
                 else:
                     self.speak_dialog('calendar.si.event.was.not.renamed')
             else:
@@ -373,9 +617,227 @@ class SiCalendar(MycroftSkill):
         else:
             self.speak_dialog('calendar.si.no.planned.events')
 
+    @intent_file_handler('calendar.si.remove.named.event.intent')
+    @requires_calendar
+    def remove_named_event(self, message):
+        """
+        Handler to remove the next appointment with a given title, e.g. "delete my dentist appointment".
+        The calendar is searched by title instead of listing the events of a day.
+        """
+        caldav_instance = self.caldav_instance
+        prefetcher = self.prefetcher
+        title = message.data.get('title')
+        parsed_events, events = self.find_named_event(caldav_instance, title)
+        self.log.info(f"Found {len(events)} events with title {title}")
+        if events:
+            event = events[0]
+            parsed_event = parsed_events[0]
+            answer = self.ask_yesno('calendar.si.check.event.to.remove',
+                                    {'event_title': parsed_event.summary, 'dateResponse': parsed_event.date_response})
+            if answer == "yes" or answer == "I confirm":
+                results = caldav_instance.remove_events([event])
+                prefetcher.invalidate()
+                if results[0].ok:
+                    self.speak_dialog('calendar.si.event.was.removed',
+                                      {'event_title': parsed_event.summary,
+                                       'dateResponse': parsed_event.date_response})
+                else:
+                    self.speak_dialog('calendar.si.event.was.not.removed')
+            else:
+                self.speak_dialog('calendar.si.event.was.not.removed')
+        else:
+            self.speak_dialog('calendar.si.no.event.with.title', {'title': title})
+
+    @intent_file_handler('calendar.si.rename.named.event.intent')
+    @requires_calendar
+    def rename_named_event(self, message):
+        """
+        Handler to rename the next appointment with a given title, e.g. "rename my dentist appointment"
+        """
+        caldav_instance = self.caldav_instance
+        prefetcher = self.prefetcher
+        title = message.data.get('title')
+        parsed_events, events = self.find_named_event(caldav_instance, title)
+        self.log.info(f"Found {len(events)} events with title {title}")
+        if events:
+            event = events[0]
+            parsed_event = parsed_events[0]
+            answer = self.ask_yesno('calendar.si.check.event.rename',
+                                    {'event_title': parsed_event.summary, 'dateResponse': parsed_event.date_response})
+            if answer == "yes" or answer == "I confirm":
+                new_title = self.get_response('calendar.si.ask.new.title')
+
+                answer = self.ask_yesno('calendar.si.check.new.title',
+                                        {'old_title': parsed_event.summary, 'event_title': new_title})
+
+                if answer == "yes" or answer == "I confirm":
+                    result = caldav_instance.rename_event(event, new_title)
+                    prefetcher.invalidate()
+                    if result.ok:
+                        self.speak_dialog('calendar.si.event.success.renamed')
+                    else:
+                        self.speak_dialog('calendar.si.event.was.not.renamed')
+                else:
+                    self.speak_dialog('calendar.si.event.was.not.renamed')
+            else:
+                self.speak_dialog('calendar.si.event.was.not.renamed')
+        else:
+            self.speak_dialog('calendar.si.no.event.with.title', {'title': title})
+
+    def find_named_event(self, caldav_instance, title):
+        """
+        Finds the event a named intent refers to. "next" and "last" are not titles, "cancel my next appointment"
+        means the next event and "delete my last dentist appointment" the latest past event titled dentist.
+
+        Args:
+            :param caldav_instance: CalDavCalendar the dialog started with
+            :param title: title of the intent
+
+        Returns:
+            :return: two lists with at most one event
+        """
+        words = (title or '').split()
+        position = words[0].lower() if words else None
+        if position == 'next':
+            if len(words) == 1:
+                return caldav_instance.fetch_next_n_events(1)
+            title = ' '.join(words[1:])
+        elif position == 'last':
+            if len(words) == 1:
+                return caldav_instance.fetch_last_n_events(1)
+            now = caldav_instance.now()
+            parsed_events, events = caldav_instance.search_events(' '.join(words[1:]),
+                                                                  now - caldav_instance.SEARCH_HORIZON, now)
+            return parsed_events[-1:], events[-1:]
+        return caldav_instance.search_events(title, limit=1)
+
+    @intent_file_handler('calendar.si.free.time.intent')
+    @requires_calendar
+    def get_free_time(self, message):
+        """
+        Handler to list the free times of the user on a date, e.g. "When am I free on Tuesday?"
+        """
+        caldav_instance = self.caldav_instance
+        parsed_date = extract_datetime(message.data.get('date', ''))
+        while parsed_date is None:
+            spoken_date = self.get_response('calendar.si.repeat.date')
+            if spoken_date is None:
+                return
+            parsed_date = extract_datetime(spoken_date)
+
+        now = datetime.datetime.now(caldav_instance.zone)
+        start = caldav_instance.localize(parsed_date[0].replace(hour=0, minute=0, second=0, microsecond=0))
+        end = start + timedelta(days=1)
+        free_times = caldav_instance.fetch_free_times(max(start, now), end) if end > now else []
+        date_response = free_times[0].date_response if free_times else None
+        self.log.info(f"Found {len(free_times)} free times on {start.date()}")
+        if free_times:
+            self.speak_dialog('calendar.si.free.time.date', {'date': date_response})
+            for free_time in free_times:
+                self.speak_dialog('calendar.si.free.time', {'time': free_time.time})
+        else:
+            self.speak_dialog('calendar.si.no.free.time')
+
+    @intent_file_handler('calendar.si.find.slot.intent')
+    @requires_calendar
+    def find_free_slot(self, message):
+        """
+        Handler to find free slots of a given length, e.g. "Find a 1-hour slot this week".
+        Without a period the next SLOT_SEARCH_DAYS days are searched.
+        """
+        caldav_instance = self.caldav_instance
+        duration = None
+        spoken_duration = message.data.get('duration')
+        while duration is None:
+            if spoken_duration:
+                duration = extract_duration(spoken_duration.replace('-', ' '))[0]
+            if duration is None:
+                spoken_duration = self.get_response('calendar.si.ask.duration')
+                if spoken_duration is None:
+                    return
+
+        start, end = self.search_period(caldav_instance, message.data.get('period'))
+        slots = caldav_instance.find_free_slots(duration, start, end, SLOT_SUGGESTIONS)
+        self.log.info(f"Found {len(slots)} free slots of {duration} between {start} and {end}")
+        if slots:
+            for slot in slots:
+                self.speak_dialog('calendar.si.free.slot', {'date': slot.date_response, 'time': slot.time})
+        else:
+            self.speak_dialog('calendar.si.no.free.slot', {'duration': spoken_duration})
+
+    def search_period(self, caldav_instance, period):
+        """
+        Returns the time range of a spoken period: "this week" ends on Sunday, "next week" is the whole
+        next week and a date is that day. Without a period the next SLOT_SEARCH_DAYS days are used.
+
+        Args:
+            :param caldav_instance: CalDavCalendar the dialog started with
+            :param period: spoken period, e.g. "this week", or None
+
+        Returns:
+            :return: aware start and end datetime
+        """
+        now = datetime.datetime.now(caldav_instance.zone)
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        monday = today - timedelta(days=today.weekday())
+        if period and 'next week' in period:
+            return monday + timedelta(days=7), monday + timedelta(days=14)
+        if period and 'week' in period:
+            return now, monday + timedelta(days=7)
+        parsed_date = extract_datetime(period) if period else None
+        if parsed_date is not None:
+            start = caldav_instance.localize(parsed_date[0].replace(hour=0, minute=0, second=0,
+                                                                          microsecond=0))
+            return max(start, now), start + timedelta(days=1)
+        return now, now + timedelta(days=SLOT_SEARCH_DAYS)
+
+    def create_calendar(self, username, password):
+        """
+        Creates the CalDavCalendar instance with the connection settings of the skill
+        """
+        options = self.calendar_options()
+        discovery_cache = DiscoveryCache(os.path.join(self.file_system.path, 'discovery.json'))
+        calendar_names = options['calendar_names']
+        return CalDavCalendar(username, password, pool_size=options['pool_size'], timeout=options['timeout'],
+                              discovery_cache=discovery_cache,
+                              calendar_names=list(calendar_names) if calendar_names else None,
+                              zone=self.timezone or default_timezone(), event_cache=self.event_cache,
+                              url=options['url'])
+
+    def close_calendar(self):
+        """
+        Closes the connections of the current CalDavCalendar instance
+        """
+        previous = self.caldav_instance, self.async_instance
+        self.prefetcher = None
+        self.async_instance = None
+        self.caldav_instance = None
+        self.close_instances(*previous)
+
+    def close_instances(self, caldav_instance, async_instance):
+        """
+        Closes a CalDavCalendar instance and the AsyncCalDavCalendar wrapping it, either can be None
+        """
+        if async_instance is not None:
+            async_instance.close()
+        if caldav_instance is not None:
+            caldav_instance.close()
+
     def stop(self):
         pass
 
+    def shutdown(self):
+        self.cancel_scheduled_event('KeepCalendarWarm')
+        self.export_spans()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+            self.metrics_server = None
+        with self.connect_lock:
+            self.close_calendar()
+        if self.event_cache is not None:
+            self.event_cache.close()
+            self.event_cache = None
+
 
 def create_skill():
     return SiCalendar()
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import threading
+from datetime import timedelta
+from functools import partial
+
+from .tracing import ContextExecutor
+
+
+class AsyncCalDavCalendar:
+    """
+    Asyncio variant of CalDavCalendar with the same operations as coroutines.
+    The caldav library is blocking, so each request runs in a worker thread of the event loop and only
+    the waiting for the server overlaps. The event loop runs in its own thread: the synchronous intent
+    handlers start a coroutine with submit, e.g. before a get_response prompt, and collect its result
+    when they need it.
+    """
+
+    def __init__(self, calendar):
+        """
+        Args:
+            :param calendar: CalDavCalendar that sends the requests
+        """
+        self.calendar = calendar
+        # the workers run in the context of the coroutine, so their spans keep the intent of the handler
+        self.executor = ContextExecutor(max_workers=calendar.pool_size, thread_name_prefix='caldav-async')
+        self.loop = asyncio.new_event_loop()
+        self.loop.set_default_executor(self.executor)
+        self.thread = threading.Thread(target=self.loop.run_forever, name='caldav-loop', daemon=True)
+        self.thread.start()
+
+    def submit(self, coroutine):
+        """
+        Starts a coroutine on the event loop without waiting for it
+
+        Args:
+            :param coroutine: coroutine of this class, e.g. fetch_events_for_date(date)
+
+        Returns:
+            :return: concurrent.futures.Future, its result() waits for the coroutine
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def close(self):
+        """
+        Stops the event loop and its worker threads. The CalDavCalendar is not closed.
+        Coroutines that are still running are cancelled first, so a handler waiting for the future of
+        submit is not blocked forever (its result() raises CancelledError).
+        """
+        try:
+            asyncio.run_coroutine_threadsafe(self.cancel_tasks(), self.loop).result(timeout=5)
+        except Exception as e:
+            logging.error(f"Running coroutines could not be cancelled: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        if not self.thread.is_alive():
+            self.loop.close()
+        self.executor.shutdown(wait=False)
+
+    async def cancel_tasks(self):
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def run(self, function, *args):
+        """
+        Runs a blocking function of the CalDavCalendar in a worker thread
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, partial(function, *args))
+
+    async def fetch_events(self, start_time, end_time, reverse_sorted=False, limit=None, only_starting=False):
+        """
+        Fetches the events of all calendars in the given time interval, see CalDavCalendar.fetch_events.
+        Each calendar is fetched and parsed in its own worker thread.
+
+        Returns:
+            :return: two lists of sorted events
+        """
+        calendar = self.calendar
+        per_calendar = await asyncio.gather(*(
+            self.run(calendar.fetch_calendar_events, source, start_time, end_time, reverse_sorted, limit,
+                     only_starting)
+            for source in calendar.sources()))
+        return calendar.merge_events(per_calendar, reverse_sorted, limit)
+
+    async def fetch_events_for_date(self, date):
+        """
+        Fetches all events for a date, see CalDavCalendar.fetch_events_for_date
+
+        Returns:
+            :return: two lists of events
+        """
+        end_date = date + timedelta(hours=23, minutes=59, seconds=59)
+        return await self.fetch_events(date, end_date)
+
+    async def iter_events(self, limit=None, reverse=False):
+        """
+        Asynchronous variant of CalDavCalendar.iter_events. While the caller consumes the events of one
+        search window, the next window is already requested.
+
+        Args:
+            :param limit: maximum number of events the caller consumes
+            :param reverse: when true the events before now are returned, the latest first
+
+        Returns:
+            :return: asynchronous generator of (parsed_event, event) pairs
+        """
+        windows = self.calendar.search_windows(reverse)
+        window = next(windows, None)
+        task = None
+        if window is not None:
+            task = asyncio.ensure_future(self.fetch_events(window[0], window[1], reverse, limit, window[2]))
+        found = 0
+        try:
+            while task is not None:
+                parsed_events, events = await task
+                task = None
+                remaining = None if limit is None else limit - found - len(events)
+                window = next(windows, None)
+                if window is not None and (remaining is None or remaining > 0):
+                    logging.info(f"Requesting the events from {window[0]} until {window[1]} in advance")
+                    task = asyncio.ensure_future(self.fetch_events(window[0], window[1], reverse, remaining,
+                                                                   window[2]))
+                for pair in zip(parsed_events, events):
+                    found += 1
+                    yield pair
+        finally:
+            if task is not None:
+                task.cancel()
+
+    async def fetch_n_events(self, n, reverse=False):
+        """
+        Fetches the first n events of the event stream of iter_events
+
+        Returns:
+            :return: two lists of events
+        """
+        pairs = [pair async for pair in self.iter_events(limit=n, reverse=reverse)]
+        if not pairs:
+            return [], []
+        parsed_events, events = [list(tuple) for tuple in zip(*pairs)]
+        return parsed_events, events
+
+    async def fetch_next_n_events(self, n):
+        """
+        Fetches the next n events, see CalDavCalendar.fetch_next_n_events
+        """
+        return await self.fetch_n_events(int(n))
+
+    async def fetch_last_n_events(self, n):
+        """
+        Fetches the last n events before now, see CalDavCalendar.fetch_last_n_events
+        """
+        return await self.fetch_n_events(int(n), reverse=True)
+
+    async def add_event(self, title, begin, end, rule=None, fullday=False):
+        """
+        Adds an event to the calendar, see CalDavCalendar.add_event
+        """
+        return await self.run(self.calendar.add_event, title, begin, end, rule, fullday)
+
+    async def add_events(self, events):
+        """
+        Adds many events to the calendar, see CalDavCalendar.add_events
+        """
+        return await self.run(self.calendar.add_events, events)
+
+    async def remove_events(self, events):
+        """
+        Removes events from the calendar, see CalDavCalendar.remove_events
+        """
+        return await self.run(self.calendar.remove_events, events)
+
+    async def rename_event(self, event, new_title):
+        """
+        Renames an event, see CalDavCalendar.rename_event
+        """
+        return await self.run(self.calendar.rename_event, event, new_title)
+
+    async def move_event(self, event, begin, end, fullday=False):
+        """
+        Moves an event to a new time, see CalDavCalendar.move_event
+        """
+        return await self.run(self.calendar.move_event, event, begin, end, fullday)
+
+    async def set_recurrence(self, event, rule):
+        """
+        Changes the recurrence rule of an event, see CalDavCalendar.set_recurrence
+        """
+        return await self.run(self.calendar.set_recurrence, event, rule)
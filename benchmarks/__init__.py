@@ -0,0 +1,26 @@
+"""
+Benchmarks of the calendar skill. They run outside of a Mycroft installation, the skill modules are
+imported as a package without executing the __init__.py of the skill (which needs mycroft).
+Run them from the root of the skill, e.g.
+
+    python -m benchmarks.pipeline
+"""
+import importlib
+import os
+import sys
+import types
+
+# name under which the skill directory is imported
+SKILL_PACKAGE = 'si_calendar_skill'
+SKILL_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def skill_module(name):
+    """
+    Imports a module of the skill, e.g. skill_module('caldav_code')
+    """
+    if SKILL_PACKAGE not in sys.modules:
+        package = types.ModuleType(SKILL_PACKAGE)
+        package.__path__ = [SKILL_PATH]
+        sys.modules[SKILL_PACKAGE] = package
+    return importlib.import_module(f"{SKILL_PACKAGE}.{name}")
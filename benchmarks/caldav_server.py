@@ -0,0 +1,633 @@
+"""
+In-process CalDAV stand-in server for end-to-end benchmarks. It answers the requests the skill sends
+to a Nextcloud server: PROPFIND discovery (principal, calendar home, calendars, CTag and ETags),
+calendar-query REPORTs with time-range and SUMMARY text-match filters, partial retrieval and optional
+expansion, calendar-multiget and
+sync-collection REPORTs, GET, PUT and DELETE with If-Match/If-None-Match.
+The latency of each request, the bandwidth and the size of the returned calendar data can be
+configured to simulate WAN conditions.
+
+    with CalDavServer(latency=0.05) as server:
+        server.add_events('personal', generate_calendar(1000))
+        calendar = CalDavCalendar(server.username, server.password, url=server.url)
+"""
+import base64
+import random
+import socket
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+from lxml import etree
+
+from . import skill_module
+
+ical_parser = skill_module('ical_parser')
+recurrence = skill_module('recurrence')
+
+DAV = 'DAV:'
+CALDAV = 'urn:ietf:params:xml:ns:caldav'
+CALENDARSERVER = 'http://calendarserver.org/ns/'
+SYNC_TOKEN_PREFIX = 'http://sabre.io/ns/sync/'
+# selection of a component with allprop and allcomp, the component is returned completely
+WHOLE_COMPONENT = 'whole'
+ROOT = '/remote.php/dav/'
+
+
+def tag(namespace, name):
+    return f"{{{namespace}}}{name}"
+
+
+def parse_utc(value):
+    return datetime.strptime(value, '%Y%m%dT%H%M%SZ').replace(tzinfo=timezone.utc)
+
+
+def format_utc(value):
+    return recurrence.to_utc(value).strftime('%Y%m%dT%H%M%SZ')
+
+
+class StoredCalendar:
+    """
+    One calendar collection of the server with its resources and change log
+    """
+
+    def __init__(self, name, display_name):
+        self.name = name
+        self.display_name = display_name
+        # path -> (etag, ical data)
+        self.resources = {}
+        # sync-token number -> path of the resource changed by it, a later change of the path replaces it
+        self.changes = {}
+        self.token = 1
+
+    def change(self, path):
+        self.token += 1
+        self.changes.pop(path, None)
+        self.changes[path] = self.token
+        return self.token
+
+
+class CalDavServer:
+    """
+    Threaded HTTP server on localhost that keeps the calendars in memory
+    """
+
+    def __init__(self, username='bench', password='bench', calendars=('personal',), latency=0.0, jitter=0.0,
+                 bandwidth=None, padding=0, seed=0):
+        """
+        Args:
+            :param username: user name of the principal, the password is checked with basic auth
+            :param password: password of the principal
+            :param calendars: names of the calendars of the principal
+            :param latency: seconds every request is delayed, e.g. the round trip time of a WAN
+            :param jitter: maximum random seconds added to latency
+            :param bandwidth: bytes per second of the response bodies, None for unlimited
+            :param padding: bytes of DESCRIPTION added to every returned calendar object, to simulate large events
+            :param seed: seed of the jitter
+        """
+        self.username = username
+        self.password = password
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.padding = padding
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calendars = {name: StoredCalendar(name, name.capitalize()) for name in calendars}
+        self.etag_counter = 0
+        # number of requests by method, e.g. {'PROPFIND': 3, 'REPORT': 1}
+        self.requests = Counter()
+        # sockets of the open connections, stop() closes them like a lost network
+        self.connections = set()
+        self.authorization = 'Basic ' + base64.b64encode(f"{username}:{password}".encode()).decode()
+        self.httpd = None
+        self.thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}{ROOT}"
+
+    def principal_path(self):
+        return f"{ROOT}principals/users/{self.username}/"
+
+    def home_path(self):
+        return f"{ROOT}calendars/{self.username}/"
+
+    def calendar_path(self, name):
+        return f"{self.home_path()}{name}/"
+
+    def start(self):
+        server = self
+
+        class Handler(CalDavRequestHandler):
+            caldav_server = server
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='caldav-server', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+        with self.lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def add_events(self, calendar_name, events):
+        """
+        Stores events without a request, e.g. the synthetic calendars of benchmarks.synthetic
+
+        Args:
+            :param calendar_name: name of the calendar
+            :param events: objects with data attribute or ical strings
+        """
+        calendar = self.calendars[calendar_name]
+        with self.lock:
+            for event in events:
+                data = getattr(event, 'data', event)
+                uid = next(ical_parser.iter_vevents(data)).uid
+                path = f"{self.calendar_path(calendar_name)}{quote(uid)}.ics"
+                calendar.resources[path] = (self.next_etag(), data)
+                calendar.change(path)
+
+    def next_etag(self):
+        self.etag_counter += 1
+        return f'"{self.etag_counter}"'
+
+    def delay(self, size=0):
+        """
+        Waits the configured latency and the transfer time of size bytes
+        """
+        seconds = self.latency
+        if self.jitter:
+            seconds += self.random.uniform(0, self.jitter)
+        if self.bandwidth:
+            seconds += size / self.bandwidth
+        if seconds > 0:
+            time.sleep(seconds)
+
+    def find_calendar(self, path):
+        """
+        Returns the calendar of a collection or resource path and the resource path or None
+        """
+        home = self.home_path()
+        if not path.startswith(home):
+            return None, None
+        name, _, rest = path[len(home):].partition('/')
+        calendar = self.calendars.get(name)
+        return calendar, (path if rest else None)
+
+    def pad(self, data):
+        if not self.padding:
+            return data
+        line = ical_parser.fold_line('DESCRIPTION:' + 'x' * self.padding)
+        return data.replace('END:VEVENT', f"{line}\r\nEND:VEVENT", 1)
+
+    def retrieve(self, data, selection):
+        """
+        Returns the selected components and properties of a resource (RFC 4791 9.6.4)
+
+        Args:
+            :param data: ical data of the resource
+            :param selection: dict of component name -> set of property names, None for all properties
+                or WHOLE_COMPONENT for all properties and subcomponents
+        """
+        def selected(stack):
+            for part in stack:
+                if part not in selection:
+                    return False
+                if selection[part] == WHOLE_COMPONENT:
+                    return WHOLE_COMPONENT
+            return True
+
+        lines = []
+        stack = []
+        for line in ical_parser.iter_content_lines(data):
+            name, start = ical_parser.split_name(line)
+            if name in ('BEGIN', 'END'):
+                component = line[start + 1:].strip().upper()
+                if name == 'BEGIN':
+                    stack.append(component)
+                if selected(stack):
+                    lines.append(line)
+                if name == 'END' and stack:
+                    stack.pop()
+            elif stack:
+                state = selected(stack)
+                names = selection[stack[-1]] if state is True else None
+                if state and (names is None or name in names):
+                    lines.append(ical_parser.fold_line(line))
+        return '\r\n'.join(lines) + '\r\n'
+
+    def expand(self, data, start, end):
+        """
+        Returns the instances of a resource in [start, end) as separate VEVENTs in UTC (RFC 4791 9.6.5)
+        """
+        uid = next(ical_parser.iter_vevents(data)).uid
+        series = recurrence.EventSeries(recurrence.parse_components(data))
+        lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//CalDavServer//Benchmark//EN']
+        recurring = series.overrides or (series.master is not None and series.master.rruleset is not None)
+        for component, instance_start, instance_end in series.occurrences(start, end):
+            lines.append('BEGIN:VEVENT')
+            lines.append(f"UID:{uid}")
+            if isinstance(instance_start, datetime):
+                lines.append(f"DTSTART:{format_utc(instance_start)}")
+                lines.append(f"DTEND:{format_utc(instance_end)}")
+            else:
+                lines.append(f"DTSTART;VALUE=DATE:{instance_start:%Y%m%d}")
+                lines.append(f"DTEND;VALUE=DATE:{instance_end:%Y%m%d}")
+            if recurring:
+                recurrence_id = component.recurrence_id or instance_start
+                if isinstance(recurrence_id, datetime):
+                    lines.append(f"RECURRENCE-ID:{format_utc(recurrence_id)}")
+                else:
+                    lines.append(f"RECURRENCE-ID;VALUE=DATE:{recurrence_id:%Y%m%d}")
+            lines.append(ical_parser.fold_line(f"SUMMARY:{ical_parser.escape_text(component.summary)}"))
+            lines.append('END:VEVENT')
+        lines.append('END:VCALENDAR')
+        return '\r\n'.join(lines) + '\r\n'
+
+
+def multistatus(responses, sync_token=None):
+    """
+    Builds a multistatus body
+
+    Args:
+        :param responses: list of (href, {property tag: xml value}, missing property tags) or (href, status)
+        :param sync_token: sync-token element of a sync-collection response
+    """
+    parts = [f'<?xml version="1.0" encoding="utf-8"?>\n<d:multistatus xmlns:d="{DAV}" xmlns:cal="{CALDAV}" '
+             f'xmlns:cs="{CALENDARSERVER}">']
+    for response in responses:
+        if len(response) == 2:
+            href, status = response
+            parts.append(f"<d:response><d:href>{escape(href)}</d:href>"
+                         f"<d:status>HTTP/1.1 {status}</d:status></d:response>")
+            continue
+        href, found, missing = response
+        parts.append(f"<d:response><d:href>{escape(href)}</d:href>")
+        if found:
+            parts.append('<d:propstat><d:prop>' + ''.join(found.values()) +
+                         '</d:prop><d:status>HTTP/1.1 200 OK</d:status></d:propstat>')
+        if missing:
+            parts.append('<d:propstat><d:prop>' + ''.join(f'<x:{etree.QName(name).localname} '
+                                                          f'xmlns:x="{etree.QName(name).namespace}"/>'
+                                                          for name in missing) +
+                         '</d:prop><d:status>HTTP/1.1 404 Not Found</d:status></d:propstat>')
+        parts.append('</d:response>')
+    if sync_token is not None:
+        parts.append(f"<d:sync-token>{SYNC_TOKEN_PREFIX}{sync_token}</d:sync-token>")
+    parts.append('</d:multistatus>')
+    return ''.join(parts).encode('utf-8')
+
+
+class CalDavRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles the requests of one connection, keep-alive connections are supported
+    """
+    protocol_version = 'HTTP/1.1'
+    caldav_server = None
+
+    def setup(self):
+        super().setup()
+        with self.caldav_server.lock:
+            self.caldav_server.connections.add(self.connection)
+
+    def finish(self):
+        try:
+            super().finish()
+        finally:
+            with self.caldav_server.lock:
+                self.caldav_server.connections.discard(self.connection)
+
+    def log_message(self, format, *args):
+        pass
+
+    def send(self, status, body=b'', headers=None):
+        server = self.caldav_server
+        server.delay(len(body))
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if body:
+            content_type = 'application/xml; charset=utf-8' if body.startswith(b'<?xml') \
+                else 'text/calendar; charset=utf-8'
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def authorized(self):
+        if self.headers.get('Authorization') == self.caldav_server.authorization:
+            return True
+        self.read_body()
+        self.send(401, headers={'WWW-Authenticate': 'Basic realm="CalDavServer"'})
+        return False
+
+    def dispatch(self, method):
+        server = self.caldav_server
+        with server.lock:
+            server.requests[method] += 1
+        if not self.authorized():
+            return
+        path = unquote(urlsplit(self.path).path)
+        body = self.read_body()
+        try:
+            status, response, headers = getattr(self, f"handle_{method.lower()}")(path, body)
+        except etree.XMLSyntaxError:
+            status, response, headers = 400, b'', None
+        self.send(status, response, headers)
+
+    def do_PROPFIND(self):
+        self.dispatch('PROPFIND')
+
+    def do_REPORT(self):
+        self.dispatch('REPORT')
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def handle_propfind(self, path, body):
+        server = self.caldav_server
+        requested = []
+        if body:
+            root = etree.fromstring(body)
+            prop = root.find(tag(DAV, 'prop'))
+            if prop is not None:
+                requested = [child.tag for child in prop]
+        depth = self.headers.get('Depth', '0')
+
+        with server.lock:
+            if path in (ROOT, ROOT.rstrip('/')):
+                targets = [(ROOT, self.root_props())]
+            elif path.rstrip('/') == server.principal_path().rstrip('/'):
+                targets = [(server.principal_path(), self.principal_props())]
+            elif path.rstrip('/') == server.home_path().rstrip('/'):
+                targets = [(server.home_path(), self.home_props())]
+                if depth != '0':
+                    targets += [(server.calendar_path(name), self.calendar_props(calendar))
+                                for name, calendar in server.calendars.items()]
+            else:
+                calendar, resource = server.find_calendar(path)
+                if calendar is None:
+                    return 404, b'', None
+                if resource is not None:
+                    if resource not in calendar.resources:
+                        return 404, b'', None
+                    targets = [(resource, self.resource_props(*calendar.resources[resource]))]
+                else:
+                    targets = [(server.calendar_path(calendar.name), self.calendar_props(calendar))]
+                    if depth != '0':
+                        targets += [(href, self.resource_props(*value)) for href, value in calendar.resources.items()]
+
+        responses = []
+        for href, props in targets:
+            if requested:
+                found = {name: props[name] for name in requested if name in props}
+                missing = [name for name in requested if name not in props]
+            else:
+                found, missing = props, []
+            responses.append((href, found, missing))
+        return 207, multistatus(responses), None
+
+    def root_props(self):
+        return {
+            tag(DAV, 'resourcetype'): '<d:resourcetype><d:collection/></d:resourcetype>',
+            tag(DAV, 'current-user-principal'):
+                f"<d:current-user-principal><d:href>{self.caldav_server.principal_path()}</d:href>"
+                f"</d:current-user-principal>",
+        }
+
+    def principal_props(self):
+        server = self.caldav_server
+        return {
+            tag(DAV, 'resourcetype'): '<d:resourcetype><d:principal/></d:resourcetype>',
+            tag(DAV, 'displayname'): f"<d:displayname>{escape(server.username)}</d:displayname>",
+            tag(DAV, 'current-user-principal'):
+                f"<d:current-user-principal><d:href>{server.principal_path()}</d:href></d:current-user-principal>",
+            tag(CALDAV, 'calendar-home-set'):
+                f"<cal:calendar-home-set><d:href>{server.home_path()}</d:href></cal:calendar-home-set>",
+        }
+
+    def home_props(self):
+        return {
+            tag(DAV, 'resourcetype'): '<d:resourcetype><d:collection/></d:resourcetype>',
+            tag(DAV, 'displayname'): '<d:displayname>calendars</d:displayname>',
+        }
+
+    def calendar_props(self, calendar):
+        return {
+            tag(DAV, 'resourcetype'): '<d:resourcetype><d:collection/><cal:calendar/></d:resourcetype>',
+            tag(DAV, 'displayname'): f"<d:displayname>{escape(calendar.display_name)}</d:displayname>",
+            tag(CALENDARSERVER, 'getctag'): f"<cs:getctag>{SYNC_TOKEN_PREFIX}{calendar.token}</cs:getctag>",
+            tag(DAV, 'sync-token'): f"<d:sync-token>{SYNC_TOKEN_PREFIX}{calendar.token}</d:sync-token>",
+            tag(CALDAV, 'supported-calendar-component-set'):
+                '<cal:supported-calendar-component-set><cal:comp name="VEVENT"/>'
+                '</cal:supported-calendar-component-set>',
+        }
+
+    def resource_props(self, etag, data):
+        return {
+            tag(DAV, 'resourcetype'): '<d:resourcetype/>',
+            tag(DAV, 'getetag'): f"<d:getetag>{escape(etag)}</d:getetag>",
+            tag(DAV, 'getcontenttype'): '<d:getcontenttype>text/calendar; charset=utf-8; component=vevent'
+                                        '</d:getcontenttype>',
+        }
+
+    def handle_report(self, path, body):
+        server = self.caldav_server
+        root = etree.fromstring(body)
+        calendar, resource = server.find_calendar(path)
+        if calendar is None or resource is not None:
+            return 404, b'', None
+        if root.tag == tag(CALDAV, 'calendar-query'):
+            return self.calendar_query(calendar, root)
+        if root.tag == tag(CALDAV, 'calendar-multiget'):
+            hrefs = [unquote(urlsplit(href.text).path) for href in root.iter(tag(DAV, 'href'))]
+            with server.lock:
+                found = [(href, calendar.resources.get(href)) for href in hrefs]
+            responses = [(href, self.data_props(root, *value), []) if value is not None else (href, '404 Not Found')
+                         for href, value in found]
+            return 207, multistatus(responses), None
+        if root.tag == tag(DAV, 'sync-collection'):
+            return self.sync_collection(calendar, root)
+        return 501, b'', None
+
+    def data_props(self, root, etag, data, expand=None):
+        """
+        Returns the requested getetag and calendar-data properties of a resource
+        """
+        props = {}
+        if root.find(f"{tag(DAV, 'prop')}/{tag(DAV, 'getetag')}") is not None:
+            props[tag(DAV, 'getetag')] = f"<d:getetag>{escape(etag)}</d:getetag>"
+        element = root.find(f"{tag(DAV, 'prop')}/{tag(CALDAV, 'calendar-data')}")
+        if element is not None:
+            server = self.caldav_server
+            if expand is not None:
+                data = server.expand(data, *expand)
+            data = server.pad(data)
+            selection = self.selection(element)
+            if selection is not None:
+                data = server.retrieve(data, selection)
+            props[tag(CALDAV, 'calendar-data')] = f"<cal:calendar-data>{escape(data)}</cal:calendar-data>"
+        return props
+
+    def selection(self, element):
+        """
+        Returns the components and properties a calendar-data element requests, None for the whole resource
+        """
+        components = element.findall(f".//{tag(CALDAV, 'comp')}")
+        if not components:
+            return None
+        selection = {}
+        for component in components:
+            if component.find(tag(CALDAV, 'allcomp')) is not None:
+                selection[component.get('name')] = WHOLE_COMPONENT
+            elif component.find(tag(CALDAV, 'allprop')) is not None:
+                selection[component.get('name')] = None
+            else:
+                selection[component.get('name')] = {prop.get('name') for prop in
+                                                     component.findall(tag(CALDAV, 'prop'))}
+        return selection
+
+    def calendar_query(self, calendar, root):
+        server = self.caldav_server
+        start = end = None
+        time_range = root.find(f".//{tag(CALDAV, 'filter')}//{tag(CALDAV, 'time-range')}")
+        if time_range is not None:
+            start = parse_utc(time_range.get('start')) if time_range.get('start') else None
+            end = parse_utc(time_range.get('end')) if time_range.get('end') else None
+        text_match = root.find(f".//{tag(CALDAV, 'filter')}//{tag(CALDAV, 'prop-filter')}[@name='SUMMARY']/"
+                               f"{tag(CALDAV, 'text-match')}")
+        expand = None
+        expand_element = root.find(f".//{tag(CALDAV, 'expand')}")
+        if expand_element is not None:
+            expand = (parse_utc(expand_element.get('start')), parse_utc(expand_element.get('end')))
+
+        with server.lock:
+            resources = list(calendar.resources.items())
+        low = start or datetime(1900, 1, 1, tzinfo=timezone.utc)
+        high = end or datetime(2200, 1, 1, tzinfo=timezone.utc)
+        responses = []
+        for href, (etag, data) in resources:
+            if text_match is not None and not self.text_matches(text_match, data):
+                continue
+            if start is not None or end is not None:
+                series = recurrence.EventSeries(recurrence.parse_components(data))
+                if next(iter(series.occurrences(low, high)), None) is None:
+                    continue
+            responses.append((href, self.data_props(root, etag, data, expand), []))
+        return 207, multistatus(responses), None
+
+    def text_matches(self, element, data):
+        """
+        Evaluates a text-match on the SUMMARY of the VEVENTs of a resource, the octet and the
+        unicode-casemap collations are supported
+        """
+        text = element.text or ''
+        case_insensitive = element.get('collation', 'i;ascii-casemap') != 'i;octet'
+        if case_insensitive:
+            text = text.casefold()
+        matched = False
+        for record in ical_parser.iter_vevents(data):
+            summary = record.summary or ''
+            if (text in summary.casefold()) if case_insensitive else (text in summary):
+                matched = True
+                break
+        return matched != (element.get('negate-condition') == 'yes')
+
+    def sync_collection(self, calendar, root):
+        server = self.caldav_server
+        element = root.find(tag(DAV, 'sync-token'))
+        token = element.text if element is not None and element.text else None
+        with server.lock:
+            if token is None:
+                since = 0
+            else:
+                if not token.startswith(SYNC_TOKEN_PREFIX) or not token[len(SYNC_TOKEN_PREFIX):].isdigit():
+                    return 403, b'', None
+                since = int(token[len(SYNC_TOKEN_PREFIX):])
+            responses = []
+            for href, number in calendar.changes.items():
+                if number <= since:
+                    continue
+                value = calendar.resources.get(href)
+                if value is not None:
+                    responses.append((href, self.data_props(root, *value), []))
+                elif token is not None:
+                    responses.append((href, '404 Not Found'))
+            current = calendar.token
+        return 207, multistatus(responses, current), None
+
+    def handle_get(self, path, body):
+        server = self.caldav_server
+        calendar, resource = server.find_calendar(path)
+        with server.lock:
+            value = calendar.resources.get(resource) if calendar is not None else None
+        if value is None:
+            return 404, b'', None
+        etag, data = value
+        return 200, server.pad(data).encode('utf-8'), {'ETag': etag}
+
+    def handle_put(self, path, body):
+        server = self.caldav_server
+        calendar, resource = server.find_calendar(path)
+        if calendar is None or resource is None:
+            return 409, b'', None
+        data = body.decode('utf-8')
+        with server.lock:
+            current = calendar.resources.get(resource)
+            if self.headers.get('If-None-Match') == '*' and current is not None:
+                return 412, b'', None
+            if_match = self.headers.get('If-Match')
+            if if_match is not None and (current is None or if_match not in ('*', current[0])):
+                return 412, b'', None
+            etag = server.next_etag()
+            calendar.resources[resource] = (etag, data)
+            calendar.change(resource)
+        return (201 if current is None else 204), b'', {'ETag': etag}
+
+    def handle_delete(self, path, body):
+        server = self.caldav_server
+        calendar, resource = server.find_calendar(path)
+        if calendar is None or resource is None:
+            return 403, b'', None
+        with server.lock:
+            current = calendar.resources.get(resource)
+            if current is None:
+                return 404, b'', None
+            if_match = self.headers.get('If-Match')
+            if if_match is not None and if_match not in ('*', current[0]):
+                return 412, b'', None
+            del calendar.resources[resource]
+            calendar.change(resource)
+        return 204, b'', None
@@ -0,0 +1,107 @@
+"""
+End-to-end latency benchmark of CalDavCalendar against the in-process CalDAV stand-in server.
+The server simulates a WAN with a fixed latency per request, jitter and limited bandwidth, so the
+number of round trips and the transferred bytes of each skill operation show up in its latency:
+
+    python -m benchmarks.end_to_end --latency 0.05 --events 1000
+    python -m benchmarks.end_to_end --latency 0.1 --bandwidth 250000 --no-store
+
+The first call of an operation (cold, e.g. including the discovery or the first full pull of the
+event store) is reported separately from the following calls (warm).
+"""
+import argparse
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from functools import partial
+
+from . import skill_module
+from .caldav_server import CalDavServer
+from .synthetic import generate_calendar
+
+caldav_code = skill_module('caldav_code')
+
+
+class Timings:
+    """
+    Collects the durations and request counts of the benchmarked operations
+    """
+
+    def __init__(self, server):
+        self.server = server
+        self.results = {}
+
+    def measure(self, name, function, *args):
+        requests = sum(self.server.requests.values())
+        started = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - started
+        self.results.setdefault(name, []).append((elapsed, sum(self.server.requests.values()) - requests))
+        return result
+
+    def report(self):
+        print(f"{'operation':<26}{'cold ms':>10}{'warm ms':>10}{'warm max':>10}{'requests':>10}")
+        for name, runs in self.results.items():
+            cold, cold_requests = runs[0]
+            warm = [elapsed for elapsed, _ in runs[1:]]
+            warm_requests = [count for _, count in runs[1:]]
+            warm_text = f"{min(warm) * 1000:>10.1f}{max(warm) * 1000:>10.1f}" if warm else f"{'-':>10}{'-':>10}"
+            requests = f"{cold_requests}/{max(warm_requests)}" if warm_requests else f"{cold_requests}"
+            print(f"{name:<26}{cold * 1000:>10.1f}{warm_text}{requests:>10}")
+
+
+def run(args):
+    now = datetime.now(timezone.utc)
+    server = CalDavServer(latency=args.latency, jitter=args.jitter, bandwidth=args.bandwidth, padding=args.padding,
+                          calendars=tuple(f"calendar{i}" if i else 'personal' for i in range(args.calendars)))
+    with server:
+        for i, name in enumerate(server.calendars):
+            server.add_events(name, generate_calendar(args.events // args.calendars, seed=i,
+                                                      base_url=server.calendar_path(name),
+                                                      begin=now - timedelta(days=180)))
+        timings = Timings(server)
+        calendar = timings.measure('connect', partial(caldav_code.CalDavCalendar, server.username, server.password,
+                                                      use_store=not args.no_store, pool_size=args.pool_size,
+                                                      url=server.url))
+        try:
+            tomorrow = calendar.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+            for i in range(args.repeat):
+                timings.measure('fetch_next_n_events(5)', calendar.fetch_next_n_events, 5)
+                timings.measure('fetch_last_n_events(5)', calendar.fetch_last_n_events, 5)
+                timings.measure('fetch_events_for_date', calendar.fetch_events_for_date, tomorrow)
+
+                title = f"Benchmark {i}"
+                begin = tomorrow + timedelta(hours=8 + i % 10)
+                timings.measure('add_event', calendar.add_event, title, begin, begin + timedelta(hours=1))
+                parsed_events, events = calendar.fetch_events_for_date(tomorrow)
+                added = [event for parsed_event, event in zip(parsed_events, events) if parsed_event.summary == title]
+                if not added:
+                    logging.error(f"Added event {title} was not found")
+                    continue
+                timings.measure('rename_event', calendar.rename_event, added[0], f"{title} renamed")
+                timings.measure('remove_events', calendar.remove_events, added[:1])
+        finally:
+            calendar.close()
+        timings.report()
+        print(f"requests by method: {dict(server.requests)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--events', type=int, default=1000, help='VEVENTs on the server')
+    parser.add_argument('--calendars', type=int, default=1, help='calendars the events are spread over')
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every request')
+    parser.add_argument('--jitter', type=float, default=0.0, help='maximum random seconds added to the latency')
+    parser.add_argument('--bandwidth', type=float, default=None, help='bytes per second of the responses')
+    parser.add_argument('--padding', type=int, default=0, help='bytes added to every returned calendar object')
+    parser.add_argument('--pool-size', type=int, default=4, help='kept-alive connections of the client')
+    parser.add_argument('--repeat', type=int, default=5, help='runs of every operation')
+    parser.add_argument('--no-store', action='store_true', help='query the server instead of the event store')
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,266 @@
+"""
+Benchmark of the parse, sort and format pipeline of CalDavCalendar on synthetic calendars.
+Each stage is timed on calendars of 100 to 100k VEVENTs, the report shows the best time of several
+runs, the throughput and the peak memory (tracemalloc) of one run. The results are compared to a
+baseline file, so regressions show up as ratios. The baseline records the host it was measured on and
+the time of a fixed calibration loop, the ratios are corrected by the speed of the current host relative
+to that host:
+
+    python -m benchmarks.pipeline                    # compare to benchmarks/baseline.json
+    python -m benchmarks.pipeline --save-baseline    # write the baseline
+    python -m benchmarks.pipeline --sizes 100 1000 --check
+"""
+import argparse
+import gc
+import json
+import logging
+import os
+import platform
+import random
+import time
+import tracemalloc
+from datetime import timedelta
+
+from . import skill_module
+from .synthetic import EPOCH, generate_calendar
+
+caldav_code = skill_module('caldav_code')
+ical_parser = skill_module('ical_parser')
+ical_serializer = skill_module('ical_serializer')
+
+DEFAULT_SIZES = (100, 1000, 10000, 100000)
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# number of calendars the merge of fetch_events combines
+CALENDARS = 4
+# time range of the queries, the synthetic events are spread over one year
+QUERY_DAYS = 90
+# runs of the calibration loop, the best one counts
+CALIBRATION_RUNS = 5
+
+
+def offline_calendar():
+    """
+    Returns a CalDavCalendar without client, enough for the methods that only parse and format
+    """
+    calendar = object.__new__(caldav_code.CalDavCalendar)
+    calendar.zone = ical_parser.get_zone(ical_serializer.DEFAULT_TZID)
+    calendar.serializer = ical_serializer.EventSerializer(ical_serializer.DEFAULT_TZID)
+    calendar.stores = None
+    return calendar
+
+
+def measure(function, setup, repeat):
+    """
+    Runs function(setup()) repeat times and once more under tracemalloc
+
+    Returns:
+        :return: best time in seconds and peak memory in bytes
+    """
+    best = None
+    for _ in range(repeat):
+        argument = setup()
+        gc.collect()
+        started = time.perf_counter()
+        function(argument)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    argument = setup()
+    gc.collect()
+    tracemalloc.start()
+    function(argument)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def stages(calendar, events):
+    """
+    Returns the benchmarked stages as (name, setup, function, items) tuples. setup prepares a fresh input,
+    function runs the stage on it, items is the number of processed items for the throughput.
+    """
+    start = EPOCH + timedelta(days=90)
+    end = start + timedelta(days=QUERY_DAYS)
+    occurrences = calendar.get_title_and_time_of_events(events, start, end)
+    batch = caldav_code.EventBatch(occurrences)
+    ordered = batch.take(batch.order())
+    per_calendar = [ordered[i::CALENDARS] for i in range(CALENDARS)]
+    zone = calendar.zone
+    begin = EPOCH.replace(tzinfo=None) + timedelta(hours=10)
+
+    def string_events():
+        return [caldav_code.ParsedEvent(event.summary, time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(event.start)),
+                                        time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(event.end)))
+                for event in occurrences]
+
+    def sort(items):
+        sorted_batch = caldav_code.EventBatch(items)
+        return sorted_batch.take(sorted_batch.order())
+
+    def render(parsed_events):
+        for parsed_event in parsed_events:
+            parsed_event.date_response
+            parsed_event.time
+
+    def create_events(count):
+        for i in range(count):
+            calendar.create_event('Team meeting', begin + timedelta(days=i % 365),
+                                  begin + timedelta(days=i % 365, hours=1), 'WEEKLY' if i % 5 == 0 else None)
+
+    return [
+        ('get_title_and_time_of_events', lambda: events,
+         lambda items: calendar.get_title_and_time_of_events(items, start, end), len(events)),
+        ('create_parsed_date_objects', lambda: occurrences,
+         lambda items: calendar.create_parsed_date_objects(items, zone), len(occurrences)),
+        ('parse_dates', string_events, calendar.parse_dates, len(occurrences)),
+        ('generate_output_date_string', lambda: calendar.create_parsed_date_objects(occurrences),
+         lambda items: calendar.generate_output_date_string(items, zone), len(occurrences)),
+        ('lazy_render', lambda: calendar.create_parsed_date_objects(occurrences, zone), render, len(occurrences)),
+        ('sort', lambda: list(reversed(occurrences)), sort, len(occurrences)),
+        ('merge_events', lambda: per_calendar, lambda items: calendar.merge_events(items), len(occurrences)),
+        ('create_event', lambda: len(events), create_events, len(events)),
+    ]
+
+
+def run(sizes, repeat, seed=0):
+    """
+    Runs all stages on calendars of the given sizes
+
+    Returns:
+        :return: dict of "stage/size" -> result dict
+    """
+    calendar = offline_calendar()
+    results = {}
+    for size in sizes:
+        events = generate_calendar(size, seed)
+        for name, setup, function, items in stages(calendar, events):
+            # large calendars are measured less often to keep the run time reasonable
+            best, peak = measure(function, setup, max(1, repeat if size <= 10000 else repeat // 3))
+            results[f"{name}/{size}"] = {
+                'seconds': best,
+                'items': items,
+                'items_per_second': items / best if best > 0 else None,
+                'peak_bytes': peak,
+            }
+    return results
+
+
+def calibrate():
+    """
+    Times a fixed workload that does not use the skill (sorting, string formatting and dict lookups),
+    a measure of the speed of the host and interpreter
+
+    Returns:
+        :return: best time in seconds
+    """
+    generator = random.Random(0)
+    numbers = [generator.random() for _ in range(200000)]
+    best = None
+    for _ in range(CALIBRATION_RUNS):
+        gc.collect()
+        started = time.perf_counter()
+        ordered = sorted(numbers)
+        table = {f"{value:.6f}": i for i, value in enumerate(ordered)}
+        sum(table[f"{value:.6f}"] for value in numbers[::4])
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def environment():
+    """
+    Describes the host the benchmarks run on
+    """
+    cpu = platform.processor()
+    try:
+        with open('/proc/cpuinfo') as f:
+            cpu = next((line.split(':', 1)[1].strip() for line in f if line.startswith('model name')), cpu)
+    except OSError:
+        pass
+    return {
+        'python': f"{platform.python_implementation()} {platform.python_version()}",
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu': cpu,
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def load_baseline(path):
+    if not os.path.isfile(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, results, calibration):
+    baseline = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'environment': environment(),
+        'calibration_seconds': calibration,
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(baseline, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+
+def report(results, baseline, threshold, calibration):
+    """
+    Prints the results and their ratio to the baseline. The ratios are divided by the ratio of the
+    calibration times, so a slower or faster host does not show up as a change of every benchmark.
+
+    Returns:
+        :return: list of regressed benchmark names
+    """
+    previous = baseline['results'] if baseline else {}
+    speed = 1.0
+    if baseline and baseline.get('calibration_seconds'):
+        speed = calibration / baseline['calibration_seconds']
+    regressions = []
+    print(f"{'benchmark':<42}{'items':>9}{'time ms':>11}{'items/s':>13}{'peak KiB':>11}{'vs base':>10}")
+    for name, result in results.items():
+        ratio = ''
+        old = previous.get(name)
+        if old is not None and old['seconds'] > 0:
+            factor = result['seconds'] / old['seconds'] / speed
+            ratio = f"{factor:.2f}x"
+            if factor > 1 + threshold:
+                ratio += ' !'
+                regressions.append(name)
+        print(f"{name:<42}{result['items']:>9}{result['seconds'] * 1000:>11.2f}"
+              f"{result['items_per_second'] or 0:>13.0f}{result['peak_bytes'] / 1024:>11.0f}{ratio:>10}")
+    if baseline:
+        recorded = baseline.get('environment', {})
+        print(f"baseline of {baseline['created']} on {recorded.get('cpu', 'an unknown host')} "
+              f"({recorded.get('python', 'unknown python')}), ratio > {1 + threshold:.2f} marked with !")
+        if recorded and recorded != environment():
+            print(f"the baseline was measured on another host, this host is {speed:.2f}x as slow by the "
+                  f"calibration loop and the ratios are corrected by it")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='VEVENTs per calendar')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per benchmark, the best one counts')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the synthetic calendars')
+    parser.add_argument('--baseline', default=BASELINE_PATH, help='path of the baseline file')
+    parser.add_argument('--save-baseline', action='store_true', help='write the results as new baseline')
+    parser.add_argument('--threshold', type=float, default=0.2, help='slowdown that counts as regression')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 if a benchmark regressed')
+    args = parser.parse_args()
+
+    # the stages log a few info messages per call, e.g. "fetch_events called", they are not part of the timings
+    logging.disable(logging.INFO)
+    calibration = calibrate()
+    results = run(args.sizes, args.repeat, args.seed)
+    regressions = report(results, load_baseline(args.baseline), args.threshold, calibration)
+    if args.save_baseline:
+        save_baseline(args.baseline, results, calibration)
+        print(f"baseline written to {args.baseline}")
+    if args.check and regressions:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
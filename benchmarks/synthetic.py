@@ -0,0 +1,99 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+# start of the synthetic calendars, all events lie in the year after it
+EPOCH = datetime(2022, 1, 3, tzinfo=timezone.utc)
+TZID = 'Europe/Berlin'
+
+TITLES = ('Team meeting', 'Lecture Speech Interaction', 'Dentist', 'Lunch with Anna', 'Sprint review',
+          'Birthday party', 'Gym', 'Project deadline', 'Call with the supervisor', 'Übung Datenbanken')
+
+HEADER = 'BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Sabre//Sabre VObject 4.3.0//EN\r\nCALSCALE:GREGORIAN\r\n'
+FOOTER = 'END:VCALENDAR\r\n'
+
+
+class SyntheticEvent:
+    """
+    Stand-in for a caldav.Event, carries the url, ical data and properties of one calendar object resource
+    """
+
+    def __init__(self, url, data, etag=None):
+        self.url = url
+        self.data = data
+        self.props = {}
+        self.etag = etag
+
+
+def format_utc(value):
+    return value.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def format_local(value):
+    return value.strftime('%Y%m%dT%H%M%S')
+
+
+def vevent(uid, summary, start, end, stamp, rule=None, recurrence_id=None, exdate=None):
+    lines = ['BEGIN:VEVENT', f"UID:{uid}", f"DTSTAMP:{stamp}", start, end, f"SUMMARY:{summary}"]
+    if rule is not None:
+        lines.append(f"RRULE:{rule}")
+    if exdate is not None:
+        lines.append(f"EXDATE;TZID={TZID}:{exdate}")
+    if recurrence_id is not None:
+        lines.append(f"RECURRENCE-ID;TZID={TZID}:{recurrence_id}")
+    lines.append('END:VEVENT')
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def generate_calendar(count, seed=0, base_url='/remote.php/dav/calendars/bench/personal/', begin=EPOCH):
+    """
+    Generates a calendar of count calendar object resources. The mix is 60% timed events (TZID and UTC),
+    20% full day events and 20% recurring series (daily, weekly and monthly, some with an EXDATE
+    and an overridden instance).
+
+    Args:
+        :param count: number of VEVENT resources
+        :param seed: seed of the random generator, the same seed gives the same calendar
+        :param base_url: url of the calendar collection
+        :param begin: aware datetime, the events lie in the year after it
+
+    Returns:
+        :return: list of SyntheticEvent objects
+    """
+    rng = random.Random(seed)
+    stamp = format_utc(EPOCH)
+    events = []
+    for i in range(count):
+        uid = f"bench-{seed}-{i}"
+        summary = rng.choice(TITLES)
+        start = begin + timedelta(days=rng.randrange(365), minutes=15 * rng.randrange(28, 80))
+        kind = rng.random()
+        if kind < 0.2:
+            day = start.date()
+            end_day = day + timedelta(days=rng.choice((1, 1, 1, 2, 3)))
+            body = vevent(uid, summary, f"DTSTART;VALUE=DATE:{day:%Y%m%d}", f"DTEND;VALUE=DATE:{end_day:%Y%m%d}",
+                          stamp)
+        elif kind < 0.4:
+            end = start + timedelta(minutes=rng.choice((30, 60, 90)))
+            dtstart = f"DTSTART;TZID={TZID}:{format_local(start)}"
+            dtend = f"DTEND;TZID={TZID}:{format_local(end)}"
+            frequency = rng.choice(('DAILY;COUNT=20', 'WEEKLY', 'WEEKLY;INTERVAL=2', 'MONTHLY;COUNT=12'))
+            body = vevent(uid, summary, dtstart, dtend, stamp, f"FREQ={frequency}")
+            if frequency == 'WEEKLY':
+                # skip the second and move the third instance of weekly series
+                body += vevent(uid, summary + ' (moved)', f"DTSTART;TZID={TZID}:"
+                               f"{format_local(start + timedelta(days=14, hours=2))}",
+                               f"DTEND;TZID={TZID}:{format_local(end + timedelta(days=14, hours=2))}", stamp,
+                               recurrence_id=format_local(start + timedelta(days=14)))
+                body = body.replace('RRULE:FREQ=WEEKLY\r\n', 'RRULE:FREQ=WEEKLY\r\nEXDATE;TZID='
+                                    f"{TZID}:{format_local(start + timedelta(days=7))}\r\n", 1)
+        else:
+            end = start + timedelta(minutes=rng.choice((15, 30, 60, 60, 120)))
+            if kind < 0.7:
+                dtstart = f"DTSTART;TZID={TZID}:{format_local(start)}"
+                dtend = f"DTEND;TZID={TZID}:{format_local(end)}"
+            else:
+                dtstart = f"DTSTART:{format_utc(start)}"
+                dtend = f"DTEND:{format_utc(end)}"
+            body = vevent(uid, summary, dtstart, dtend, stamp)
+        events.append(SyntheticEvent(f"{base_url}{uid}.ics", HEADER + body + FOOTER, f'"{i}"'))
+    return events
@@ -1,59 +1,409 @@
 import logging
-import caldav
+from caldav.elements import dav
+from caldav.lib import error
 from datetime import datetime
-from datetime import datetime as dt
 from datetime import timedelta
 from datetime import timezone
-import hashlib
+import heapq
+import threading
 import time
+from array import array
+from itertools import chain, islice
+from operator import attrgetter
+from urllib.parse import quote
+from .calendar_query import query_events, summary_matches
+from .connection import CONNECTION_ERRORS, DEFAULT_CONNECT_TIMEOUT, DEFAULT_MAX_RETRIES, DEFAULT_POOL_SIZE, \
+    DEFAULT_READ_TIMEOUT, RETRY_BACKOFF, RETRY_STATUSES, configure_session
+from .event_store import EventOccurrence, EventStore
+from .free_busy import day_windows, find_slots, free_intervals, merge_busy
+from .ical_parser import get_zone, iter_vevents, parse_date_value, set_properties, set_summary, shift_times, \
+    split_calendar, to_epoch
+from .ical_serializer import DEFAULT_TZID, EventSerializer, format_date, format_datetime, format_rule, new_uid
+from .payload_log import log_payload, log_payloads
+from .recurrence import EventSeries, parse_components, to_utc
+from .spoken_date import DAY, spoken_date, spoken_time
+from .timezones import zone_name
+from .tracing import ContextExecutor, TracedDAVClient, tracer
+
+
+def is_midnight(value):
+    return value.hour == 0 and value.minute == 0 and value.second == 0
 
 
 class ParsedEvent:
     """
     This class represents a parsed event. The parsed event objects are used to be able
     to work in Mycroft dialogs with nice, clear attributes for the dialog outputs.
+    Start and end are UTC epoch seconds. The spoken date_response and time strings are only
+    computed when a dialog reads them, in the time zone zone. Full day events are spoken in UTC
+    because their dates are stored as midnight UTC.
     """
+    __slots__ = ('summary', 'start', 'end', 'full_day', 'zone', '_date_response', '_time')
 
-    def __init__(self, summary, start, end):
+    def __init__(self, summary, start, end, full_day=False, zone=None):
         self.summary = summary
         self.start = start
         self.end = end
-        self.date_response = None
-        self.time = None
+        self.full_day = full_day
+        self.zone = zone
+        self._date_response = None
+        self._time = None
+
+    @property
+    def date_response(self):
+        """
+        Spoken date of the event e.g. "on Saturday, 7th of May"
+        """
+        if self._date_response is None:
+            return spoken_date(self.start, None if self.full_day else self.zone)
+        return self._date_response
+
+    @date_response.setter
+    def date_response(self, value):
+        self._date_response = value
+
+    @property
+    def time(self):
+        """
+        Spoken time of the event e.g. "from 06:00PM to 07:00PM", None for full day events
+        """
+        if self._time is not None:
+            return self._time
+        if self.full_day or self.end - self.start == DAY:
+            return None
+        return spoken_time(self.start, self.end, self.zone)
+
+    @time.setter
+    def time(self, value):
+        self._time = value
+
+
+class EventBatch:
+    """
+    Columnar view of a list of events for large result sets. The start and end times (UTC epoch seconds)
+    are held in arrays and the full day flags in a bytearray, so filtering and sorting work on numbers.
+    Methods return indices into the event list.
+    """
+    __slots__ = ('events', 'starts', 'ends', 'full_days')
+
+    def __init__(self, events):
+        self.events = events
+        self.starts = array('q', [event.start for event in events])
+        self.ends = array('q', [event.end for event in events])
+        self.full_days = bytearray(event.full_day for event in events)
+
+    def __len__(self):
+        return len(self.events)
+
+    def starting_from(self, start, indices=None):
+        """
+        Returns the indices of the events starting at or after start
+        """
+        starts = self.starts
+        if indices is None:
+            indices = range(len(starts))
+        return [i for i in indices if starts[i] >= start]
+
+    def timed(self, indices=None):
+        """
+        Returns the indices of the events that are not full day events
+        """
+        full_days = self.full_days
+        if indices is None:
+            indices = range(len(full_days))
+        return [i for i in indices if not full_days[i]]
+
+    def order(self, indices=None, reverse=False, limit=None):
+        """
+        Returns the indices sorted by start time and events with the same start by end time,
+        only the first limit indices if a limit is given
+        """
+        if indices is None:
+            indices = range(len(self.starts))
+        starts = self.starts
+        ends = self.ends
+
+        def key(i):
+            return starts[i], ends[i]
+        if limit is None:
+            return sorted(indices, key=key, reverse=reverse)
+        if reverse:
+            return heapq.nlargest(limit, indices, key=key)
+        return heapq.nsmallest(limit, indices, key=key)
+
+    def take(self, indices):
+        return [self.events[i] for i in indices]
+
+
+class ItemResult:
+    """
+    This class represents the outcome of one item of a bulk operation, error is None if the item succeeded
+    """
+    __slots__ = ('item', 'error')
+
+    def __init__(self, item, error=None):
+        self.item = item
+        self.error = error
+
+    @property
+    def ok(self):
+        return self.error is None
 
 
 class CalDavCalendar:
     # set up caldav url https://<Your-Nextcloud-Domain>/remote.php/dav/
     CALDAV_URL = 'https://nextcloud.humanoidlab.hdm-stuttgart.de/remote.php/dav/'
-    def __init__(self, username, password):
-        self.client = self.create_client(self.CALDAV_URL, username, password)
-        self.calendar = self.fetch_calendars(self.client)
-
-    def create_client(self, url, user_name, password):
+    # bounds for the search of the next and last events
+    LOWEST_SEARCH_DATE = datetime.min.replace(tzinfo=timezone.utc) + timedelta(100000)
+    HIGHEST_SEARCH_DATE = datetime.max.replace(tzinfo=timezone.utc) - timedelta(100000)
+    # first time window of the search, it is doubled as long as too few events are found
+    INITIAL_SEARCH_WINDOW = timedelta(days=7)
+    # time range of a search by title
+    SEARCH_HORIZON = timedelta(days=366)
+    # how often a conditional update is applied to a newer version of an event that was changed concurrently
+    MAX_UPDATE_CONFLICTS = 3
+    # hours of the day in which free time is searched
+    FREE_TIME_HOURS = (8, 20)
+
+    def __init__(self, username, password, use_store=True, pool_size=DEFAULT_POOL_SIZE,
+                 timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT), discovery_cache=None, calendar_names=None,
+                 zone=None, event_cache=None, url=None):
+        self.username = username
+        # url of the CalDAV server, e.g. a local server of the benchmarks
+        self.url = url or self.CALDAV_URL
+        # time zone of the spoken dates and of new events, e.g. default_timezone() of mycroft
+        self.zone = zone if zone is not None else get_zone(DEFAULT_TZID)
+        self.discovery_cache = discovery_cache
+        # names of the calendars to use, None for all calendars of the principal
+        self.calendar_names = calendar_names
+        self.pool_size = pool_size
+        # EventCache the event stores are persisted in, None to keep them in memory only
+        self.event_cache = event_cache
+        self.serializer = EventSerializer(zone_name(self.zone))
+        self.executor = None
+        self.lock = threading.Lock()
+        self.client = self.create_client(self.url, username, password, pool_size, timeout)
+        self.calendars = self.open_calendars()
+        # calendars before the last rediscovery, to find the replacement of a calendar a query still uses
+        self.replaced_calendars = []
+        # new events are added to the first calendar
+        self.calendar = self.calendars[0]
+        # local copies of the calendars, queries are answered from them after the first full pull
+        self.stores = [EventStore(calendar, cache=event_cache, zone=self.zone) for calendar in self.calendars] \
+            if use_store else None
+
+    def create_client(self, url, user_name, password, pool_size=DEFAULT_POOL_SIZE,
+                      timeout=(DEFAULT_CONNECT_TIMEOUT, DEFAULT_READ_TIMEOUT)):
         """
         This method creates an DAVClient => contains connection details and credentials
+        The client keeps a pool of kept-alive connections, so later requests and intents reuse
+        the TCP connection and TLS session.
 
         Args :
             :param url: caldav url https://<Your-Nextcloud-Domain>/remote.php/dav/
             :param user_name
             :param password: password
+            :param pool_size: maximum number of kept-alive connections
+            :param timeout: (connect, read) timeout in seconds
 
         Returns :
             :return : client
         """
-        client = caldav.DAVClient(url=url, username=user_name, password=password)
+        client = TracedDAVClient(url=url, username=user_name, password=password, timeout=timeout)
+        configure_session(client.session, pool_size)
         return client
 
+    def close(self):
+        """
+        Closes the kept-alive connections of the client and the threads of the fan-out queries
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+        self.client.close()
+
+    def open_calendars(self):
+        """
+        Opens the calendars by their cached URLs without sending any request. The URLs are validated lazily by
+        the first query (see call_calendar). Without valid cached URLs the calendars are discovered.
+
+        Returns:
+            :return : list of calendars
+        """
+        if self.discovery_cache is not None:
+            cached = self.discovery_cache.load(self.url, self.username, self.calendar_names)
+            if cached is not None:
+                logging.info(f"Opening cached calendar URLs: {cached['calendar_urls']}")
+                return [self.client.calendar(url=url) for url in cached['calendar_urls']]
+        return self.discover_calendars()
+
+    def discover_calendars(self):
+        """
+        Discovers principal, calendar home and calendars and stores their URLs in the discovery cache
+
+        Returns:
+            :return : list of calendars
+        """
+        with tracer.span('discovery'):
+            calendars = self.select_calendars(self.fetch_calendars(self.client))
+            if self.discovery_cache is not None:
+                principal = self.client.principal()
+                self.discovery_cache.save(self.url, self.username, str(principal.url),
+                                          str(principal.calendar_home_set.url), [str(c.url) for c in calendars],
+                                          self.calendar_names)
+        return calendars
+
+    def select_calendars(self, calendars):
+        """
+        Selects the calendars configured in calendar_names. All calendars are used if no names are
+        configured or none of the names matches.
+
+        Args:
+            :param calendars: all calendars of the principal
+
+        Returns:
+            :return : list of calendars
+        """
+        if not calendars:
+            raise error.NotFoundError("Your principal has no calendars")
+        if not self.calendar_names:
+            return calendars
+        names = [name.strip().lower() for name in self.calendar_names]
+        selected = [c for c in calendars if c.name is not None and c.name.strip().lower() in names]
+        if not selected:
+            logging.info(f"None of the calendars {self.calendar_names} exists, using all calendars")
+            return calendars
+        return selected
+
+    def sources(self):
+        """
+        Returns a snapshot of the calendars with their event stores. Queries work on the snapshot, so a
+        rediscovery running meanwhile in another thread can not mix up the calendars and stores.
+
+        Returns:
+            :return: list of (calendar, store) pairs, store is None without event stores
+        """
+        with self.lock:
+            stores = self.stores if self.stores is not None else [None] * len(self.calendars)
+            return list(zip(self.calendars, stores))
+
+    def rediscover(self, rejected=None):
+        """
+        Discovers the calendars again, e.g. after the server rejected a cached calendar URL. If another thread
+        already replaced the rejected calendar, its discovery is used.
+
+        Args:
+            :param rejected: calendar whose URL the server rejected
+
+        Returns:
+            :return: the (calendar, store) pair that replaces the rejected calendar, None if there is none
+        """
+        with self.lock:
+            position = next((i for i, calendar in enumerate(self.calendars) if calendar is rejected), None)
+            if rejected is None or position is not None:
+                if self.discovery_cache is not None:
+                    self.discovery_cache.clear()
+                self.replaced_calendars = self.calendars
+                self.calendars = self.discover_calendars()
+                self.calendar = self.calendars[0]
+                if self.stores is not None:
+                    max_age = self.stores[0].max_age
+                    self.stores = [EventStore(calendar, max_age, self.event_cache, self.zone)
+                                   for calendar in self.calendars]
+            else:
+                position = next((i for i, calendar in enumerate(self.replaced_calendars) if calendar is rejected),
+                                None)
+            if position is None or position >= len(self.calendars):
+                return None
+            return self.calendars[position], self.stores[position] if self.stores is not None else None
+
+    def restore_cache(self):
+        """
+        Restores the event stores from the event cache, so the first queries after a start are answered
+        without downloading the calendars
+
+        Returns:
+            :return: true if all stores were restored
+        """
+        if self.stores is None:
+            return False
+        return all([store.restore() for store in self.stores])
+
+    def refresh_in_background(self):
+        """
+        Synchronizes all event stores with the server in worker threads. Queries are answered from the
+        restored state meanwhile and see the changes once a synchronization finished.
+
+        Returns:
+            :return: list of futures, one per store
+        """
+        if self.stores is None:
+            return []
+        return [self.get_executor().submit(self.refresh_store, source) for source in self.sources()]
+
+    def refresh_store(self, source):
+        try:
+            self.call_calendar(lambda calendar, store: store.sync(force=True), source)
+        except Exception as e:
+            logging.error(f"Event store of calendar {source[0].url} could not be synchronized: {e}")
+
+    def call_calendar(self, operation, source=None):
+        """
+        Runs an operation on a calendar. If the server answers with 404 or 401, the calendar URLs are
+        discovered again and the operation is repeated once on the calendar that replaces the rejected one.
+
+        Args:
+            :param operation: function that takes the caldav calendar and its event store
+            :param source: (calendar, store) pair of sources(), the first calendar if None
+
+        Returns:
+            :return : result of the operation
+        """
+        if source is None:
+            source = self.sources()[0]
+        try:
+            return operation(*source)
+        except (error.NotFoundError, error.AuthorizationError) as e:
+            logging.info(f"Calendar URL was rejected, discovering the calendars again: {e}")
+            replacement = self.rediscover(source[0])
+            if replacement is None:
+                raise
+            return operation(*replacement)
+
+    def fan_out(self, function):
+        """
+        Calls function(source) for the (calendar, store) pair of every calendar, see sources(). With several
+        calendars the calls run concurrently, so the latency is close to the one of the slowest calendar.
+
+        Args:
+            :param function: function that takes a (calendar, store) pair
+
+        Returns:
+            :return : list of the results in the order of calendars
+        """
+        sources = self.sources()
+        if len(sources) == 1:
+            return [function(sources[0])]
+        return list(self.get_executor().map(function, sources))
+
+    def get_executor(self):
+        """
+        Returns the worker pool for concurrent requests, one worker per pooled connection
+        """
+        if self.executor is None:
+            self.executor = ContextExecutor(max_workers=self.pool_size, thread_name_prefix='caldav')
+        return self.executor
+
     def fetch_calendars(self, client):
         """
         This method fetch principal object and connects to server.
-        The principals calendar is fetched. It returns one nextcloud calendar.
+        The principals calendars are fetched. It returns all nextcloud calendars of the principal.
 
         Args:
             :param client: DAVClient
 
         Returns:
-            :return : calendar
+            :return : list of calendars
         """
 
         # Fetch principal object, connect to server
@@ -68,15 +418,13 @@ class CalDavCalendar:
         else:
             logging.info("Your principal has no calendars")
 
-        return calendar[0]
+        return calendar
 
-    def create_event(self, title, begin, end, rule=None, fullday=False):
+    def create_event(self, title, begin, end, rule=None, fullday=False, uid=None):
         """
-        Creates an ICal String based on given title, begin, end date and the boolean fullday
-        Converts begin and date to local time beforehand to integrate into ical string. The format depends whether it should be
-        a fullday event or an event with specific start and end time.
-        It is very important that the code for the Ical strings is not changed, because the format has to be exactly how it is,
-        for the code to succeed.
+        Creates an ICal String based on given title, begin, end date and the boolean fullday, see EventSerializer.
+        Timed events are written with the TZID of the calendar's time zone (in UTC if the zone has no name),
+        naive times are interpreted in that zone. Full day events are written with their dates.
 
         Args:
             :param fullday: Checks if new event should be a full day Event
@@ -84,52 +432,17 @@ class CalDavCalendar:
             :param begin: begin datetime of the event
             :param end: end datetime of the event
             :param rule: handles if the event is a series element
+            :param uid: UID of the event, a random one if None
 
         Returns:
             :return: ical string
         """
-
-        tstamp = dt.now(tz=timezone.utc).strftime("%Y%m%dT%H%M%S")  # get current time for timestamp
-        _id = hashlib.sha1(bytes(tstamp, 'utf-8')).hexdigest()  # SHA-1 the timestamp to give a unique ID
-
-        if rule is not None:  # by default, no repetition.
-            rrule = "FREQ={}\n".format(rule)
-        else:
-            rrule = ""
-
         if not fullday:
-            start_utc = begin.strftime("%Y%m%dT%H%M%S")
-            end_utc = end.strftime("%Y%m%dT%H%M%S")
-            s = """BEGIN:VCALENDAR
-VERSION:2.0
-PRODID:-//Sabre//Sabre VObject 4.3.0//EN
-BEGIN:VEVENT
-UID:{}
-DTSTAMP:{}
-DTSTART;TZID=Europe/Berlin:{}        
-DTEND;TZID=Europe/Berlin:{}
-{}SUMMARY:{}        
-END:VEVENT
-END:VCALENDAR
-"""
-        else:
-            start_utc = begin.strftime("%Y%m%d")
-            end_utc = end.strftime("%Y%m%d")
-            s = """BEGIN:VCALENDAR
-VERSION:2.0
-PRODID:-//Sabre//Sabre VObject 4.3.0//EN
-BEGIN:VEVENT
-UID:{}
-DTSTAMP:{}
-DTSTART;VALUE=DATE:{}
-DTEND;VALUE=DATE:{}
-{}SUMMARY:{}        
-END:VEVENT
-END:VCALENDAR
-"""
-
-        s = s.format(_id, tstamp, start_utc, end_utc, rrule, title)
-        logging.info(f"CreateEvent: {s}")
+            begin = self.localize(begin)
+            end = self.localize(end)
+        with tracer.span('serialize'):
+            s = self.serializer.serialize(title, begin, end, rule, fullday, uid).decode('utf-8')
+        log_payload("Created event", s)
         return s
 
     def add_event(self, title, begin, end, rule=None, fullday=False):
@@ -147,9 +460,135 @@ END:VCALENDAR
 
         try:
             # send event to Nextcloud calendar
-            _ = self.calendar.save_event(event_string)
+            event = self.call_calendar(lambda calendar, store: calendar.save_event(event_string))
+            self.store_resource(str(event.url), event_string)
         except Exception as e:
             logging.error(f"Event could not be created: {e}")
+            self.invalidate_store()
+
+    def add_events(self, events, retries=DEFAULT_MAX_RETRIES):
+        """
+        Adds many events to the NextCloud Calendar. The events are uploaded concurrently over the worker pool,
+        a failed event does not stop the others.
+
+        Args:
+            :param events: list of (title, begin, end, rule, fullday) tuples, rule and fullday can be left out
+            :param retries: how often an upload is repeated after a server error
+
+        Returns:
+            :return: list of ItemResult in the order of events, the item is the tuple
+        """
+        resources = []
+        for event in events:
+            uid = new_uid()
+            title, begin, end = event[:3]
+            fullday = len(event) > 4 and event[4]
+            if not fullday:
+                begin = self.localize(begin)
+                end = self.localize(end)
+            resources.append((uid, self.serializer.serialize(title, begin, end, *event[3:], uid=uid)))
+        errors = self.upload_resources(resources, retries)
+        return [ItemResult(event, error_message) for event, error_message in zip(events, errors)]
+
+    def import_ics(self, path, retries=DEFAULT_MAX_RETRIES):
+        """
+        Imports the events of an .ics file into the NextCloud Calendar. Every UID of the file becomes one
+        event resource, recurring events keep their overrides.
+
+        Args:
+            :param path: path of the .ics file
+            :param retries: how often an upload is repeated after a server error
+
+        Returns:
+            :return: list of ItemResult, the item is the UID of the event
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            resources = split_calendar(f.read())
+        logging.info(f"Importing {len(resources)} events from {path}")
+        errors = self.upload_resources(resources, retries)
+        return [ItemResult(uid, error_message) for (uid, _), error_message in zip(resources, errors)]
+
+    def upload_resources(self, resources, retries=DEFAULT_MAX_RETRIES):
+        """
+        Uploads calendar object resources concurrently to the first calendar
+
+        Args:
+            :param resources: list of (uid, ical string or bytes) tuples
+            :param retries: how often an upload is repeated after a server error
+
+        Returns:
+            :return: list with None for each uploaded resource and the error message for each failed one
+        """
+        calendar = self.calendar
+        errors = list(self.get_executor().map(
+            lambda resource: self.upload_resource(calendar, resource[0], resource[1], retries), resources))
+        failed = [error_message for error_message in errors if error_message is not None]
+        logging.info(f"Uploaded {len(errors) - len(failed)} of {len(errors)} events")
+        for error_message in failed:
+            logging.error(f"Event could not be created: {error_message}")
+        return errors
+
+    def upload_resource(self, calendar, uid, data, retries=DEFAULT_MAX_RETRIES):
+        """
+        Sends the PUT request of one calendar object resource. The request only creates new resources
+        (If-None-Match), an existing event with the same UID is never overwritten. A created resource is
+        added to the event store.
+
+        Returns:
+            :return: None if the event was created, otherwise the error message
+        """
+        try:
+            url = str(calendar.url.join(quote(uid.replace('/', '%2F')) + '.ics'))
+            response = self.send_request('PUT', url, data, {'Content-Type': 'text/calendar; charset=utf-8',
+                                                            'If-None-Match': '*'}, retries)
+        except Exception as e:
+            return str(e)
+        text = data.decode('utf-8') if isinstance(data, bytes) else data
+        if response.status in (200, 201, 204):
+            self.store_resource(url, text, response.headers.get('ETag'))
+            return None
+        if response.status == 412:
+            # send_request repeats the PUT after a transport error, the lost response may have been a success
+            try:
+                stored, etag = self.fetch_resource(url, retries)
+            except Exception:
+                stored = None
+            if stored is not None and stored.replace('\r\n', '\n') == text.replace('\r\n', '\n'):
+                self.store_resource(url, stored, etag)
+                return None
+            return f"An event with the UID {uid} already exists"
+        return f"{response.status} {response.reason}"
+
+    def send_request(self, method, url, body='', headers=None, retries=DEFAULT_MAX_RETRIES):
+        """
+        Sends a request and repeats it after the statuses in RETRY_STATUSES and after transport errors,
+        waiting twice as long before each repetition
+
+        Args:
+            :param method: HTTP method
+            :param url: url of the request
+            :param body: body of the request
+            :param headers: additional headers
+            :param retries: how often the request is repeated
+
+        Returns:
+            :return: the last DAVResponse, the exception of the last attempt is raised
+        """
+        attempt = 0
+        while True:
+            try:
+                response = self.client.request(url, method, body, headers or {})
+                if response.status not in RETRY_STATUSES or attempt >= retries:
+                    return response
+                logging.info(f"{method} {url} failed with {response.status}, repeating")
+            except error.AuthorizationError:
+                raise
+            except Exception as e:
+                if attempt >= retries:
+                    raise
+                logging.info(f"{method} {url} failed with {e}, repeating")
+            time.sleep(RETRY_BACKOFF * 2 ** attempt)
+            attempt += 1
 
     def remove_events(self, events):
         """
@@ -157,15 +596,184 @@ END:VCALENDAR
 
         Args:
             :param events: a list of events that are removed
+
+        Returns:
+            :return: list of ItemResult, see delete_events
+        """
+        return self.delete_events(events)
+
+    def delete_events(self, events, retries=DEFAULT_MAX_RETRIES):
+        """
+        Deletes events concurrently over the worker pool. Occurrences of the same recurring event share
+        one resource, which is deleted once. Each DELETE is conditional on the ETag the event was read
+        with (If-Match), so an event that was changed on the server in the meantime is kept.
+        A failed event does not stop the deletion of the others.
+
+        Args:
+            :param events: a list of events that are removed
+            :param retries: how often a DELETE is repeated after a server error
+
+        Returns:
+            :return: list of ItemResult in the order of events
+        """
+        resources = {}
+        for event in events:
+            resources.setdefault(str(event.url), event)
+        errors = dict(zip(resources, self.get_executor().map(
+            lambda event: self.delete_resource(event, retries), resources.values())))
+        for url, error_message in errors.items():
+            if error_message is None:
+                self.discard_resource(url)
+
+        results = [ItemResult(event, errors[str(event.url)]) for event in events]
+        for result in results:
+            summary = getattr(result.item, 'summary', None)
+            if result.ok:
+                logging.info(f"Your event {summary} was deleted")
+            else:
+                logging.error(f"Event {summary} could not be deleted: {result.error}")
+        return results
+
+    def delete_resource(self, event, retries=DEFAULT_MAX_RETRIES):
         """
+        Sends the DELETE request of one event, see send_request
+
+        Args:
+            :param event: event with url and, if known, etag
+            :param retries: how often the request is repeated
+
+        Returns:
+            :return: None if the event was deleted, otherwise the error message
+        """
+        headers = {}
+        etag = getattr(event, 'etag', None)
+        if etag:
+            headers['If-Match'] = etag
+        try:
+            response = self.send_request('DELETE', str(event.url), '', headers, retries)
+        except Exception as e:
+            return str(e)
+        if response.status in (200, 204, 404):
+            # 404: the event is already gone
+            return None
+        if response.status == 412:
+            return "The event was changed on the server"
+        return f"{response.status} {response.reason}"
+
+    def update_event(self, event, change, retries=DEFAULT_MAX_RETRIES):
+        """
+        Changes an event with a conditional PUT (If-Match with the ETag the event was read with), so a change
+        of another client in the meantime is never overwritten. If the server answers 412, only the changed
+        resource is loaded again, the change is applied to its new version and the PUT is repeated.
+        The event and the event store are updated in place with the saved data and its new ETag.
+
+        Args:
+            :param event: event or occurrence with url, data and etag
+            :param change: function that takes the ical string of the resource and returns the changed one
+            :param retries: how often a request is repeated after a server error
+
+        Returns:
+            :return: ItemResult of the event
+        """
+        resource = getattr(event, 'resource', event)
+        url = str(event.url)
         try:
-            for event in events:
-                event.delete()
-                logging.info(f"Your event: {event.data} was deleted")
+            data = resource.data
+            etag = resource.props.get(dav.GetEtag.tag)
+            if not data or not etag or getattr(resource, 'partial', False):
+                # the query only returned some properties or no ETag, the whole resource is changed
+                data, etag = self.fetch_resource(url, retries)
+
+            for attempt in range(self.MAX_UPDATE_CONFLICTS + 1):
+                if attempt:
+                    logging.info(f"{url} was changed on the server, applying the change to the new version")
+                    data, etag = self.fetch_resource(url, retries)
+                changed = change(data)
+                headers = {'Content-Type': 'text/calendar; charset=utf-8'}
+                if etag:
+                    headers['If-Match'] = etag
+                response = self.send_request('PUT', url, changed, headers, retries)
+                if response.status in (200, 201, 204):
+                    self.patch_resource(resource, url, changed, response.headers.get('ETag'))
+                    return ItemResult(event)
+                if response.status == 404:
+                    self.discard_resource(url)
+                    return ItemResult(event, "The event was deleted on the server")
+                if response.status != 412:
+                    return ItemResult(event, f"{response.status} {response.reason}")
+            return ItemResult(event, "The event was changed on the server")
         except Exception as e:
-            logging.error(f"Events could not be deleted: {e}")
+            self.invalidate_store()
+            return ItemResult(event, str(e))
+
+    def fetch_resource(self, url, retries=DEFAULT_MAX_RETRIES):
+        """
+        Loads the current version of one calendar object resource
+
+        Returns:
+            :return: ical string and ETag of the resource
+        """
+        response = self.send_request('GET', url, '', None, retries)
+        if response.status == 404:
+            self.discard_resource(url)
+            raise error.NotFoundError("The event was deleted on the server")
+        if response.status >= 400:
+            raise error.DAVError(f"{response.status} {response.reason}")
+        data = response.raw
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return data, response.headers.get('ETag')
+
+    def patch_resource(self, resource, url, data, etag):
+        """
+        Updates an event and the event store with the data the skill saved. Without the new ETag the next
+        synchronization of the store downloads the resource again.
+        """
+        resource.data = data
+        if etag:
+            resource.props[dav.GetEtag.tag] = etag
+        else:
+            resource.props.pop(dav.GetEtag.tag, None)
+        if getattr(resource, 'partial', False):
+            resource.partial = False
+        self.store_resource(url, data, etag)
+
+    def invalidate_store(self):
+        """
+        Makes the local event store ask the server for changes before it answers the next query.
+        Called after a change of the calendar failed and its state is unknown.
+        """
+        if self.stores is not None:
+            for store in self.stores:
+                store.invalidate()
 
-    def fetch_events(self, start_time, end_time, reverse_sorted=False):
+    def find_store(self, url):
+        """
+        Returns the event store of the calendar that contains a resource, None without stores
+        """
+        if self.stores is not None:
+            for store in self.stores:
+                if url.startswith(str(store.calendar.url)):
+                    return store
+        return None
+
+    def store_resource(self, url, data, etag=None):
+        """
+        Updates the event store with a resource the skill created or changed, see EventStore.put
+        """
+        store = self.find_store(url)
+        if store is not None:
+            store.put(url, data, etag)
+
+    def discard_resource(self, url):
+        """
+        Removes a resource the skill deleted from the event store
+        """
+        store = self.find_store(url)
+        if store is not None:
+            store.discard(url)
+
+    def fetch_events(self, start_time, end_time, reverse_sorted=False, limit=None, only_starting=False):
         """
         This method fetches all events from the NextCloud Calendar in the given time interval.
 
@@ -173,31 +781,34 @@ END:VCALENDAR
             :param start_time: begin date of the time interval
             :param end_time: end date of the time interval
             :param reverse_sorted: when true the sorting is descending by date
+            :param limit: return only the first limit events of the sorted lists
+            :param only_starting: when true events that started before start_time are left out
 
         Returns:
             :return: two lists of sorted events
         """
         logging.info("fetch_events called")
-        try:
-            events_fetched = self.calendar.date_search(
-                start=start_time, end=end_time, expand=True)
-            for e in events_fetched:
-                logging.info(e.data)
-        except:
-            logging.info("Your calendar server does apparently not support expanded search")
-            events_fetched = self.calendar.date_search(
-                start=start_time, end=end_time, expand=False)
-            for e in events_fetched:
-                logging.info(e.data)
-
-        events = events_fetched
-        events = self.get_title_and_time_of_events(events)
-        parsed_events = self.create_parsed_date_objects(events, 2)
-        sorted_pairs = sorted(zip(parsed_events, events), key=lambda i: datetime.strptime(i[0].start, '%Y%m%dT%H%M%SZ'),
-                              reverse=reverse_sorted)
-        tuples = zip(*sorted_pairs)
-        if len(sorted_pairs) > 0:
-            parsed_events, events = [list(tuple) for tuple in tuples]
+        per_calendar = self.fan_out(lambda source: self.fetch_calendar_events(
+            source, start_time, end_time, reverse_sorted, limit, only_starting))
+        return self.merge_events(per_calendar, reverse_sorted, limit)
+
+    def merge_events(self, per_calendar, reverse_sorted=False, limit=None):
+        """
+        Merges the sorted event lists of the calendars in time order
+
+        Args:
+            :param per_calendar: one sorted list of events per calendar
+            :param reverse_sorted: true if the lists are sorted by descending start
+            :param limit: maximum number of returned events
+
+        Returns:
+            :return: two lists of sorted events
+        """
+        with tracer.span('merge'):
+            events = list(islice(heapq.merge(*per_calendar, key=attrgetter('start'), reverse=reverse_sorted), limit))
+        if len(events) > 0:
+            with tracer.span('format'):
+                parsed_events = self.create_parsed_date_objects(events, self.zone)
 
             logging.info(f"{str(len(events))} events fetched")
             return parsed_events, events
@@ -205,120 +816,308 @@ END:VCALENDAR
             logging.info("No events in calender in this time interval")
             return [], []
 
+    def fetch_calendar_events(self, source, start_time, end_time, reverse_sorted=False, limit=None,
+                              only_starting=False):
+        """
+        Fetches the events of one calendar in the given time interval, see fetch_events
+
+        Args:
+            :param source: (calendar, store) pair of sources()
+
+        Returns:
+            :return: sorted list of events with start, end and summary properties
+        """
+        events = self.fetch_stored_events(source, start_time, end_time, limit, reverse_sorted, only_starting)
+        if events is None:
+            events = self.query_calendar_events(source, start_time, end_time, limit=limit, reverse=reverse_sorted,
+                                                only_starting=only_starting)
+        with tracer.span('sort'):
+            batch = EventBatch(events)
+            indices = None
+            if only_starting:
+                indices = batch.starting_from(to_epoch(start_time, self.zone))
+            return batch.take(batch.order(indices, reverse_sorted, limit))
+
+    def query_calendar_events(self, source, start_time, end_time, text=None, limit=None, reverse=False,
+                              only_starting=False):
+        """
+        Asks the server for the events of one calendar in the given time interval. Only the properties the skill
+        reads are transferred (see calendar_query.query_events), recurring events are expanded on the client.
+
+        Args:
+            :param source: (calendar, store) pair of sources()
+            :param start_time: begin date of the time interval
+            :param end_time: end date of the time interval
+            :param text: only return events whose title contains text
+            :param limit: expand at most limit occurrences of each event
+            :param reverse: when true the last occurrences are expanded instead of the first ones
+            :param only_starting: when true occurrences that started before start_time are left out
+
+        Returns:
+            :return: list of events with start, end and summary properties
+        """
+        start_time = self.localize(start_time)
+        end_time = self.localize(end_time)
+        started = time.perf_counter()
+        events_fetched = self.call_calendar(
+            lambda calendar, store: query_events(calendar, start_time, end_time, text), source)
+        logging.info(f"Fetched {len(events_fetched)} events of calendar {source[0].url} in "
+                     f"{(time.perf_counter() - started) * 1000:.0f} ms")
+        log_payloads("Fetched event", events_fetched)
+
+        with tracer.span('parse'):
+            if text is None:
+                return self.get_title_and_time_of_events(events_fetched, start_time, end_time, limit, reverse,
+                                                         only_starting)
+            # the server matches the resource, an overridden instance of a series can have another title
+            events = self.get_title_and_time_of_events(events_fetched, start_time, end_time, None, reverse)
+            return [event for event in events if summary_matches(event.summary, text)]
+
+    def search_events(self, text, start_time=None, end_time=None, limit=None):
+        """
+        Finds the events whose title contains text, case-insensitive, e.g. "dentist". Without event store
+        each calendar is searched with one calendar-query that filters the titles on the server.
+
+        Args:
+            :param text: part of the title
+            :param start_time: begin date of the search, None for now
+            :param end_time: end date of the search, None for SEARCH_HORIZON after start_time
+            :param limit: maximum number of returned events
+
+        Returns:
+            :return: two lists of events sorted by date
+        """
+        if start_time is None:
+            start_time = self.now()
+        if end_time is None:
+            end_time = start_time + self.SEARCH_HORIZON
+        logging.info(f"Search events with title {text} from {start_time} until {end_time}")
+        per_calendar = self.fan_out(lambda source: self.search_calendar_events(source, text, start_time, end_time,
+                                                                                limit))
+        return self.merge_events(per_calendar, limit=limit)
+
+    def search_calendar_events(self, source, text, start_time, end_time, limit=None):
+        """
+        Searches the events of one calendar by title, see search_events
+
+        Returns:
+            :return: sorted list of events with start, end and summary properties
+        """
+        events = self.fetch_stored_events(source, start_time, end_time)
+        if events is None:
+            events = self.query_calendar_events(source, start_time, end_time, text)
+        else:
+            events = [event for event in events if summary_matches(event.summary, text)]
+        with tracer.span('sort'):
+            batch = EventBatch(events)
+            return batch.take(batch.order(limit=limit))
+
+    def fetch_stored_events(self, source, start_time, end_time, limit=None, reverse=False, only_starting=False):
+        """
+        Answers a range query from the local event store of a calendar. The store is synchronized with the server
+        beforehand, which only transfers the changes since the last synchronization. If the server is not
+        reachable, a store with a restored or synchronized state answers from it although it may be outdated;
+        without such a state the connection error is raised, a query of the server would fail the same way.
+
+        Args:
+            :param source: (calendar, store) pair of sources()
+            :param start_time: begin date of the time interval
+            :param end_time: end date of the time interval
+            :param limit: expand at most limit occurrences of each event
+            :param reverse: when true the last occurrences are expanded instead of the first ones
+            :param only_starting: when true occurrences that started before start_time are left out
+
+        Returns:
+            :return: list of events with start, end and summary properties or None if the store can not be used
+        """
+        store = source[1]
+        if store is None:
+            return None
+
+        def sync(calendar, store):
+            store.sync()
+            return store
+
+        try:
+            store = self.call_calendar(sync, source)
+        except CONNECTION_ERRORS as e:
+            if not store.loaded:
+                raise
+            logging.error(f"Calendar server is not reachable, answering from the stored events: {e}")
+        except Exception as e:
+            logging.error(f"Local event store could not be used: {e}")
+            return None
+        try:
+            with tracer.span('store.query'):
+                return store.events_between(start_time, end_time, limit, reverse, only_starting)
+        except Exception as e:
+            logging.error(f"Local event store could not be used: {e}")
+            return None
+
+    def fetch_busy_times(self, start_time, end_time):
+        """
+        Fetches the times in which the user has events in any calendar. Overlapping events are merged,
+        full day events, e.g. birthdays or holidays, do not block the day.
+
+        Args:
+            :param start_time: begin date of the time interval
+            :param end_time: end date of the time interval
+
+        Returns:
+            :return: disjoint [start, end] lists in UTC epoch seconds, sorted by start
+        """
+        per_calendar = self.fan_out(lambda source: self.fetch_calendar_events(source, start_time, end_time))
+        with tracer.span('free_busy'):
+            batch = EventBatch(list(chain.from_iterable(per_calendar)))
+            starts = batch.starts
+            ends = batch.ends
+            return merge_busy((starts[i], ends[i]) for i in batch.order(batch.timed()))
+
+    def fetch_free_times(self, start_time, end_time, hours=None):
+        """
+        Fetches the free times between start_time and end_time, e.g. for "when am I free on Tuesday".
+        Only the hours of FREE_TIME_HOURS of each day are searched.
+
+        Args:
+            :param start_time: begin date of the time interval
+            :param end_time: end date of the time interval
+            :param hours: (first hour, last hour) of the searched time of each day, FREE_TIME_HOURS if None
+
+        Returns:
+            :return: list of ParsedEvent objects without summary, one per free interval
+        """
+        start_time = self.localize(start_time)
+        end_time = self.localize(end_time)
+        busy = self.fetch_busy_times(start_time, end_time)
+        with tracer.span('free_busy'):
+            free = free_intervals(busy, day_windows(start_time, end_time, self.zone, *(hours or self.FREE_TIME_HOURS)))
+        logging.info(f"Found {len(free)} free intervals between {start_time} and {end_time}")
+        return [ParsedEvent(None, start, end, zone=self.zone) for start, end in free]
+
+    def find_free_slots(self, duration, start_time, end_time, limit=None, hours=None):
+        """
+        Finds free slots of the given length, e.g. for "find a 1-hour slot this week". Each free interval
+        offers at most one slot, so the slots lie in different gaps of the calendar.
+
+        Args:
+            :param duration: timedelta or seconds the slot is long
+            :param start_time: begin date of the search
+            :param end_time: end date of the search
+            :param limit: maximum number of returned slots
+            :param hours: (first hour, last hour) of the searched time of each day, FREE_TIME_HOURS if None
+
+        Returns:
+            :return: list of ParsedEvent objects without summary sorted by date
+        """
+        if isinstance(duration, timedelta):
+            duration = int(duration.total_seconds())
+        free = self.fetch_free_times(start_time, end_time, hours)
+        slots = find_slots([(event.start, event.end) for event in free], duration, limit)
+        return [ParsedEvent(None, start, end, zone=self.zone) for start, end in slots]
+
     def create_datetime_object(self, year, month, day, hour, minute, second):
         tz = timezone(timedelta(hours=0))
         date = datetime(year=year, month=month, day=day, hour=hour, minute=minute, second=second, tzinfo=tz)
         return date
 
-    def get_title_and_time_of_events(self, events):
+    def get_title_and_time_of_events(self, events, start_time, end_time, limit=None, reverse=False,
+                                     only_starting=False):
         """
-        Parses ical string of each event object in events list
+        Parses ical string of each event object in events list.
+        Recurring events are expanded, every occurrence in the time interval becomes an own entry.
 
         Args:
             :param events: list of events objects
+            :param start_time: begin date of the time interval
+            :param end_time: end date of the time interval
+            :param limit: expand at most limit occurrences of each event
+            :param reverse: when true the last occurrences are expanded instead of the first ones
+            :param only_starting: when true occurrences that started before start_time are left out,
+                they do not count towards limit
 
         Returns :
             :return list of events with parsed start, end and summary properties
         """
+        start_time = to_utc(start_time, self.zone)
+        end_time = to_utc(end_time, self.zone)
         parsed_events = []
         for event in events:
-            start = None
-            end = None
-            summary = None
-
-            for line in event.data.split('\n'):
-                if "DTSTART" in line:
-                    event.start = line.split(":", 1)[1].strip()
-                elif "DTEND" in line:
-                    event.end = line.split(":", 1)[1].strip()
-                elif "SUMMARY" in line:
-                    event.summary = line.split(":", 1)[1].strip()
-        return events
+            series = EventSeries(parse_components(event.data, self.zone), self.zone)
+            for component, start, end in islice(series.occurrences(start_time, end_time, reverse, only_starting),
+                                                limit):
+                parsed_events.append(EventOccurrence(event, component.summary, to_epoch(start), to_epoch(end),
+                                                     not isinstance(component.start, datetime)))
+        return parsed_events
 
     def create_parsed_events(self, summary, start_time, end_time):
-        start_time = start_time.replace(tzinfo=timezone.utc)
-        end_time = end_time.replace(tzinfo=timezone.utc)
+        start_time = self.localize(start_time)
+        end_time = self.localize(end_time)
 
-        date_start_datetime = start_time.strftime('%Y%m%dT%H%M%SZ')
-        date_end_datetime = end_time.strftime('%Y%m%dT%H%M%SZ')
-        event = ParsedEvent(summary, date_start_datetime, date_end_datetime)
+        if end_time > start_time and is_midnight(start_time) and is_midnight(end_time):
+            # full day events are stored as midnight UTC of their dates, also on days with a DST change
+            event = ParsedEvent(summary, to_epoch(start_time.date()), to_epoch(end_time.date()), True)
+        else:
+            event = ParsedEvent(summary, to_epoch(start_time), to_epoch(end_time))
 
         parsed_events = self.parse_dates([event])
-        parsed_events = self.generate_output_date_string(parsed_events)
+        parsed_events = self.generate_output_date_string(parsed_events, self.zone)
         return parsed_events
 
+    def now(self):
+        """
+        Returns the current time in the time zone of the calendar
+        """
+        return datetime.now(self.zone)
+
+    def localize(self, value):
+        """
+        Interprets a naive datetime in the time zone of the calendar, aware datetimes are kept
+        """
+        if value.tzinfo is None:
+            return value.replace(tzinfo=self.zone)
+        return value
+
     def parse_dates(self, events):
         """
-        Formats each begin and end string in the event object to a consistent format.
-        Full-day-events still need a given time to be able to sort
+        Converts begin and end strings ('%Y%m%d' or '%Y%m%dT%H%M%SZ') in the event objects to UTC epoch seconds.
+        Full-day-events start at midnight UTC to be able to sort. Values that are already numbers are kept.
 
         Args:
             :param events: list of events
 
         Returns:
-            :return list of events with formatted begin and end date
+            :return list of events with numeric begin and end date
         """
         for event in events:
-            if (len(event.start) == 8) and (len(event.end) == 8):
-                event.start = time.strftime('%Y%m%dT%H%M%SZ', time.strptime(event.start, '%Y%m%d'))
-                event.end = time.strftime('%Y%m%dT%H%M%SZ', time.strptime(event.end, '%Y%m%d'))
-                logging.info(f"Fetch events from {event.start} to {event.end}")
+            if isinstance(event.start, str):
+                event.full_day = len(event.start) == 8 and len(event.end) == 8
+                event.start = to_epoch(parse_date_value(event.start), self.zone)
+                event.end = to_epoch(parse_date_value(event.end), self.zone)
         return events
 
-    def check_ordinal(self, response_string):
-        """
-        Checks for ordinal numbers in response_string and corrects prefixes
-
-        Args:
-            :param response_string: spoken date as string
-
-        Returns :
-            :return correct spoken date as string
-        """
-        if '01th' in response_string:
-            response_string = response_string.replace("01th", "1st")
-        elif '1th' in response_string:
-            response_string = response_string.replace("1th", "1st")
-        elif '2th' in response_string:
-            response_string = response_string.replace("th", "nd")
-        elif '3th' in response_string:
-            response_string = response_string.replace("th", "rd")
-        return response_string
-
-    def generate_output_date_string(self, events, time_offset=0):
+    def generate_output_date_string(self, events, zone=None):
         """
         Iterates through events and computes response_string and eventually a time string for each event.
         The response_string represents the spoken date of the event e.g. "7th of May"
         The time string represents the spoken time of the event e.g. "from 6 pm to 7 pm"
+        The strings come from memoized formatters, events that are only partly spoken should
+        use the lazy properties of ParsedEvent instead (see create_parsed_date_objects).
 
         Args:
             :param events: list of events
+            :param zone: tzinfo of the spoken strings, None for UTC
 
         Returns:
             :return list of events with response_string and time properties
         """
         for event in events:
+            event.zone = zone
+            event.date_response = spoken_date(event.start, None if event.full_day else zone)
             # if it's a full day event, only return the date (without time!)
-            date_start_datetime = datetime.strptime(event.start, '%Y%m%dT%H%M%SZ')
-            date_end = time.strptime(event.end, '%Y%m%dT%H%M%SZ')
-            date_start = time.strptime(event.start, '%Y%m%dT%H%M%SZ')
-            tmp_start = datetime.strptime(event.end, '%Y%m%dT%H%M%SZ') - timedelta(1)
-            if tmp_start == date_start_datetime:
-                response_string = time.strftime(
-                    '%dth of %B', time.localtime(time.mktime(date_start) + 60 * 60 * time_offset))
-                response_string = self.check_ordinal(response_string)
-                event.date_response = f'on {date_start_datetime.strftime("%A")}, {response_string}'
+            if event.full_day or event.end - event.start == DAY:
                 event.time = None
             else:
-                response_string = time.strftime(
-                    '%dth of %B', time.localtime(time.mktime(date_start)))
-                start_time = time.strftime(
-                    'from %I:%M%p', time.localtime(time.mktime(date_start) + 60 * 60 * time_offset))
-                end_time = time.strftime(
-                    ' to %I:%M%p', time.localtime(time.mktime(date_end) + 60 * 60 * time_offset))
-                response_string = self.check_ordinal(response_string)
-                event.date_response = f'on {date_start_datetime.strftime("%A")}, {response_string}'
-                event.time = start_time + end_time
+                event.time = spoken_time(event.start, event.end, zone)
         return events
 
     def fetch_last_n_events(self, n):
@@ -331,26 +1130,9 @@ END:VCALENDAR
         Returns:
             :return: two lists of events
         """
-        logging.info(f"Fetch the next {str(n)} events")
-        events_list = []
-        parsed_events_list = []
-        start_date = datetime.now()
-        interval = 100000
-        min_end_date = datetime.min + timedelta(interval)
-        current_end_date = start_date
-        current_start_date = start_date - timedelta(interval)
-
-        # Get the last events for a time interval
-        # If n is greater than the count of the fetched events, fetch events from the time interval before
-        # Do this until the event count is greater or equals n or until the lowest Date possible
-        while current_start_date > min_end_date and len(events_list) < n:
-            logging.info(
-                f"{str(len(events_list))} event(s) already found from date: {str(current_end_date)} until today")
-            parsed_events, events = self.fetch_events(current_start_date, current_end_date, True)
-            events_list.extend(events)
-            parsed_events_list.extend(parsed_events)
-            current_start_date = current_start_date - timedelta(interval)
-            current_end_date = current_end_date - timedelta(interval)
+        logging.info(f"Fetch the last {str(n)} events")
+        n = int(n)
+        parsed_events_list, events_list = self.fetch_n_events(n, reverse=True)
 
         if len(parsed_events_list) >= n:
             # More events were fetched than used
@@ -370,33 +1152,124 @@ END:VCALENDAR
 
     def rename_event(self, event, new_title):
         """
-        Renames existing event
+        Renames existing event, see update_event
 
         Args:
             :param event: event to rename
             :param new_title: new title for event
+
+        Returns:
+            :return: ItemResult of the event
         """
-        try:
-            old_title = event.vobject_instance.vevent.summary.value
-            event.vobject_instance.vevent.summary.value = new_title
-            event.save()
+        old_title = getattr(event, 'summary', None)
+        if old_title is None and event.data:
+            old_title = next(iter_vevents(event.data)).summary
+        result = self.update_event(event, lambda data: set_summary(data, new_title))
+        if result.ok:
             logging.info(f"Renamed {old_title} to {new_title}")
-        except:
-            logging.error("Could not rename event")
+        else:
+            logging.error(f"Could not rename event {old_title}: {result.error}")
+        return result
+
+    def move_event(self, event, begin, end, fullday=False):
+        """
+        Moves an event to a new time, see update_event. For an occurrence of a recurring event the whole
+        series is shifted by the same wall-clock difference: its start, its overridden instances and its
+        exceptions keep their times relative to each other (see shift_times). The values keep their form
+        (date, UTC, TZID or floating time). Naive times are interpreted in the time zone of the calendar.
+
+        Args:
+            :param event: occurrence to move, with start, end and full_day
+            :param begin: new begin date or datetime of the occurrence
+            :param end: new end date or datetime of the occurrence
+            :param fullday: true for a full day event, only the dates of begin and end are used
+
+        Returns:
+            :return: ItemResult of the event
+        """
+        if fullday == event.full_day:
+            start_delta = self.wall_clock_delta(event.start, begin, fullday)
+            end_delta = self.wall_clock_delta(event.end, end, fullday)
+            result = self.update_event(event, lambda data: shift_times(data, start_delta, end_delta, self.zone))
+        elif any(record.rrule or record.rdates or record.recurrence_id
+                 for record in iter_vevents(getattr(event, 'resource', event).data or '')):
+            result = ItemResult(event, "A recurring event can not be changed between full day and timed")
+        else:
+            if fullday:
+                properties = {'DTSTART': f"DTSTART;VALUE=DATE:{format_date(begin)}",
+                              'DTEND': f"DTEND;VALUE=DATE:{format_date(end)}"}
+            else:
+                # UTC times, the resource may not contain the VTIMEZONE of a TZID
+                properties = {'DTSTART': f"DTSTART:{format_datetime(to_utc(self.localize(begin)))}Z",
+                              'DTEND': f"DTEND:{format_datetime(to_utc(self.localize(end)))}Z"}
+            properties['DURATION'] = None
+            result = self.update_event(event, lambda data: set_properties(data, properties))
+        if result.ok:
+            logging.info(f"Moved {getattr(event, 'summary', None)} to {begin}")
+        else:
+            logging.error(f"Could not move event {getattr(event, 'summary', None)}: {result.error}")
+        return result
+
+    def wall_clock_delta(self, epoch, value, fullday):
+        """
+        Returns the difference between an occurrence time and its new value on the wall clock of the calendar,
+        in whole days for full day events. Full day occurrences are stored as midnight UTC.
+
+        Args:
+            :param epoch: UTC epoch seconds of the occurrence start or end
+            :param value: new date or datetime
+            :param fullday: true for a full day event
 
-    def create_parsed_date_objects(self, events, time_offset=0):
+        Returns:
+            :return: timedelta
+        """
+        if fullday:
+            new_day = value.date() if isinstance(value, datetime) else value
+            return timedelta(days=(new_day - datetime.fromtimestamp(epoch, timezone.utc).date()).days)
+        old = datetime.fromtimestamp(epoch, self.zone).replace(tzinfo=None)
+        return self.localize(value).astimezone(self.zone).replace(tzinfo=None) - old
+
+    def set_recurrence(self, event, rule):
+        """
+        Changes the recurrence rule of an event, see update_event
+
+        Args:
+            :param event: event to change
+            :param rule: frequency like WEEKLY or a complete RRULE value, None for a single event
+
+        Returns:
+            :return: ItemResult of the event
+        """
+        properties = {'RRULE': f"RRULE:{format_rule(rule)}" if rule is not None else None}
+        result = self.update_event(event, lambda data: set_properties(data, properties))
+        if not result.ok:
+            logging.error(f"Could not change the recurrence of {getattr(event, 'summary', None)}: {result.error}")
+        return result
+
+    def create_parsed_date_objects(self, events, zone=None):
+        """
+        Creates a ParsedEvent for each event. The spoken date strings are computed on first access.
+
+        Args:
+            :param events: list of events with summary, start and end properties
+            :param zone: tzinfo of the spoken date strings, None for UTC
+
+        Returns:
+            :return list of ParsedEvent objects
+        """
         parsed_events = []
         for event in events:
-            if hasattr(event, 'summary'):
-                parsed_event = ParsedEvent(event.summary, event.start, event.end)
+            full_day = getattr(event, 'full_day', False)
+            if getattr(event, 'summary', None) is not None:
+                parsed_event = ParsedEvent(event.summary, event.start, event.end, full_day, zone)
                 parsed_events.append(parsed_event)
 
             else:
-                parsed_event = ParsedEvent('No Title', event.start, event.end)
+                parsed_event = ParsedEvent('No Title', event.start, event.end, full_day, zone)
                 parsed_events.append(parsed_event)
 
+        # date_response and time are rendered lazily when a dialog reads them
         parsed_events = self.parse_dates(parsed_events)
-        parsed_events = self.generate_output_date_string(parsed_events, time_offset)
         return parsed_events
 
     def fetch_events_for_date(self, date):
@@ -425,23 +1298,8 @@ END:VCALENDAR
             :return: two lists of events
         """
         logging.info(f"Fetch the next {str(n)} events")
-        events_list = []
-        parsed_events_list = []
-        start_date = datetime.now()
-        interval = 100000
-        max_end_date = datetime.max - timedelta(interval)
-        current_start_date = start_date
-        current_end_date = start_date + timedelta(interval)
-        # Get the next events for a time interval
-        # If n is greater than the count of the fetched events, fetch events from the next time interval
-        # Do this until the event count is greater or equals n or until the highest Date possible
-        while current_end_date < max_end_date and len(events_list) < n:
-            logging.info(f"{str(len(events_list))} event(s) already found till date: {str(current_end_date)}")
-            parsed_events, events = self.fetch_events(current_start_date, current_end_date)
-            events_list.extend(events)
-            parsed_events_list.extend(parsed_events)
-            current_start_date = current_start_date + timedelta(interval)
-            current_end_date = current_end_date + timedelta(interval)
+        n = int(n)
+        parsed_events_list, events_list = self.fetch_n_events(n)
 
         if len(parsed_events_list) >= n:
             # More events were fetched than used
@@ -458,3 +1316,80 @@ END:VCALENDAR
             # Return empty array
             logging.info("No events were found")
             return [], []
+
+    def fetch_n_events(self, n, reverse=False):
+        """
+        Fetches the first n events of the event stream of iter_events
+
+        Args:
+            :param n: number of events that should be returned
+            :param reverse: when true the last n events before now are returned
+
+        Returns:
+            :return: two lists of events
+        """
+        pairs = list(islice(self.iter_events(limit=n, reverse=reverse), n))
+        if not pairs:
+            return [], []
+        parsed_events, events = [list(tuple) for tuple in zip(*pairs)]
+        return parsed_events, events
+
+    def iter_events(self, limit=None, reverse=False):
+        """
+        Yields the events after now, or before now if reverse is true, ordered by their start date.
+        The search starts with a small time window next to now and doubles the window as long as
+        too few events are found, so the server is only asked for the time ranges that are consumed.
+        With event stores the windows are answered from their interval index, which only reads the first
+        (or last) remaining occurrences of a window. Events that are still running now are returned first.
+
+        Args:
+            :param limit: maximum number of events the caller consumes
+            :param reverse: when true the events before now are returned, the latest first
+
+        Returns:
+            :return: generator of (parsed_event, event) pairs
+        """
+        found = 0
+        for window_start, window_end, only_starting in self.search_windows(reverse):
+            if limit is not None and found >= limit:
+                return
+            remaining = None if limit is None else limit - found
+            logging.info(f"{str(found)} event(s) already found, searching from {window_start} until {window_end}")
+            parsed_events, events = self.fetch_events(window_start, window_end, reverse, remaining, only_starting)
+            for pair in zip(parsed_events, events):
+                found += 1
+                yield pair
+
+    def search_windows(self, reverse=False):
+        """
+        Yields the time windows searched by iter_events, starting next to now. Each window is twice as
+        long as the previous one, until the lowest or highest search date is reached.
+
+        Args:
+            :param reverse: when true the windows go back in time
+
+        Returns:
+            :return: generator of (window_start, window_end, only_starting) tuples
+        """
+        boundary = self.now()
+        window = self.INITIAL_SEARCH_WINDOW
+        first_window = True
+        while True:
+            if reverse:
+                if boundary <= self.LOWEST_SEARCH_DATE:
+                    return
+                window_start = max(boundary, self.LOWEST_SEARCH_DATE + window) - window
+                window_end = boundary
+                boundary = window_start
+            else:
+                if boundary >= self.HIGHEST_SEARCH_DATE:
+                    return
+                window_start = boundary
+                window_end = min(boundary, self.HIGHEST_SEARCH_DATE - window) + window
+                boundary = window_end
+
+            # each event is returned by the window it starts in, only the first forward window
+            # also returns running events
+            yield window_start, window_end, reverse or not first_window
+            first_window = False
+            window = min(window * 2, self.HIGHEST_SEARCH_DATE - self.LOWEST_SEARCH_DATE)
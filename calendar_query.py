@@ -0,0 +1,126 @@
+import caldav
+from caldav.elements import cdav, dav
+from caldav.elements.base import BaseElement, NamedBaseElement
+from caldav.lib import error
+from caldav.lib.url import URL
+from lxml import etree
+
+# VEVENT properties the skill reads, a partial retrieval only returns these (RFC 4791 9.6.4).
+# VTIMEZONE components are returned completely, they define TZIDs that are no Olson names.
+EVENT_PROPERTIES = ('UID', 'DTSTART', 'DTEND', 'DURATION', 'SUMMARY', 'RRULE', 'RDATE', 'EXDATE', 'RECURRENCE-ID')
+
+# case-insensitive collation of the text-match filters (RFC 4790)
+CASE_INSENSITIVE = 'i;unicode-casemap'
+
+
+class CalendarProp(NamedBaseElement):
+    """
+    The CalDAV "prop" element of a calendar-data request, selects one property of a component
+    """
+    tag = "{urn:ietf:params:xml:ns:caldav}prop"
+
+
+class CalendarAllcomp(BaseElement):
+    """
+    The CalDAV "allcomp" element of a calendar-data request, selects all subcomponents of a component
+    """
+    tag = "{urn:ietf:params:xml:ns:caldav}allcomp"
+
+
+class PartialEvent(caldav.Event):
+    """
+    Event returned by a partial retrieval, its data only contains EVENT_PROPERTIES. It is loaded
+    completely before it is saved, so the properties the query left out are not lost.
+    """
+    partial = True
+
+    def load(self):
+        super().load()
+        self.partial = False
+        return self
+
+    def save(self, *args, **kwargs):
+        if self.partial:
+            raise error.ConsistencyError("Partially retrieved event must be loaded before it is saved")
+        return super().save(*args, **kwargs)
+
+
+def summary_matches(summary, text):
+    """
+    Local counterpart of the SUMMARY text-match filter: true if summary contains text, case-insensitive
+    """
+    return summary is not None and text.casefold() in summary.casefold()
+
+
+def request(calendar, method, root, depth):
+    """
+    Sends a REPORT or PROPFIND request to a calendar collection and raises the caldav error of a failed request
+
+    Args:
+        :param calendar: caldav calendar
+        :param method: REPORT or PROPFIND
+        :param root: caldav element of the request body
+        :param depth: value of the Depth header
+
+    Returns:
+        :return: DAVResponse
+    """
+    body = etree.tostring(root.xmlelement(), encoding="utf-8", xml_declaration=True)
+    if method == "REPORT":
+        response = calendar.client.report(calendar.url, body, depth)
+    else:
+        response = calendar.client.propfind(calendar.url, body, depth)
+    if response.status == 404:
+        raise error.NotFoundError(f"{response.status} {response.reason}")
+    if response.status == 401:
+        raise error.AuthorizationError(f"{response.status} {response.reason}")
+    if response.status >= 400:
+        raise error.exception_by_method[method.lower()](f"{response.status} {response.reason}")
+    return response
+
+
+def build_query(start=None, end=None, text=None, properties=EVENT_PROPERTIES):
+    """
+    Builds a calendar-query REPORT for VEVENTs that only requests the given properties
+
+    Args:
+        :param start: begin of the time-range filter, None for an open range
+        :param end: end of the time-range filter, None for an open range
+        :param text: only match events whose SUMMARY contains text, case-insensitive
+        :param properties: VEVENT properties of the returned calendar data
+
+    Returns:
+        :return: caldav CalendarQuery element
+    """
+    event = cdav.Comp(name='VEVENT') + [CalendarProp(name=name) for name in properties]
+    zones = cdav.Comp(name='VTIMEZONE') + [cdav.Allprop(), CalendarAllcomp()]
+    data = cdav.CalendarData() + (cdav.Comp(name='VCALENDAR') + [event, zones])
+
+    event_filter = cdav.CompFilter(name='VEVENT')
+    if start is not None or end is not None:
+        event_filter += cdav.TimeRange(start, end)
+    if text is not None:
+        event_filter += cdav.PropFilter(name='SUMMARY') + cdav.TextMatch(text, collation=CASE_INSENSITIVE)
+    query_filter = cdav.Filter() + (cdav.CompFilter(name='VCALENDAR') + event_filter)
+
+    return cdav.CalendarQuery() + [dav.Prop() + [dav.GetEtag(), data], query_filter]
+
+
+def query_events(calendar, start=None, end=None, text=None):
+    """
+    Sends a calendar-query with partial retrieval to a calendar, see build_query.
+    Recurring events are not expanded by the server, their master resources are returned.
+
+    Returns:
+        :return: list of PartialEvent objects with etag property
+    """
+    response = request(calendar, "REPORT", build_query(start, end, text), 1)
+    events = []
+    for href, props in response.expand_simple_props([dav.GetEtag(), cdav.CalendarData()]).items():
+        data = props.get(cdav.CalendarData.tag)
+        if not data:
+            continue
+        url = calendar.url.join(URL.objectify(href))
+        events.append(PartialEvent(calendar.client, url=url, data=data, parent=calendar,
+                                   props={dav.GetEtag.tag: props.get(dav.GetEtag.tag)}))
+    return events
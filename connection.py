@@ -0,0 +1,66 @@
+import logging
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError, Timeout
+from urllib3.util.retry import Retry
+
+# number of kept-alive connections to the calendar server
+DEFAULT_POOL_SIZE = 4
+# seconds to wait for the connection and for the response
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_MAX_RETRIES = 2
+
+# errors of requests that did not reach the server or got no answer, e.g. while the network is down
+CONNECTION_ERRORS = (ConnectionError, Timeout)
+
+# statuses after which the skill repeats a bulk request, and the seconds before the first repetition
+RETRY_STATUSES = frozenset((423, 500, 502, 503, 504))
+RETRY_BACKOFF = 0.2
+
+# requests that can be repeated when the server closed an idle kept-alive connection. PUT and DELETE are
+# left out: they carry If-Match/If-None-Match conditions, a repetition after a lost response would fail
+# with 412 although the first request succeeded. send_request decides about repeating them.
+IDEMPOTENT_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS', 'PROPFIND', 'REPORT'))
+
+
+def create_retry(max_retries):
+    """
+    Creates the retry policy of the connection pool. Connection errors are retried for all requests,
+    errors while reading the response (e.g. a kept-alive connection the server closed after its
+    idle timeout) only for the read-only requests in IDEMPOTENT_METHODS. HTTP error statuses are never retried.
+
+    Args:
+        :param max_retries: maximum number of retries of one request
+
+    Returns:
+        :return: urllib3 Retry object
+    """
+    options = dict(total=max_retries, connect=max_retries, read=max_retries, status=0, redirect=0,
+                   backoff_factor=0.1, raise_on_status=False)
+    try:
+        return Retry(allowed_methods=IDEMPOTENT_METHODS, **options)
+    except TypeError:
+        # urllib3 < 1.26
+        return Retry(method_whitelist=IDEMPOTENT_METHODS, **options)
+
+
+def configure_session(session, pool_size=DEFAULT_POOL_SIZE, max_retries=DEFAULT_MAX_RETRIES):
+    """
+    Mounts a keep-alive connection pool on the requests session of a DAVClient.
+    The connections and their TLS sessions are reused as long as the client lives, connections
+    closed by the server are reopened transparently.
+
+    Args:
+        :param session: requests session of the DAVClient
+        :param pool_size: maximum number of kept-alive connections per host
+        :param max_retries: see create_retry
+
+    Returns:
+        :return: the session
+    """
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=create_retry(max_retries))
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    logging.info(f"Connection pool with {pool_size} connections and {max_retries} retries configured")
+    return session
@@ -0,0 +1,73 @@
+import json
+import logging
+import os
+import time
+
+# seconds after which the calendar is discovered again although the cached URLs still work
+DEFAULT_DISCOVERY_TTL = 7 * 24 * 60 * 60
+
+
+class DiscoveryCache:
+    """
+    Persists the URLs found by the principal and calendar discovery in a JSON file in the file system
+    of the skill, so that a reconnect or skill reload can open the calendar by its URL without
+    discovery requests. Credentials are not stored.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_DISCOVERY_TTL):
+        """
+        Args:
+            :param path: path of the JSON file
+            :param ttl: seconds a discovery result is used
+        """
+        self.path = path
+        self.ttl = ttl
+
+    def load(self, server_url, username, calendar_names=None):
+        """
+        Returns the cached discovery result of a user
+
+        Args:
+            :param server_url: caldav url of the server
+            :param username: name of the user
+            :param calendar_names: configured calendar names the cached calendars were selected by
+
+        Returns:
+            :return: dict with principal_url, calendar_home_url and calendar_urls
+                or None if nothing valid is cached
+        """
+        try:
+            with open(self.path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if entry.get('server_url') != server_url or entry.get('username') != username:
+            return None
+        if not entry.get('calendar_urls') or entry.get('calendar_names') != calendar_names:
+            return None
+        if time.time() - entry.get('discovered_at', 0) > self.ttl:
+            logging.info("Cached calendar discovery expired")
+            return None
+        return entry
+
+    def save(self, server_url, username, principal_url, calendar_home_url, calendar_urls, calendar_names=None):
+        """
+        Stores a discovery result. Errors are logged, the cache is an optimization only.
+        """
+        entry = {'server_url': server_url, 'username': username, 'principal_url': principal_url,
+                 'calendar_home_url': calendar_home_url, 'calendar_urls': calendar_urls,
+                 'calendar_names': calendar_names, 'discovered_at': time.time()}
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logging.error(f"Could not store calendar discovery: {e}")
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
@@ -0,0 +1,192 @@
+import logging
+import sqlite3
+import threading
+import time
+
+# version of SCHEMA, a cache written with another version is dropped
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calendars (
+    url TEXT PRIMARY KEY,
+    sync_token TEXT,
+    ctag TEXT,
+    saved_at REAL,
+    low INTEGER,
+    high INTEGER
+);
+CREATE TABLE IF NOT EXISTS resources (
+    url TEXT PRIMARY KEY,
+    calendar_url TEXT NOT NULL,
+    etag TEXT,
+    data TEXT NOT NULL,
+    max_length INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS resources_by_calendar ON resources (calendar_url);
+CREATE TABLE IF NOT EXISTS occurrences (
+    url TEXT NOT NULL,
+    calendar_url TEXT NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    full_day INTEGER NOT NULL,
+    summary TEXT
+);
+CREATE INDEX IF NOT EXISTS occurrences_by_start ON occurrences (calendar_url, start);
+CREATE INDEX IF NOT EXISTS occurrences_by_url ON occurrences (url);
+"""
+
+TABLES = ('occurrences', 'resources', 'calendars')
+
+
+class CachedCalendar:
+    """
+    The cached state of one calendar: its sync state, the resources and their occurrences starting in the
+    epoch range [low, high), sorted by start
+    """
+    __slots__ = ('sync_token', 'ctag', 'low', 'high', 'resources', 'occurrences')
+
+    def __init__(self, sync_token, ctag, low, high, resources, occurrences):
+        self.sync_token = sync_token
+        self.ctag = ctag
+        self.low = low
+        self.high = high
+        # list of (url, etag, data, max_length) tuples
+        self.resources = resources
+        # list of (url, start, end, full_day, summary) tuples
+        self.occurrences = occurrences
+
+
+class EventCache:
+    """
+    Persists the event stores in an SQLite database in the file system of the skill, so that after a
+    reboot or skill reload the stores are restored without downloading the calendars. For each calendar
+    the sync-token and CTag are kept, for each resource its ETag and ical data, and the parsed occurrences
+    of a time range around the time of writing are kept in a table indexed by start time. A restored store
+    answers queries in that range from the occurrences without parsing the resources, and the next
+    synchronization only transfers the changes since the cache was written.
+    Errors are logged, the cache is an optimization only.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            :param path: path of the SQLite database
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.connection = None
+        try:
+            self.connection = sqlite3.connect(path, check_same_thread=False)
+            if self.connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                self.connection.executescript(''.join(f"DROP TABLE IF EXISTS {table};" for table in TABLES))
+                self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.connection.executescript(SCHEMA)
+        except sqlite3.Error as e:
+            logging.error(f"Event cache {path} could not be opened: {e}")
+            self.connection = None
+
+    def load(self, calendar_url):
+        """
+        Returns the cached state of a calendar
+
+        Args:
+            :param calendar_url: url of the calendar collection
+
+        Returns:
+            :return: CachedCalendar or None if nothing is cached
+        """
+        if self.connection is None:
+            return None
+        try:
+            with self.lock:
+                row = self.connection.execute("SELECT sync_token, ctag, low, high FROM calendars WHERE url = ?",
+                                              (calendar_url,)).fetchone()
+                if row is None:
+                    return None
+                resources = self.connection.execute(
+                    "SELECT url, etag, data, max_length FROM resources WHERE calendar_url = ?",
+                    (calendar_url,)).fetchall()
+                occurrences = self.connection.execute(
+                    "SELECT url, start, end, full_day, summary FROM occurrences WHERE calendar_url = ? "
+                    "ORDER BY start", (calendar_url,)).fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"Event cache could not be read: {e}")
+            return None
+        return CachedCalendar(*row, resources, occurrences)
+
+    def replace(self, calendar_url, sync_token, ctag, low, high, resources, occurrences):
+        """
+        Replaces the cached state of a calendar, e.g. after a full pull
+
+        Args:
+            :param calendar_url: url of the calendar collection
+            :param sync_token: sync-token of the collection or None
+            :param ctag: CTag of the collection or None
+            :param low: begin of the epoch range of the occurrences
+            :param high: end of the epoch range of the occurrences
+            :param resources: list of (url, etag, data, max_length) tuples
+            :param occurrences: list of (url, start, end, full_day, summary) tuples of the occurrences starting
+                in [low, high)
+        """
+        self._write(calendar_url, sync_token, ctag, resources, occurrences, None, (low, high))
+
+    def update(self, calendar_url, sync_token, ctag, changed=(), occurrences=(), deleted=()):
+        """
+        Writes the changes of a delta synchronization or of a local change
+
+        Args:
+            :param calendar_url: url of the calendar collection
+            :param sync_token: sync-token of the collection or None
+            :param ctag: CTag of the collection or None
+            :param changed: list of (url, etag, data, max_length) tuples of new or changed resources
+            :param occurrences: occurrences of the changed resources in the cached range, see replace
+            :param deleted: urls of deleted resources
+        """
+        self._write(calendar_url, sync_token, ctag, changed, occurrences, deleted, None)
+
+    def clear(self):
+        if self.connection is None:
+            return
+        try:
+            with self.lock, self.connection:
+                self.connection.execute("DELETE FROM occurrences")
+                self.connection.execute("DELETE FROM resources")
+                self.connection.execute("DELETE FROM calendars")
+        except sqlite3.Error as e:
+            logging.error(f"Event cache could not be cleared: {e}")
+
+    def close(self):
+        if self.connection is not None:
+            with self.lock:
+                self.connection.close()
+                self.connection = None
+
+    def _write(self, calendar_url, sync_token, ctag, changed, occurrences, deleted, cached_range):
+        if self.connection is None:
+            return
+        connection = self.connection
+        try:
+            with self.lock, connection:
+                if cached_range is not None:
+                    connection.execute("DELETE FROM occurrences WHERE calendar_url = ?", (calendar_url,))
+                    connection.execute("DELETE FROM resources WHERE calendar_url = ?", (calendar_url,))
+                else:
+                    removed = [(url,) for url in deleted or ()] + [(row[0],) for row in changed]
+                    connection.executemany("DELETE FROM occurrences WHERE url = ?", removed)
+                    if deleted:
+                        connection.executemany("DELETE FROM resources WHERE url = ?", ((url,) for url in deleted))
+                connection.executemany(
+                    "INSERT OR REPLACE INTO resources (url, calendar_url, etag, data, max_length) "
+                    "VALUES (?, ?, ?, ?, ?)", ((url, calendar_url, *values) for url, *values in changed))
+                connection.executemany(
+                    "INSERT INTO occurrences (url, calendar_url, start, end, full_day, summary) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", ((url, calendar_url, *values) for url, *values in occurrences))
+                if cached_range is not None:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO calendars (url, sync_token, ctag, saved_at, low, high) "
+                        "VALUES (?, ?, ?, ?, ?, ?)", (calendar_url, sync_token, ctag, time.time(), *cached_range))
+                else:
+                    connection.execute("UPDATE calendars SET sync_token = ?, ctag = ?, saved_at = ? WHERE url = ?",
+                                       (sync_token, ctag, time.time(), calendar_url))
+        except sqlite3.Error as e:
+            logging.error(f"Event cache could not be written: {e}")
@@ -0,0 +1,519 @@
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+from itertools import islice
+
+import caldav
+from caldav.elements import cdav, dav
+from caldav.elements.base import ValuedBaseElement
+from caldav.lib import error
+from caldav.lib.url import URL
+
+from .calendar_query import request
+from .ical_parser import to_epoch
+from .interval_index import IntervalIndex
+from .recurrence import EventSeries, parse_components, to_utc
+from .tracing import tracer
+
+
+class GetCTag(ValuedBaseElement):
+    """
+    The CalendarServer "getctag" property. The CTag of a calendar collection changes whenever
+    any resource in the collection changes.
+    """
+    tag = "{http://calendarserver.org/ns/}getctag"
+
+
+class EventOccurrence:
+    """
+    This class represents one occurrence of a calendar object resource, e.g. one instance of a recurring event.
+    Start and end are UTC epoch seconds. The occurrence forwards url, data and etag to the caldav resource
+    it belongs to.
+    """
+    __slots__ = ('resource', 'summary', 'start', 'end', 'full_day')
+
+    def __init__(self, resource, summary, start, end, full_day=False):
+        self.resource = resource
+        self.summary = summary
+        self.start = start
+        self.end = end
+        self.full_day = full_day
+
+    @property
+    def url(self):
+        return self.resource.url
+
+    @property
+    def data(self):
+        return self.resource.data
+
+    @data.setter
+    def data(self, value):
+        self.resource.data = value
+
+    @property
+    def etag(self):
+        return self.resource.props.get(dav.GetEtag.tag)
+
+
+class _StoredResource:
+    """
+    One calendar object resource (one .ics file on the server) together with its ETag
+    and the event series parsed from its data. The data is parsed on first use, so a resource restored
+    from the cache is not parsed as long as the cached occurrences answer the queries.
+    """
+
+    def __init__(self, event, etag, zone=None, max_length=None):
+        self.event = event
+        self.etag = etag
+        self.zone = zone
+        self._series = None
+        # longest duration of the components in seconds, known without parsing for cached resources
+        self._max_length = max_length
+
+    @property
+    def series(self):
+        if self._series is None:
+            self._series = EventSeries(parse_components(self.event.data, self.zone), self.zone)
+        return self._series
+
+    @property
+    def max_length(self):
+        if self._max_length is None:
+            self._max_length = self.series.max_length
+        return self._max_length
+
+
+class EventStore:
+    """
+    Local copy of all events of one calendar collection.
+    After one full pull only changed or deleted resources are synchronized. The store uses the
+    sync-token of the collection (RFC 6578) and falls back to CTag/ETag comparison for servers
+    without sync-collection support. Range queries are answered from the local copy: the occurrences of
+    the queried time range are expanded once into an IntervalIndex, later queries in the same range are
+    answered by the index and changed resources are replaced in it incrementally.
+    """
+
+    MULTIGET_CHUNK_SIZE = 200
+    # longest time range in seconds that is kept expanded in the index, longer queries are expanded directly
+    MAX_INDEXED_SPAN = 400 * 24 * 60 * 60
+    # seconds before and after the time of writing whose occurrences are kept in the cache
+    CACHED_PAST = 30 * 24 * 60 * 60
+    CACHED_FUTURE = 365 * 24 * 60 * 60
+
+    def __init__(self, calendar, max_age=30, cache=None, zone=None):
+        """
+        Args:
+            :param calendar: caldav calendar to mirror
+            :param max_age: seconds a synchronized state is used without asking the server for changes
+            :param cache: EventCache the store is persisted in, or None
+            :param zone: tzinfo of the user, floating times and naive query bounds are interpreted in it
+        """
+        self.calendar = calendar
+        self.max_age = max_age
+        self.cache = cache
+        self.zone = zone
+        self.sync_token = None
+        self.ctag = None
+        self.resources = {}
+        self.last_sync = None
+        # true once the store holds a complete state of the calendar, restored from the cache or synchronized.
+        # While the server is not reachable queries are answered from this state, however old it is.
+        self.loaded = False
+        self.index = IntervalIndex()
+        # epoch range [low, high) in which the index contains every occurrence starting in it
+        self.covered = None
+        # upper bound of the duration of all occurrences in seconds
+        self.max_duration = 0
+        # epoch range [low, high) of the occurrences kept in the cache
+        self.cached_range = None
+        # the lock guards the local copy, the sync lock serializes synchronizations. The requests of
+        # a synchronization are sent without the lock, so queries are answered meanwhile.
+        self.lock = threading.RLock()
+        self.sync_lock = threading.Lock()
+
+    def invalidate(self):
+        """
+        Forces a delta synchronization before the next query, e.g. after the skill changed the calendar
+        """
+        self.last_sync = None
+
+    def sync(self, force=False):
+        """
+        Synchronizes the store with the server. The first call pulls all resources, later calls only
+        transfer the changes since the last synchronization.
+
+        Args:
+            :param force: synchronize even if the last synchronization is younger than max_age
+        """
+        if not force and self.is_fresh():
+            return
+        with self.sync_lock:
+            if not force and self.is_fresh():
+                # synchronized by another thread in the meantime
+                return
+            with tracer.span('store.sync'):
+                self._sync()
+            self.loaded = True
+
+    def is_fresh(self):
+        return self.last_sync is not None and time.monotonic() - self.last_sync < self.max_age
+
+    def restore(self):
+        """
+        Loads the store from its cache. The restored state counts as synchronized, so queries are answered
+        without requests until max_age passed or sync(force=True) was called. The index is filled with the
+        cached occurrences, queries in their range are answered without parsing the resources.
+
+        Returns:
+            :return: true if a cached state was found
+        """
+        if self.cache is None:
+            return False
+        state = self.cache.load(str(self.calendar.url))
+        if state is None:
+            return False
+        resources = {url: self._resource(url, data, etag, max_length)
+                     for url, etag, data, max_length in state.resources}
+        with self.lock:
+            self._reset()
+            for url, resource in resources.items():
+                self._put_resource(url, resource)
+            for url, start, end, full_day, summary in state.occurrences:
+                occurrence = EventOccurrence(resources[url].event, summary, start, end, bool(full_day))
+                self.index.insert(url, start, end, occurrence)
+            self.covered = self.cached_range = (state.low, state.high)
+            self.sync_token = state.sync_token
+            self.ctag = state.ctag
+            self.last_sync = time.monotonic()
+            self.loaded = True
+        logging.info(f"Event store restored {len(resources)} resources from the cache")
+        return True
+
+    def _sync(self):
+        if self.sync_token is not None:
+            try:
+                self._sync_by_token()
+            except (error.NotFoundError, error.AuthorizationError):
+                raise
+            except error.DAVError as e:
+                # the token expired or is unknown to the server
+                logging.info(f"Sync token was rejected, pulling the whole calendar: {e}")
+                self._full_pull()
+        elif self.ctag is not None:
+            self._sync_by_ctag()
+        else:
+            self._full_pull()
+
+    def events_between(self, start, end, limit=None, reverse=False, only_starting=False):
+        """
+        Returns all occurrences overlapping the time interval. Recurring events are expanded locally.
+
+        Args:
+            :param start: begin date of the time interval
+            :param end: end date of the time interval
+            :param limit: the result contains the first limit occurrences by start, or the last ones if reverse
+                is true, further occurrences may be left out. Occurrences running at start are always returned.
+            :param reverse: see limit
+            :param only_starting: leave out the occurrences that started before start, they do not count
+                towards limit
+
+        Returns:
+            :return: list of EventOccurrence objects (unsorted)
+        """
+        with self.lock:
+            first = to_epoch(start, self.zone)
+            last = to_epoch(end, self.zone)
+            if last - first + self.max_duration <= self.MAX_INDEXED_SPAN:
+                self._cover(first - self.max_duration, last)
+                return self._indexed_between(first, last, limit, reverse, only_starting)
+
+            start = to_utc(start, self.zone)
+            end = to_utc(end, self.zone)
+            events = []
+            for resource in self.resources.values():
+                events.extend(self._occurrences(resource, start, end, limit, reverse, only_starting))
+            return events
+
+    def put(self, url, data, etag=None):
+        """
+        Stores a resource the skill created or changed itself, so that the following queries return it
+        without a synchronization. A resource without ETag is downloaded again by the next synchronization.
+
+        Args:
+            :param url: url of the resource
+            :param data: ical string of the resource
+            :param etag: ETag the server returned for the resource, if any
+        """
+        resource = self._resource(url, data, etag)
+        with self.lock:
+            self._put_resource(url, resource)
+        self._persist(changed={url: resource})
+
+    def discard(self, url):
+        """
+        Removes a resource the skill deleted itself
+        """
+        with self.lock:
+            self._drop_resource(url)
+        self._persist(deleted=(url,))
+
+    def _resource(self, url, data, etag, max_length=None):
+        event = caldav.Event(self.calendar.client, url=url, data=data, parent=self.calendar,
+                             props={dav.GetEtag.tag: etag} if etag else {})
+        return _StoredResource(event, etag, self.zone, max_length)
+
+    def _reset(self):
+        self.resources = {}
+        self.index.clear()
+        self.covered = None
+        self.max_duration = 0
+
+    def _persist(self, changed=None, deleted=(), replace=False):
+        """
+        Writes changed and deleted resources with their occurrences in the cached range and the sync state to
+        the cache. The whole store is written for a new range around now after a full pull and once less than
+        half of CACHED_FUTURE of the cached range is left.
+        """
+        if self.cache is None:
+            return
+        now = int(time.time())
+        cached_range = self.cached_range
+        if replace or cached_range is None or cached_range[1] - now < self.CACHED_FUTURE // 2:
+            replace = True
+            cached_range = (now - self.CACHED_PAST, now + self.CACHED_FUTURE)
+            with self.lock:
+                changed = dict(self.resources)
+        changed = changed or {}
+        rows = [(url, resource.etag, resource.event.data, resource.max_length) for url, resource in changed.items()]
+        occurrences = [(url, occurrence.start, occurrence.end, int(occurrence.full_day), occurrence.summary)
+                       for url, resource in changed.items()
+                       for occurrence in self._occurrences_starting(resource, *cached_range)]
+        if replace:
+            self.cache.replace(str(self.calendar.url), self.sync_token, self.ctag, *cached_range, rows, occurrences)
+            self.cached_range = cached_range
+        else:
+            self.cache.update(str(self.calendar.url), self.sync_token, self.ctag, rows, occurrences, deleted)
+
+    def _indexed_between(self, first, last, limit, reverse, only_starting):
+        """
+        Answers events_between from the index, with a limit only the first or last limit occurrences
+        starting in the interval are read
+        """
+        index = self.index
+        if limit is None:
+            events = index.overlapping(first, last)
+            return [event for event in events if event.start >= first] if only_starting else events
+        starting = index.last_before(last, limit) if reverse else index.first_after(first, limit)
+        events = [event for event in starting if first <= event.start < last]
+        if not only_starting:
+            # occurrences that started before the interval and are still running at its begin
+            events.extend(index.overlapping(first, first))
+        return events
+
+    def _cover(self, low, high):
+        """
+        Expands the occurrences starting in [low, high) into the index. The covered range grows as long as
+        it stays below MAX_INDEXED_SPAN, otherwise the index is rebuilt for the new range.
+        """
+        if self.covered is not None:
+            covered_low, covered_high = self.covered
+            if low >= covered_low and high <= covered_high:
+                return
+            if high < covered_low or low > covered_high or \
+                    max(high, covered_high) - min(low, covered_low) > self.MAX_INDEXED_SPAN:
+                self.covered = None
+        if self.covered is None:
+            self.index.clear()
+            self.covered = (low, low)
+        covered_low, covered_high = self.covered
+        with tracer.span('store.expand'):
+            if low < covered_low:
+                self._expand_into_index(self.resources.items(), low, covered_low)
+            if high > covered_high:
+                self._expand_into_index(self.resources.items(), covered_high, high)
+        self.covered = (min(low, covered_low), max(high, covered_high))
+
+    def _expand_into_index(self, resources, low, high):
+        for url, resource in resources:
+            for occurrence in self._occurrences_starting(resource, low, high):
+                self.index.insert(url, occurrence.start, occurrence.end, occurrence)
+
+    def _occurrences_starting(self, resource, low, high):
+        """
+        Returns the occurrences of a resource starting in the epoch range [low, high)
+        """
+        start = datetime.fromtimestamp(low, timezone.utc)
+        end = datetime.fromtimestamp(high, timezone.utc)
+        return [occurrence for occurrence in self._occurrences(resource, start, end) if low <= occurrence.start < high]
+
+    def _put_resource(self, url, resource):
+        self._drop_resource(url)
+        self.resources[url] = resource
+        self.max_duration = max(self.max_duration, resource.max_length)
+        if self.covered is not None:
+            self._expand_into_index(((url, resource),), *self.covered)
+
+    def _drop_resource(self, url):
+        if self.resources.pop(url, None) is not None:
+            self.index.remove(url)
+
+    def _occurrences(self, resource, start, end, limit=None, reverse=False, only_starting=False):
+        occurrences = islice(resource.series.occurrences(start, end, reverse, only_starting), limit)
+        return [self._occurrence(resource, component, occurrence_start, occurrence_end)
+                for component, occurrence_start, occurrence_end in occurrences]
+
+    def _occurrence(self, resource, component, start, end):
+        return EventOccurrence(resource.event, component.summary, to_epoch(start), to_epoch(end),
+                               not isinstance(component.start, datetime))
+
+    def _full_pull(self):
+        """
+        Loads all resources of the calendar. Uses a sync-collection REPORT without token if the server
+        supports it, otherwise a PROPFIND listing of the ETags.
+        """
+        ctag = None
+        try:
+            sync_token, etags = self._sync_collection(None)
+        except (error.NotFoundError, error.AuthorizationError):
+            raise
+        except error.DAVError as e:
+            logging.info(f"Calendar server does not support sync-collection, using CTag/ETag comparison: {e}")
+            ctag = self._fetch_ctag()
+            etags = self._fetch_etags()
+            sync_token = None
+
+        loaded = self._load({url: etag for url, etag in etags.items() if etag is not None})
+        with self.lock:
+            self._reset()
+            for url, resource in loaded.items():
+                self._put_resource(url, resource)
+            self.sync_token = sync_token
+            self.ctag = ctag
+            self.last_sync = time.monotonic()
+        self._persist(changed=loaded, replace=True)
+        logging.info(f"Event store loaded {len(loaded)} resources")
+
+    def _sync_by_token(self):
+        sync_token, etags = self._sync_collection(self.sync_token)
+        changed = self._changed(etags)
+        loaded = self._load(changed)
+        # resources that vanished before the multiget are dropped as well
+        deleted = [url for url, etag in etags.items() if etag is None or (url in changed and url not in loaded)]
+        with self.lock:
+            for url in deleted:
+                self._drop_resource(url)
+            for url, resource in loaded.items():
+                self._put_resource(url, resource)
+            self.sync_token = sync_token
+            self.last_sync = time.monotonic()
+        self._persist(changed=loaded, deleted=deleted)
+        logging.info(f"Event store synchronized {len(etags)} changes")
+
+    def _sync_by_ctag(self):
+        ctag = self._fetch_ctag()
+        if ctag is not None and ctag == self.ctag:
+            self.last_sync = time.monotonic()
+            return
+        etags = self._fetch_etags()
+        changed = self._changed(etags)
+        loaded = self._load(changed)
+        with self.lock:
+            deleted = [url for url in self.resources if url not in etags or (url in changed and url not in loaded)]
+        with self.lock:
+            for url in deleted:
+                self._drop_resource(url)
+            for url, resource in loaded.items():
+                self._put_resource(url, resource)
+            self.ctag = ctag
+            self.last_sync = time.monotonic()
+        self._persist(changed=loaded, deleted=deleted)
+
+    def _changed(self, etags):
+        """
+        Returns the resources whose ETag differs from the stored one
+
+        Args:
+            :param etags: dict of url -> etag reported by the server, None for deleted resources
+        """
+        with self.lock:
+            return {url: etag for url, etag in etags.items() if etag is not None and
+                    (url not in self.resources or self.resources[url].etag != etag)}
+
+    def _load(self, etags):
+        """
+        Downloads and parses the given resources with calendar-multiget REPORTs.
+        Resources that were deleted in the meantime are left out.
+
+        Args:
+            :param etags: dict of url -> etag of the resources to load
+
+        Returns:
+            :return: dict of url -> _StoredResource
+        """
+        resources = {}
+        urls = list(etags)
+        for i in range(0, len(urls), self.MULTIGET_CHUNK_SIZE):
+            chunk = urls[i:i + self.MULTIGET_CHUNK_SIZE]
+            loaded = self._multiget(chunk)
+            with tracer.span('parse'):
+                for url in chunk:
+                    if url in loaded:
+                        data, etag = loaded[url]
+                        resources[url] = self._resource(url, data, etag or etags[url])
+        return resources
+
+    def _request(self, method, root, depth):
+        return request(self.calendar, method, root, depth)
+
+    def _url(self, href):
+        return str(self.calendar.url.join(URL.objectify(href)))
+
+    def _sync_collection(self, sync_token):
+        """
+        Sends a sync-collection REPORT (RFC 6578)
+
+        Returns:
+            :return: new sync token and dict of url -> etag, the etag is None for deleted resources
+        """
+        root = dav.SyncCollection() + [dav.SyncToken(value=sync_token), dav.SyncLevel(value="1"),
+                                       dav.Prop() + dav.GetEtag()]
+        response = self._request("REPORT", root, 1)
+        results = response.expand_simple_props([dav.GetEtag()])
+        tokens = response.tree.findall(".//" + dav.SyncToken.tag)
+        if not tokens:
+            raise error.ReportError("no sync-token in sync-collection response")
+
+        etags = {}
+        for href, props in results.items():
+            url = self._url(href)
+            if url != str(self.calendar.url):
+                etags[url] = props.get(dav.GetEtag.tag)
+        return tokens[0].text, etags
+
+    def _fetch_ctag(self):
+        response = self._request("PROPFIND", dav.Propfind() + (dav.Prop() + GetCTag()), 0)
+        for props in response.expand_simple_props([GetCTag()]).values():
+            if props.get(GetCTag.tag):
+                return props[GetCTag.tag]
+        return None
+
+    def _fetch_etags(self):
+        response = self._request("PROPFIND", dav.Propfind() + (dav.Prop() + dav.GetEtag()), 1)
+        etags = {}
+        for href, props in response.expand_simple_props([dav.GetEtag()]).items():
+            url = self._url(href)
+            if url != str(self.calendar.url) and props.get(dav.GetEtag.tag):
+                etags[url] = props[dav.GetEtag.tag]
+        return etags
+
+    def _multiget(self, urls):
+        root = cdav.CalendarMultiGet() + (dav.Prop() + [dav.GetEtag(), cdav.CalendarData()]) + \
+            [dav.Href(value=URL.objectify(url).path) for url in urls]
+        response = self._request("REPORT", root, 1)
+        loaded = {}
+        for href, props in response.expand_simple_props([dav.GetEtag(), cdav.CalendarData()]).items():
+            if props.get(cdav.CalendarData.tag):
+                loaded[self._url(href)] = (props[cdav.CalendarData.tag], props.get(dav.GetEtag.tag))
+        return loaded
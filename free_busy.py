@@ -0,0 +1,108 @@
+from datetime import datetime, time, timedelta
+
+from .ical_parser import to_epoch
+
+# slots start at a multiple of 15 minutes, e.g. 10:15 instead of 10:07
+SLOT_ALIGNMENT = 15 * 60
+
+
+def merge_busy(intervals):
+    """
+    Merges busy intervals into disjoint intervals with one sweep. Overlapping and adjacent intervals,
+    e.g. of events in different calendars, become one interval.
+
+    Args:
+        :param intervals: iterable of (start, end) tuples in UTC epoch seconds, sorted by start
+
+    Returns:
+        :return list of disjoint [start, end] lists sorted by start
+    """
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        elif end > start:
+            merged.append([start, end])
+    return merged
+
+
+def free_intervals(busy, windows):
+    """
+    Returns the gaps between the busy intervals inside the windows. Both lists are swept once.
+
+    Args:
+        :param busy: disjoint busy intervals sorted by start, see merge_busy
+        :param windows: disjoint (start, end) tuples sorted by start, e.g. the working hours of each day
+
+    Returns:
+        :return list of free (start, end) tuples sorted by start
+    """
+    free = []
+    first = 0
+    for window_start, window_end in windows:
+        # intervals that ended before the window are not needed by the following windows either
+        while first < len(busy) and busy[first][1] <= window_start:
+            first += 1
+        cursor = window_start
+        index = first
+        while index < len(busy) and busy[index][0] < window_end:
+            if busy[index][0] > cursor:
+                free.append((cursor, busy[index][0]))
+            cursor = max(cursor, busy[index][1])
+            index += 1
+        if cursor < window_end:
+            free.append((cursor, window_end))
+    return free
+
+
+def day_windows(start, end, zone, first_hour, last_hour):
+    """
+    Returns the hours from first_hour to last_hour of each day between start and end, in the time zone zone
+
+    Args:
+        :param start: aware begin datetime
+        :param end: aware end datetime
+        :param zone: tzinfo of the days
+        :param first_hour: hour the windows start at, e.g. 8
+        :param last_hour: hour the windows end at, e.g. 20, 24 for midnight
+
+    Returns:
+        :return list of (start, end) tuples in UTC epoch seconds
+    """
+    low = to_epoch(start)
+    high = to_epoch(end)
+    windows = []
+    day = start.astimezone(zone).date()
+    last_day = end.astimezone(zone).date()
+    while day <= last_day:
+        midnight = datetime.combine(day, time(), tzinfo=zone)
+        window_start = max(low, to_epoch(midnight + timedelta(hours=first_hour)))
+        window_end = min(high, to_epoch(midnight + timedelta(hours=last_hour)))
+        if window_start < window_end:
+            windows.append((window_start, window_end))
+        day += timedelta(days=1)
+    return windows
+
+
+def find_slots(free, duration, limit=None, alignment=SLOT_ALIGNMENT):
+    """
+    Returns the first slot of the given length in each free interval that is long enough
+
+    Args:
+        :param free: free (start, end) tuples sorted by start, see free_intervals
+        :param duration: length of the slots in seconds
+        :param limit: maximum number of slots
+        :param alignment: the slots start at a multiple of alignment seconds
+
+    Returns:
+        :return list of (start, end) tuples in UTC epoch seconds
+    """
+    slots = []
+    for start, end in free:
+        if limit is not None and len(slots) >= limit:
+            break
+        start = -(-start // alignment) * alignment
+        if start + duration <= end:
+            slots.append((start, start + duration))
+    return slots
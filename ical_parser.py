@@ -0,0 +1,677 @@
+import io
+import logging
+import re
+import uuid
+from datetime import date, datetime, timedelta, timezone
+
+from dateutil import tz
+
+# properties of a VEVENT the skill reads, all other content lines are skipped without parsing
+VEVENT_PROPERTIES = frozenset(('UID', 'SUMMARY', 'DTSTART', 'DTEND', 'DURATION', 'RRULE', 'EXDATE', 'RDATE',
+                               'RECURRENCE-ID'))
+
+DURATION_PATTERN = re.compile(r'([-+])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?')
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# maximum length of a content line in octets before it has to be folded (RFC 5545 3.1)
+MAX_LINE_LENGTH = 75
+
+# date properties of a VEVENT that move with its start when the event is moved, see shift_times
+START_PROPERTIES = frozenset(('DTSTART', 'RECURRENCE-ID', 'EXDATE', 'RDATE'))
+
+# VCALENDAR properties that are not allowed in a calendar object resource (RFC 4791 4.1)
+SKIPPED_CALENDAR_PROPERTIES = frozenset(('METHOD',))
+DEFAULT_CALENDAR_PROPERTIES = ('VERSION:2.0', 'PRODID:-//Sabre//Sabre VObject 4.3.0//EN')
+
+# Windows time zone names used as TZID by Outlook and Exchange, mapped to the Olson zone of their
+# main territory (CLDR windowsZones)
+WINDOWS_ZONES = {
+    'Dateline Standard Time': 'Etc/GMT+12',
+    'Hawaiian Standard Time': 'Pacific/Honolulu',
+    'Alaskan Standard Time': 'America/Anchorage',
+    'Pacific Standard Time': 'America/Los_Angeles',
+    'US Mountain Standard Time': 'America/Phoenix',
+    'Mountain Standard Time': 'America/Denver',
+    'Central America Standard Time': 'America/Guatemala',
+    'Central Standard Time': 'America/Chicago',
+    'Canada Central Standard Time': 'America/Regina',
+    'Mexico Standard Time': 'America/Mexico_City',
+    'Central Standard Time (Mexico)': 'America/Mexico_City',
+    'SA Pacific Standard Time': 'America/Bogota',
+    'Eastern Standard Time': 'America/New_York',
+    'US Eastern Standard Time': 'America/Indianapolis',
+    'Atlantic Standard Time': 'America/Halifax',
+    'Newfoundland Standard Time': 'America/St_Johns',
+    'E. South America Standard Time': 'America/Sao_Paulo',
+    'Argentina Standard Time': 'America/Buenos_Aires',
+    'UTC': 'Etc/UTC',
+    'GMT Standard Time': 'Europe/London',
+    'Greenwich Standard Time': 'Atlantic/Reykjavik',
+    'W. Europe Standard Time': 'Europe/Berlin',
+    'Central Europe Standard Time': 'Europe/Budapest',
+    'Romance Standard Time': 'Europe/Paris',
+    'Central European Standard Time': 'Europe/Warsaw',
+    'W. Central Africa Standard Time': 'Africa/Lagos',
+    'GTB Standard Time': 'Europe/Bucharest',
+    'E. Europe Standard Time': 'Europe/Chisinau',
+    'FLE Standard Time': 'Europe/Kiev',
+    'Israel Standard Time': 'Asia/Jerusalem',
+    'Egypt Standard Time': 'Africa/Cairo',
+    'South Africa Standard Time': 'Africa/Johannesburg',
+    'Turkey Standard Time': 'Europe/Istanbul',
+    'Arab Standard Time': 'Asia/Riyadh',
+    'Russian Standard Time': 'Europe/Moscow',
+    'E. Africa Standard Time': 'Africa/Nairobi',
+    'Iran Standard Time': 'Asia/Tehran',
+    'Arabian Standard Time': 'Asia/Dubai',
+    'Pakistan Standard Time': 'Asia/Karachi',
+    'India Standard Time': 'Asia/Calcutta',
+    'Nepal Standard Time': 'Asia/Katmandu',
+    'Bangladesh Standard Time': 'Asia/Dhaka',
+    'SE Asia Standard Time': 'Asia/Bangkok',
+    'China Standard Time': 'Asia/Shanghai',
+    'Singapore Standard Time': 'Asia/Singapore',
+    'Taipei Standard Time': 'Asia/Taipei',
+    'Tokyo Standard Time': 'Asia/Tokyo',
+    'Korea Standard Time': 'Asia/Seoul',
+    'Cen. Australia Standard Time': 'Australia/Adelaide',
+    'AUS Central Standard Time': 'Australia/Darwin',
+    'E. Australia Standard Time': 'Australia/Brisbane',
+    'AUS Eastern Standard Time': 'Australia/Sydney',
+    'W. Australia Standard Time': 'Australia/Perth',
+    'New Zealand Standard Time': 'Pacific/Auckland',
+}
+
+# VTIMEZONE definitions that were already parsed, by their ical text
+_DEFINED_ZONES = {}
+# TZIDs that could not be resolved, each is logged once
+_UNKNOWN_ZONES = set()
+
+
+class VEventRecord:
+    """
+    This class represents one VEVENT of an ical string, e.g. one instance of an expanded recurring event.
+    Timed values are datetimes (aware, or naive for floating times), full day values are dates.
+    """
+    __slots__ = ('uid', 'summary', 'start', 'end', 'duration', 'rrule', 'exdates', 'rdates', 'recurrence_id')
+
+    def __init__(self):
+        self.uid = None
+        self.summary = None
+        self.start = None
+        self.end = None
+        self.duration = None
+        self.rrule = None
+        self.exdates = None
+        self.rdates = None
+        self.recurrence_id = None
+
+
+def iter_content_lines(data):
+    """
+    Yields the unfolded content lines of an ical string (RFC 5545 3.1).
+    Lines starting with a space or tab continue the previous line.
+
+    Args:
+        :param data: ical string
+
+    Returns:
+        :return generator of content lines without line breaks
+    """
+    current = None
+    folded = None
+    pos = 0
+    length = len(data)
+    while pos < length:
+        end = data.find('\n', pos)
+        if end == -1:
+            end = length
+        stop = end - 1 if end > pos and data[end - 1] == '\r' else end
+        if data[pos] in ' \t' and current is not None:
+            if folded is None:
+                folded = [current]
+            folded.append(data[pos + 1:stop])
+        else:
+            if current:
+                yield current if folded is None else ''.join(folded)
+            current = data[pos:stop]
+            folded = None
+        pos = end + 1
+    if current:
+        yield current if folded is None else ''.join(folded)
+
+
+def split_name(line):
+    """
+    Returns the upper case property name of a content line and the index where its parameters or value start
+    """
+    end = line.find(':')
+    semicolon = line.find(';', 0, end if end != -1 else len(line))
+    if semicolon != -1:
+        end = semicolon
+    if end == -1:
+        end = len(line)
+    return line[:end].upper(), end
+
+
+def parse_content_line(line, start=None):
+    """
+    Parses a content line into its name, parameters and value. Quoted parameter values may contain ':' and ';'.
+
+    Args:
+        :param line: unfolded content line
+        :param start: index after the property name, if already known
+
+    Returns:
+        :return name, dict of upper case parameter names to values (None without parameters), value
+    """
+    if start is None:
+        name, start = split_name(line)
+    else:
+        name = line[:start].upper()
+    params = None
+    pos = start
+    length = len(line)
+    while pos < length and line[pos] == ';':
+        equals = line.find('=', pos + 1)
+        if equals == -1:
+            break
+        param_name = line[pos + 1:equals].upper()
+        pos = equals + 1
+        if pos < length and line[pos] == '"':
+            closing = line.find('"', pos + 1)
+            if closing == -1:
+                closing = length
+            param_value = line[pos + 1:closing]
+            pos = closing + 1
+            # further values of a list parameter are not needed by the skill
+            while pos < length and line[pos] not in ';:':
+                pos += 1
+        else:
+            end = pos
+            while end < length and line[end] not in ';:':
+                end += 1
+            param_value = line[pos:end]
+            pos = end
+        if params is None:
+            params = {}
+        params[param_name] = param_value
+    value = line[pos + 1:] if pos < length else ''
+    return name, params, value
+
+
+def unescape_text(value):
+    """
+    Reverts the escaping of TEXT values (RFC 5545 3.3.11)
+    """
+    if '\\' not in value:
+        return value
+    result = []
+    pos = 0
+    length = len(value)
+    while pos < length:
+        char = value[pos]
+        if char == '\\' and pos + 1 < length:
+            pos += 1
+            char = value[pos]
+            result.append('\n' if char in 'nN' else char)
+        else:
+            result.append(char)
+        pos += 1
+    return ''.join(result)
+
+
+def escape_text(value):
+    """
+    Escapes a string for a TEXT value (RFC 5545 3.3.11)
+    """
+    return value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\r\n', '\\n') \
+        .replace('\n', '\\n')
+
+
+def fold_line(line):
+    """
+    Folds a content line so that no physical line is longer than 75 octets (RFC 5545 3.1)
+
+    Returns:
+        :return the folded line without the final line break
+    """
+    encoded = line.encode('utf-8')
+    if len(encoded) <= MAX_LINE_LENGTH:
+        return line
+    parts = []
+    pos = 0
+    limit = MAX_LINE_LENGTH
+    while pos < len(encoded):
+        end = min(pos + limit, len(encoded))
+        # do not split multi-octet utf-8 characters
+        while end < len(encoded) and (encoded[end] & 0xC0) == 0x80:
+            end -= 1
+        parts.append(encoded[pos:end].decode('utf-8'))
+        pos = end
+        # continuation lines start with a space which counts to the line length
+        limit = MAX_LINE_LENGTH - 1
+    return '\r\n '.join(parts)
+
+
+def get_zone(tzid, definitions=None):
+    """
+    Returns the tzinfo for a TZID parameter or None if the zone is unknown. Olson names and Windows
+    names are resolved directly, other TZIDs by the VTIMEZONE that defines them.
+
+    Args:
+        :param tzid: value of the TZID parameter
+        :param definitions: ical texts of the VTIMEZONE components of the calendar object resource
+    """
+    name = tzid.strip('/')
+    zone = tz.gettz(name)
+    if zone is None and name in WINDOWS_ZONES:
+        zone = tz.gettz(WINDOWS_ZONES[name])
+    if zone is None and definitions:
+        zone = defined_zone(tzid, definitions)
+    return zone
+
+
+def defined_zone(tzid, definitions):
+    """
+    Returns the tzinfo a VTIMEZONE defines for a TZID or None if no VTIMEZONE defines it
+    """
+    for text in definitions:
+        zones = _DEFINED_ZONES.get(text)
+        if zones is None:
+            try:
+                zones = tz.tzical(io.StringIO(text))
+            except ValueError as e:
+                logging.error(f"Could not parse VTIMEZONE: {e}")
+                zones = False
+            _DEFINED_ZONES[text] = zones
+        if zones and tzid in zones.keys():
+            return zones.get(tzid)
+    return None
+
+
+def parse_date_value(value, params=None, definitions=None):
+    """
+    Parses a DATE or DATE-TIME value
+
+    Args:
+        :param value: value of the content line, e.g. 20220510 or 20220510T100000Z
+        :param params: parameters of the content line, TZID and VALUE=DATE are evaluated
+        :param definitions: ical texts of the VTIMEZONE components that define the TZIDs
+
+    Returns:
+        :return date for DATE values, aware datetime for UTC or TZID times, naive datetime for floating times
+    """
+    value = value.strip()
+    if len(value) == 8 or (params is not None and params.get('VALUE') == 'DATE'):
+        return date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+    result = datetime(int(value[0:4]), int(value[4:6]), int(value[6:8]),
+                      int(value[9:11]), int(value[11:13]), int(value[13:15]))
+    if value.endswith('Z'):
+        return result.replace(tzinfo=timezone.utc)
+    tzid = params.get('TZID') if params is not None else None
+    if tzid:
+        zone = get_zone(tzid, definitions)
+        if zone is not None:
+            return result.replace(tzinfo=zone)
+        if tzid not in _UNKNOWN_ZONES:
+            _UNKNOWN_ZONES.add(tzid)
+            logging.error(f"Unknown time zone {tzid}, using floating time")
+    return result
+
+
+def parse_duration(value):
+    """
+    Parses a DURATION value, e.g. PT1H30M
+    """
+    match = DURATION_PATTERN.fullmatch(value.strip())
+    if match is None:
+        raise ValueError(f"invalid duration {value}")
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(weeks=int(weeks or 0), days=int(days or 0), hours=int(hours or 0),
+                         minutes=int(minutes or 0), seconds=int(seconds or 0))
+    return -duration if sign == '-' else duration
+
+
+def format_duration(value):
+    """
+    Formats a timedelta as DURATION value, e.g. PT1H30M or P1D
+    """
+    seconds = int(value.total_seconds())
+    sign = '-' if seconds < 0 else ''
+    days, rest = divmod(abs(seconds), 86400)
+    hours, rest = divmod(rest, 3600)
+    minutes, seconds = divmod(rest, 60)
+    time = ''.join(f"{number}{unit}" for number, unit in ((hours, 'H'), (minutes, 'M'), (seconds, 'S')) if number)
+    if not days and not time:
+        time = '0S'
+    return f"{sign}P{f'{days}D' if days else ''}{f'T{time}' if time else ''}"
+
+
+def to_epoch(value, zone=None):
+    """
+    Converts a date or datetime to UTC epoch seconds. Dates are interpreted as midnight UTC,
+    floating (naive) times in zone, or as UTC if no zone is given.
+    """
+    if not isinstance(value, datetime):
+        return (value.toordinal() - EPOCH_ORDINAL) * 86400
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=zone or timezone.utc)
+    return int(value.timestamp())
+
+
+def _finish(record):
+    if record.end is None:
+        if record.duration is not None:
+            record.end = record.start + record.duration
+        elif isinstance(record.start, datetime):
+            record.end = record.start
+        else:
+            record.end = record.start + timedelta(days=1)
+
+
+def iter_vevents(data):
+    """
+    Parses an ical string in a single pass and yields one record per VEVENT.
+    Properties of nested components (e.g. the DESCRIPTION of a VALARM) are ignored,
+    VEVENTs without DTSTART are skipped. The VTIMEZONEs before a VEVENT resolve its TZIDs.
+
+    Args:
+        :param data: ical string of a calendar object resource
+
+    Returns:
+        :return generator of VEventRecord objects
+    """
+    record = None
+    depth = 0
+    definitions = []
+    zone_lines = None
+    for line in iter_content_lines(data):
+        name, start = split_name(line)
+        if zone_lines is not None:
+            zone_lines.append(line)
+            if name == 'END' and line[start + 1:].strip().upper() == 'VTIMEZONE':
+                definitions.append('\r\n'.join(zone_lines))
+                zone_lines = None
+            continue
+        if name == 'BEGIN':
+            if record is not None:
+                depth += 1
+            elif line[start + 1:].strip().upper() == 'VEVENT':
+                record = VEventRecord()
+            elif line[start + 1:].strip().upper() == 'VTIMEZONE':
+                zone_lines = [line]
+            continue
+        if record is None:
+            continue
+        if name == 'END':
+            if depth:
+                depth -= 1
+            elif line[start + 1:].strip().upper() == 'VEVENT':
+                if record.start is not None:
+                    _finish(record)
+                    yield record
+                else:
+                    logging.error(f"Skipped VEVENT without DTSTART: {record.uid}")
+                record = None
+            continue
+        if depth or name not in VEVENT_PROPERTIES:
+            continue
+
+        _, params, value = parse_content_line(line, start)
+        try:
+            if name == 'SUMMARY':
+                record.summary = unescape_text(value)
+            elif name == 'DTSTART':
+                record.start = parse_date_value(value, params, definitions)
+            elif name == 'DTEND':
+                record.end = parse_date_value(value, params, definitions)
+            elif name == 'DURATION':
+                record.duration = parse_duration(value)
+            elif name == 'UID':
+                record.uid = value
+            elif name == 'RRULE':
+                record.rrule = value
+            elif name == 'RECURRENCE-ID':
+                record.recurrence_id = parse_date_value(value, params, definitions)
+            elif name == 'EXDATE':
+                if record.exdates is None:
+                    record.exdates = []
+                record.exdates.extend(parse_date_value(v, params, definitions) for v in value.split(','))
+            elif name == 'RDATE' and (params is None or params.get('VALUE') != 'PERIOD'):
+                if record.rdates is None:
+                    record.rdates = []
+                record.rdates.extend(parse_date_value(v, params, definitions) for v in value.split(','))
+        except ValueError as e:
+            logging.error(f"Could not parse {name} of event {record.uid}: {e}")
+
+
+def set_summary(data, summary):
+    """
+    Replaces the SUMMARY of every VEVENT in an ical string. All other lines are kept unchanged,
+    VEVENTs without SUMMARY get one.
+
+    Args:
+        :param data: ical string of a calendar object resource
+        :param summary: new title
+
+    Returns:
+        :return ical string with the new summary
+    """
+    summary_line = fold_line(f"SUMMARY:{escape_text(summary)}")
+    result = []
+    in_vevent = False
+    has_summary = False
+    depth = 0
+    for line in iter_content_lines(data):
+        name, start = split_name(line)
+        if name == 'BEGIN':
+            if in_vevent:
+                depth += 1
+            elif line[start + 1:].strip().upper() == 'VEVENT':
+                in_vevent = True
+                has_summary = False
+        elif name == 'END' and in_vevent:
+            if depth:
+                depth -= 1
+            elif line[start + 1:].strip().upper() == 'VEVENT':
+                if not has_summary:
+                    result.append(summary_line)
+                in_vevent = False
+        elif name == 'SUMMARY' and in_vevent and not depth:
+            if not has_summary:
+                result.append(summary_line)
+                has_summary = True
+            continue
+        result.append(fold_line(line))
+    result.append('')
+    return '\r\n'.join(result)
+
+
+def set_properties(data, properties):
+    """
+    Replaces properties of the main VEVENT in an ical string, the one without RECURRENCE-ID. Overridden
+    instances of a recurring event, nested components and all other lines are kept unchanged.
+
+    Args:
+        :param data: ical string of a calendar object resource
+        :param properties: dict of property name -> new content line, None removes the property
+
+    Returns:
+        :return ical string with the new properties
+    """
+    result = []
+    component = None
+    names = None
+    depth = 0
+    for line in iter_content_lines(data):
+        name, start = split_name(line)
+        if component is None:
+            if name == 'BEGIN' and line[start + 1:].strip().upper() == 'VEVENT':
+                component = [line]
+                names = [None]
+                depth = 0
+            else:
+                result.append(line)
+            continue
+        component.append(line)
+        # only the properties of the VEVENT itself, not the ones of its VALARMs, are replaced
+        names.append(name if not depth and name not in ('BEGIN', 'END') else None)
+        if name == 'BEGIN':
+            depth += 1
+        elif name == 'END':
+            if depth:
+                depth -= 1
+                continue
+            if 'RECURRENCE-ID' in names:
+                result.extend(component)
+            else:
+                result.extend(line for line, name in zip(component[:-1], names) if name not in properties)
+                result.extend(value for value in properties.values() if value is not None)
+                result.append(line)
+            component = None
+    result = [fold_line(line) for line in result]
+    result.append('')
+    return '\r\n'.join(result)
+
+
+def shift_value(value, delta, zone=None):
+    """
+    Shifts a DATE or DATE-TIME value by a wall-clock timedelta and keeps its form. Dates move by whole days,
+    UTC times (Z) are shifted in the wall clock of zone, so a series keeps its local time across daylight
+    saving time changes. Times with TZID and floating times are wall-clock times already.
+
+    Args:
+        :param value: DATE or DATE-TIME value, e.g. 20220510 or 20220510T100000Z
+        :param delta: timedelta
+        :param zone: tzinfo of the wall clock of UTC times, None to shift them in UTC
+
+    Returns:
+        :return: shifted value
+    """
+    value = value.strip()
+    if 'T' not in value:
+        return (datetime.strptime(value, '%Y%m%d') + timedelta(days=delta.days)).strftime('%Y%m%d')
+    utc = value.endswith('Z')
+    time = datetime.strptime(value.rstrip('Z'), '%Y%m%dT%H%M%S')
+    if utc and zone is not None:
+        local = time.replace(tzinfo=timezone.utc).astimezone(zone).replace(tzinfo=None) + delta
+        time = local.replace(tzinfo=zone).astimezone(timezone.utc).replace(tzinfo=None)
+    else:
+        time += delta
+    return time.strftime('%Y%m%dT%H%M%S') + ('Z' if utc else '')
+
+
+def shift_times(data, start_delta, end_delta, zone=None):
+    """
+    Moves all VEVENTs of an ical string, e.g. a recurring event with its overridden instances. The start and
+    the RECURRENCE-ID, EXDATE and RDATE values are shifted by start_delta, so overrides and exceptions stay
+    attached to their instances, DTEND is shifted by end_delta. A DURATION is changed by the difference of
+    both. Nested components and all other lines are kept unchanged.
+
+    Args:
+        :param data: ical string of a calendar object resource
+        :param start_delta: wall-clock timedelta of the start, see shift_value
+        :param end_delta: wall-clock timedelta of the end
+        :param zone: tzinfo of the wall clock of UTC times
+
+    Returns:
+        :return ical string with the moved events
+    """
+    result = []
+    in_event = False
+    depth = 0
+    for line in iter_content_lines(data):
+        name, start = split_name(line)
+        if not in_event:
+            in_event = name == 'BEGIN' and line[start + 1:].strip().upper() == 'VEVENT'
+            result.append(line)
+            continue
+        if name == 'BEGIN':
+            depth += 1
+        elif name == 'END':
+            if depth:
+                depth -= 1
+            else:
+                in_event = False
+        elif not depth and (name in START_PROPERTIES or name in ('DTEND', 'DURATION')):
+            _, params, value = parse_content_line(line, start)
+            prefix = line[:len(line) - len(value)]
+            if name == 'DURATION':
+                if end_delta != start_delta:
+                    value = format_duration(parse_duration(value) + end_delta - start_delta)
+            else:
+                delta = end_delta if name == 'DTEND' else start_delta
+                values = []
+                for part in value.split(','):
+                    if params is not None and params.get('VALUE') == 'PERIOD':
+                        # start/end or start/duration, only the times are shifted
+                        period_start, _, period_end = part.partition('/')
+                        if not period_end.lstrip('+-').startswith('P'):
+                            period_end = shift_value(period_end, delta, zone)
+                        values.append(f"{shift_value(period_start, delta, zone)}/{period_end}")
+                    else:
+                        values.append(shift_value(part, delta, zone))
+                value = ','.join(values)
+            line = prefix + value
+        result.append(line)
+    result = [fold_line(line) for line in result]
+    result.append('')
+    return '\r\n'.join(result)
+
+
+def split_calendar(data):
+    """
+    Splits an ical string with many events, e.g. an exported .ics file, into one calendar object resource
+    per UID (RFC 4791 4.1). Overrides of a recurring event stay with their master, the VTIMEZONE components
+    are copied into every resource and VEVENTs without UID get a random one. Other components are skipped.
+
+    Args:
+        :param data: ical string
+
+    Returns:
+        :return list of (uid, ical string) tuples in the order of the first VEVENT of each UID
+    """
+    properties = []
+    timezones = []
+    events = {}
+    component = None
+    kind = None
+    uid = None
+    depth = 0
+    for line in iter_content_lines(data):
+        name, start = split_name(line)
+        if component is None:
+            if name == 'BEGIN':
+                kind = line[start + 1:].strip().upper()
+                if kind != 'VCALENDAR':
+                    component = [line]
+                    uid = None
+                    depth = 0
+            elif name != 'END' and name not in SKIPPED_CALENDAR_PROPERTIES:
+                properties.append(line)
+            continue
+        component.append(line)
+        if name == 'BEGIN':
+            depth += 1
+        elif name == 'END':
+            if depth:
+                depth -= 1
+                continue
+            if kind == 'VTIMEZONE':
+                timezones.extend(component)
+            elif kind == 'VEVENT':
+                if uid is None:
+                    uid = str(uuid.uuid4())
+                    component.insert(1, f"UID:{uid}")
+                events.setdefault(uid, []).extend(component)
+            component = None
+        elif name == 'UID' and not depth:
+            uid = parse_content_line(line, start)[2].strip()
+
+    names = {split_name(line)[0] for line in properties}
+    header = ['BEGIN:VCALENDAR'] + properties + [line for line in DEFAULT_CALENDAR_PROPERTIES
+                                                 if split_name(line)[0] not in names] + timezones
+    return [(uid, '\r\n'.join(fold_line(line) for line in header + lines + ['END:VCALENDAR', '']))
+            for uid, lines in events.items()]
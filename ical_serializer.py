@@ -0,0 +1,258 @@
+import calendar
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from .ical_parser import MAX_LINE_LENGTH, escape_text, get_zone
+from .timezones import zone_table
+
+CRLF = b'\r\n'
+# a folded line continues after a line break and one space (RFC 5545 3.1)
+FOLD = b'\r\n '
+PRODID = '-//Sabre//Sabre VObject 4.3.0//EN'
+DEFAULT_TZID = 'Europe/Berlin'
+# RRULE names of the weekdays, Monday first like datetime.weekday
+WEEKDAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+
+def new_uid():
+    """
+    Returns a random version 4 UUID string
+    """
+    return str(uuid.uuid4())
+
+
+def format_date(value):
+    """
+    Formats a DATE value, e.g. 20220510
+    """
+    return f"{value.year:04d}{value.month:02d}{value.day:02d}"
+
+
+def format_datetime(value):
+    """
+    Formats a DATE-TIME value without time zone suffix, e.g. 20220510T100000
+    """
+    return f"{value.year:04d}{value.month:02d}{value.day:02d}T{value.hour:02d}{value.minute:02d}{value.second:02d}"
+
+
+def format_offset(seconds):
+    """
+    Formats a UTC-OFFSET value, e.g. +0100 or -0330
+    """
+    sign = '-' if seconds < 0 else '+'
+    hours, rest = divmod(abs(seconds), 3600)
+    minutes, seconds = divmod(rest, 60)
+    return f"{sign}{hours:02d}{minutes:02d}{seconds:02d}" if seconds else f"{sign}{hours:02d}{minutes:02d}"
+
+
+def yearly_rule(start):
+    """
+    Returns the RRULE of a time zone change that happens every year on the weekday of start in the same
+    week of its month, e.g. FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU for the last Sunday of March
+    """
+    if start.day + 7 > calendar.monthrange(start.year, start.month)[1]:
+        week = -1
+    else:
+        week = (start.day - 1) // 7 + 1
+    return f"FREQ=YEARLY;BYMONTH={start.month};BYDAY={week}{WEEKDAYS[start.weekday()]}"
+
+
+def rule_start(rule_year, start):
+    """
+    Returns the day of rule_year that matches the yearly_rule of start, at the time of start
+    """
+    days = calendar.monthrange(rule_year, start.month)[1]
+    weekday = start.weekday()
+    if start.day + 7 > calendar.monthrange(start.year, start.month)[1]:
+        day = days - (calendar.weekday(rule_year, start.month, days) - weekday) % 7
+    else:
+        first = 1 + (weekday - calendar.weekday(rule_year, start.month, 1)) % 7
+        day = first + (start.day - 1) // 7 * 7
+    return start.replace(year=rule_year, day=day)
+
+
+def timezone_lines(tzid, zone, year):
+    """
+    Returns the content lines of a VTIMEZONE component for the TZID of timed events (RFC 5545 3.6.5).
+    The observances are derived from the offset changes of the zone in year: two changes (daylight saving
+    time) become yearly rules starting in 1970, other changes are written as single observances.
+
+    Args:
+        :param tzid: TZID of the component
+        :param zone: tzinfo of the TZID
+        :param year: year the offset changes are taken from, e.g. the year of the event
+
+    Returns:
+        :return: list of content lines
+    """
+    transitions, offsets = zone_table(zone).table(year)
+    changes = list(zip(transitions[1:], offsets[:-1], offsets[1:]))
+    yearly = len(changes) == 2
+    lines = ['BEGIN:VTIMEZONE', f"TZID:{tzid}"]
+    if not yearly:
+        # the offset at the start of the year, which is also used before the first change
+        start = datetime.fromtimestamp(transitions[0], zone)
+        lines += ['BEGIN:STANDARD', 'DTSTART:19700101T000000', f"TZOFFSETFROM:{format_offset(offsets[0])}",
+                  f"TZOFFSETTO:{format_offset(offsets[0])}", f"TZNAME:{start.tzname()}", 'END:STANDARD']
+    for epoch, before, after in changes:
+        # DTSTART of an observance is the local time before the change
+        start = datetime.fromtimestamp(epoch + before, timezone.utc).replace(tzinfo=None)
+        kind = 'DAYLIGHT' if after > before else 'STANDARD'
+        lines += [f"BEGIN:{kind}", f"DTSTART:{format_datetime(rule_start(1970, start) if yearly else start)}",
+                  f"TZOFFSETFROM:{format_offset(before)}", f"TZOFFSETTO:{format_offset(after)}",
+                  f"TZNAME:{datetime.fromtimestamp(epoch, zone).tzname()}"]
+        if yearly:
+            lines.append(f"RRULE:{yearly_rule(start)}")
+        lines.append(f"END:{kind}")
+    lines.append('END:VTIMEZONE')
+    return lines
+
+
+def format_rule(rule):
+    """
+    Returns the RRULE value for a frequency like WEEKLY or a complete rule like FREQ=WEEKLY;COUNT=10
+    """
+    rule = rule.strip().upper()
+    return rule if '=' in rule else f"FREQ={rule}"
+
+
+def format_trigger(alarm):
+    """
+    Returns the TRIGGER value of an alarm given in minutes or as timedelta before the start, e.g. -PT15M
+    """
+    if isinstance(alarm, timedelta):
+        alarm = int(alarm.total_seconds() // 60)
+    return f"-PT{int(alarm)}M"
+
+
+class EventSerializer:
+    """
+    Serializes new events to RFC 5545 calendar object resources. Text values are escaped, all lines are
+    folded at 75 octets and end with CRLF. The lines are written into a buffer that is reused by the
+    following calls of the same thread, the constant lines and the VTIMEZONE of each year are encoded once.
+    """
+
+    def __init__(self, tzid=DEFAULT_TZID, prodid=PRODID):
+        """
+        Args:
+            :param tzid: TZID of timed events, None for UTC (aware times) or floating times (naive times)
+            :param prodid: PRODID of the calendar object
+        """
+        self.tzid = tzid
+        self.prodid = prodid
+        self.zone = get_zone(tzid) if tzid else None
+        self.local = threading.local()
+        self.header = bytearray()
+        for line in ('BEGIN:VCALENDAR', 'VERSION:2.0', f"PRODID:{prodid}"):
+            self.write_line(self.header, line)
+        self.header = bytes(self.header)
+        # encoded VTIMEZONE component by year
+        self.timezones = {}
+        self.footer = b'END:VEVENT\r\nEND:VCALENDAR\r\n'
+        self.alarm_header = b'BEGIN:VALARM\r\nACTION:DISPLAY\r\n'
+        self.alarm_footer = b'END:VALARM\r\n'
+
+    def serialize(self, title, begin, end, rule=None, fullday=False, uid=None, alarm=None):
+        """
+        Serializes one event
+
+        Args:
+            :param title: title of the event
+            :param begin: begin date or datetime of the event
+            :param end: end date or datetime of the event
+            :param rule: frequency like WEEKLY or a complete RRULE value, None for a single event
+            :param fullday: true for a full day event, only the dates of begin and end are used
+            :param uid: UID of the event, a random one if None
+            :param alarm: minutes or timedelta before the start for a display alarm, None for no alarm
+
+        Returns:
+            :return: utf-8 encoded ical bytes
+        """
+        local = self.local
+        buffer = getattr(local, 'buffer', None)
+        if buffer is None:
+            buffer = local.buffer = bytearray()
+            local.stamp_second = None
+        else:
+            del buffer[:]
+
+        write = self.write_line
+        buffer += self.header
+        if not fullday and self.zone is not None:
+            buffer += self.timezone(begin.astimezone(self.zone).year if begin.tzinfo is not None else begin.year)
+        buffer += b'BEGIN:VEVENT\r\n'
+        write(buffer, f"UID:{uid or new_uid()}")
+        # DTSTAMP has a resolution of seconds, its line is only formatted once per second
+        now = int(time.time())
+        if now != local.stamp_second:
+            local.stamp_second = now
+            local.stamp_line = time.strftime('DTSTAMP:%Y%m%dT%H%M%SZ\r\n', time.gmtime(now)).encode('ascii')
+        buffer += local.stamp_line
+        if fullday:
+            write(buffer, f"DTSTART;VALUE=DATE:{format_date(begin)}")
+            write(buffer, f"DTEND;VALUE=DATE:{format_date(end)}")
+        else:
+            write(buffer, f"DTSTART{self.format_time(begin)}")
+            write(buffer, f"DTEND{self.format_time(end)}")
+        if rule is not None:
+            write(buffer, f"RRULE:{format_rule(rule)}")
+        write(buffer, f"SUMMARY:{escape_text(title)}")
+        if alarm is not None:
+            buffer += self.alarm_header
+            write(buffer, f"DESCRIPTION:{escape_text(title)}")
+            write(buffer, f"TRIGGER:{format_trigger(alarm)}")
+            buffer += self.alarm_footer
+        buffer += self.footer
+        return bytes(buffer)
+
+    def timezone(self, year):
+        """
+        Returns the encoded VTIMEZONE component of the TZID, see timezone_lines
+        """
+        component = self.timezones.get(year)
+        if component is None:
+            component = bytearray()
+            for line in timezone_lines(self.tzid, self.zone, year):
+                self.write_line(component, line)
+            component = self.timezones[year] = bytes(component)
+        return component
+
+    def format_time(self, value):
+        """
+        Returns parameters and value of a timed DTSTART or DTEND. Aware times are converted to the zone of
+        the serializer, naive times are written as they are. Without a known zone aware times are written
+        in UTC and naive times as floating times, a TZID is only used together with its VTIMEZONE.
+        """
+        if self.zone is None:
+            if value.tzinfo is not None:
+                return f":{format_datetime(value.astimezone(timezone.utc))}Z"
+            return f":{format_datetime(value)}"
+        if value.tzinfo is not None:
+            value = value.astimezone(self.zone)
+        return f";TZID={self.tzid}:{format_datetime(value)}"
+
+    @staticmethod
+    def write_line(buffer, line):
+        """
+        Appends a content line to the buffer and folds it at 75 octets without splitting utf-8 characters
+        """
+        encoded = line.encode('utf-8')
+        length = len(encoded)
+        if length <= MAX_LINE_LENGTH:
+            buffer += encoded
+            buffer += CRLF
+            return
+        pos = 0
+        limit = MAX_LINE_LENGTH
+        while pos < length:
+            end = min(pos + limit, length)
+            while end < length and (encoded[end] & 0xC0) == 0x80:
+                end -= 1
+            if pos:
+                buffer += FOLD
+            buffer += encoded[pos:end]
+            pos = end
+            limit = MAX_LINE_LENGTH - 1
+        buffer += CRLF
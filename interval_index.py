@@ -0,0 +1,99 @@
+from bisect import bisect_left, bisect_right
+
+
+class IntervalIndex:
+    """
+    Sorted-array index of time intervals given in UTC epoch seconds. The intervals are kept sorted by
+    start in parallel lists, overlap queries search the start positions with bisect and only scan the
+    intervals starting at most max_length before the query. Each interval belongs to a key (e.g. the
+    URL of its calendar resource) and all intervals of a key are removed together.
+    Lookups are logarithmic, insertions and removals move the tail of the lists (memmove).
+    """
+
+    def __init__(self):
+        self.starts = []
+        self.ends = []
+        self.keys = []
+        self.items = []
+        # start values of the intervals of each key
+        self.key_starts = {}
+        # upper bound of end - start of all intervals
+        self.max_length = 0
+
+    def __len__(self):
+        return len(self.starts)
+
+    def clear(self):
+        self.starts.clear()
+        self.ends.clear()
+        self.keys.clear()
+        self.items.clear()
+        self.key_starts.clear()
+        self.max_length = 0
+
+    def insert(self, key, start, end, item):
+        """
+        Inserts an interval, intervals with the same start keep their insertion order
+
+        Args:
+            :param key: key the interval belongs to
+            :param start: start in epoch seconds
+            :param end: end in epoch seconds
+            :param item: object returned by the queries
+        """
+        position = bisect_right(self.starts, start)
+        self.starts.insert(position, start)
+        self.ends.insert(position, end)
+        self.keys.insert(position, key)
+        self.items.insert(position, item)
+        self.key_starts.setdefault(key, []).append(start)
+        if end - start > self.max_length:
+            self.max_length = end - start
+
+    def remove(self, key):
+        """
+        Removes all intervals of a key
+
+        Returns:
+            :return: number of removed intervals
+        """
+        starts = self.key_starts.pop(key, None)
+        if starts is None:
+            return 0
+        for start in sorted(set(starts), reverse=True):
+            position = bisect_left(self.starts, start)
+            stop = bisect_right(self.starts, start, position)
+            for i in range(stop - 1, position - 1, -1):
+                if self.keys[i] == key:
+                    del self.starts[i]
+                    del self.ends[i]
+                    del self.keys[i]
+                    del self.items[i]
+        return len(starts)
+
+    def overlapping(self, start, end):
+        """
+        Returns the items of the intervals overlapping [start, end) sorted by start.
+        An interval without duration overlaps if it starts in [start, end).
+        """
+        starts = self.starts
+        ends = self.ends
+        first = bisect_left(starts, start - self.max_length)
+        last = bisect_left(starts, end)
+        return [self.items[i] for i in range(first, last)
+                if ends[i] > start or (ends[i] == starts[i] and starts[i] >= start)]
+
+    def first_after(self, time, count=None):
+        """
+        Returns the items of the first count intervals starting at or after time, all of them if count is None
+        """
+        position = bisect_left(self.starts, time)
+        return self.items[position:None if count is None else position + count]
+
+    def last_before(self, time, count=None):
+        """
+        Returns the items of the last count intervals starting before time, the latest first,
+        all of them if count is None
+        """
+        position = bisect_left(self.starts, time)
+        return self.items[0 if count is None else max(position - count, 0):position][::-1]
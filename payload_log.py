@@ -0,0 +1,66 @@
+import logging
+
+# log level of the ical payload dumps, below DEBUG so that debug logging does not include them
+PAYLOAD = 5
+logging.addLevelName(PAYLOAD, 'PAYLOAD')
+
+# characters of a payload that are logged, the rest is replaced by its length
+MAX_PAYLOAD_LENGTH = 1000
+
+# the dumps have their own logger, so they can be switched on without the debug output of other modules
+logger = logging.getLogger('calendar.payload')
+logger.setLevel(logging.INFO)
+
+
+class Truncated:
+    """
+    Formats a payload when the log record is written, cut to MAX_PAYLOAD_LENGTH characters
+    """
+    __slots__ = ('data',)
+
+    def __init__(self, data):
+        self.data = data
+
+    def __str__(self):
+        data = self.data
+        if isinstance(data, bytes):
+            data = data.decode('utf-8', 'replace')
+        elif not isinstance(data, str):
+            data = str(data)
+        if len(data) <= MAX_PAYLOAD_LENGTH:
+            return data
+        return f"{data[:MAX_PAYLOAD_LENGTH]}... ({len(data) - MAX_PAYLOAD_LENGTH} more characters)"
+
+
+def enable_payload_logging(enabled=True):
+    """
+    Switches the payload dumps on or off. The records propagate to the handlers of the root logger
+    regardless of its level.
+    """
+    logger.setLevel(PAYLOAD if enabled else logging.INFO)
+
+
+def log_payload(label, data):
+    """
+    Logs an ical payload at the PAYLOAD level. Nothing is formatted if the level is disabled.
+
+    Args:
+        :param label: description of the payload, e.g. "Created event"
+        :param data: ical string or bytes
+    """
+    if logger.isEnabledFor(PAYLOAD):
+        logger.log(PAYLOAD, "%s: %s", label, Truncated(data))
+
+
+def log_payloads(label, events):
+    """
+    Logs the ical data of each event at the PAYLOAD level. Costs one level check if the level is disabled.
+
+    Args:
+        :param label: description of the payloads, e.g. "Fetched event"
+        :param events: objects with url and data attributes
+    """
+    if not logger.isEnabledFor(PAYLOAD):
+        return
+    for event in events:
+        logger.log(PAYLOAD, "%s %s: %s", label, getattr(event, 'url', ''), Truncated(event.data))
@@ -0,0 +1,91 @@
+import logging
+import threading
+import time
+from datetime import timedelta
+
+# seconds a prefetched day is used, afterwards the calendar is asked again
+PREFETCH_TTL = 60
+# days after today that are prefetched when a dialog starts
+PREFETCH_DAYS = 3
+
+
+class EventPrefetcher:
+    """
+    Short-lived cache of the events of single days. Intent handlers that ask the user for a date prefetch
+    the likely days in the background while the user answers, fetch_events_for_date then returns the
+    prefetched events instead of waiting for the server.
+    """
+
+    def __init__(self, calendar, ttl=PREFETCH_TTL):
+        """
+        Args:
+            :param calendar: AsyncCalDavCalendar the days are fetched with
+            :param ttl: seconds a prefetched day is used
+        """
+        self.calendar = calendar
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        # midnight of the day -> (monotonic time of the prefetch, future of the two event lists)
+        self.entries = {}
+
+    def prefetch(self, dates):
+        """
+        Starts fetching the events of the days of dates, days that are already cached are skipped
+
+        Args:
+            :param dates: iterable of datetimes, only their days are used
+        """
+        now = time.monotonic()
+        with self.lock:
+            self.expire(now)
+            for date in dates:
+                day = self.day(date)
+                if day not in self.entries:
+                    self.entries[day] = (now, self.calendar.submit(self.calendar.fetch_events_for_date(day)))
+
+    def prefetch_upcoming(self, today, days=PREFETCH_DAYS):
+        """
+        Prefetches today and the following days, the dates users ask for most often
+
+        Args:
+            :param today: current datetime, in the time zone of the dates the dialog resolves
+            :param days: number of days after today
+        """
+        self.prefetch(today + timedelta(days=offset) for offset in range(days + 1))
+
+    def fetch_events_for_date(self, date):
+        """
+        Returns the events of the day of date, see CalDavCalendar.fetch_events_for_date. A prefetched day
+        is answered from the cache, waiting for its request if it is still running.
+
+        Returns:
+            :return: two lists of events
+        """
+        day = self.day(date)
+        with self.lock:
+            self.expire(time.monotonic())
+            entry = self.entries.get(day)
+        if entry is not None:
+            try:
+                return entry[1].result()
+            except Exception as e:
+                logging.error(f"Prefetch of {day} failed: {e}")
+        return self.calendar.calendar.fetch_events_for_date(day)
+
+    def day(self, date):
+        """
+        Returns the midnight of the day of date, naive dates are interpreted in the time zone of the calendar
+        """
+        return self.calendar.calendar.localize(date.replace(hour=0, minute=0, second=0, microsecond=0))
+
+    def invalidate(self):
+        """
+        Drops all prefetched days, e.g. after the skill changed the calendar
+        """
+        with self.lock:
+            self.entries = {}
+
+    def expire(self, now):
+        for day, (fetched, _) in list(self.entries.items()):
+            if now - fetched > self.ttl:
+                del self.entries[day]
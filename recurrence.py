@@ -0,0 +1,235 @@
+import heapq
+import logging
+import re
+from datetime import datetime, timezone
+
+from dateutil.rrule import rruleset, rrulestr
+
+from .ical_parser import iter_vevents, to_epoch
+
+UNTIL_PATTERN = re.compile(r'UNTIL=(\d{8})(T\d{6})?(Z)?', re.IGNORECASE)
+
+
+class Component:
+    """
+    The values of one VEVENT that are needed to compute its occurrences.
+    Timed values are aware UTC datetimes, full day values are dates.
+    Floating events (without time zone) keep their local time in the time zone of the user.
+    """
+
+    def __init__(self, summary, start, end, rruleset, recurrence_id, floating=False):
+        self.summary = summary
+        self.start = start
+        self.end = end
+        self.rruleset = rruleset
+        self.recurrence_id = recurrence_id
+        self.floating = floating
+
+
+def to_utc(value, zone=None):
+    """
+    Converts a date or datetime to an aware UTC datetime.
+    Dates are interpreted as midnight UTC, naive datetimes in zone, or as UTC if no zone is given.
+    """
+    if not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day, tzinfo=timezone.utc)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=zone or timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def parse_components(data, zone=None):
+    """
+    Parses all VEVENT components of an ical string
+
+    Args:
+        :param data: ical string of a calendar object resource
+        :param zone: tzinfo floating times are interpreted in, e.g. the time zone of the user, UTC if None
+
+    Returns:
+        :return list of Component objects
+    """
+    components = []
+    for record in iter_vevents(data):
+        start = record.start
+        end = record.end
+        try:
+            rruleset = build_rruleset(record, zone)
+        except ValueError as e:
+            logging.error(f"Could not parse recurrence of event {record.uid}: {e}")
+            rruleset = None
+
+        recurrence_id = None
+        if record.recurrence_id is not None:
+            recurrence_id = to_utc(record.recurrence_id, zone)
+
+        floating = isinstance(start, datetime) and start.tzinfo is None
+        if isinstance(start, datetime):
+            start = to_utc(start, zone)
+            end = to_utc(end, zone)
+
+        summary = record.summary if record.summary is not None else 'No Title'
+        components.append(Component(summary, start, end, rruleset, recurrence_id, floating))
+    return components
+
+
+def _align(value, start, zone=None):
+    """
+    Converts an EXDATE or RDATE value to a datetime comparable with the (naive or aware) start of the rule,
+    naive starts are floating times in zone
+    """
+    if not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day, start.hour, start.minute, start.second,
+                        tzinfo=start.tzinfo)
+    if start.tzinfo is None and value.tzinfo is not None:
+        return value.astimezone(zone or timezone.utc).replace(tzinfo=None)
+    if start.tzinfo is not None and value.tzinfo is None:
+        return value.replace(tzinfo=start.tzinfo)
+    return value
+
+
+def _normalize_until(rule, aware):
+    """
+    dateutil requires UNTIL to be UTC if DTSTART is aware and naive otherwise
+    """
+    def replace(match):
+        day, clock, utc = match.groups()
+        if aware:
+            return f"UNTIL={day}{clock or 'T235959'}Z"
+        return f"UNTIL={day}{clock or ''}"
+    return UNTIL_PATTERN.sub(replace, rule)
+
+
+def build_rruleset(record, zone=None):
+    """
+    Builds the dateutil rruleset of a recurring VEVENT. The rruleset of a full day or floating event yields
+    naive datetimes.
+
+    Args:
+        :param record: VEventRecord
+        :param zone: tzinfo floating times are interpreted in
+
+    Returns:
+        :return rruleset or None if the event does not recur
+    """
+    if record.rrule is None and record.rdates is None:
+        return None
+    start = record.start
+    if not isinstance(start, datetime):
+        start = datetime(start.year, start.month, start.day)
+    rules = rruleset()
+    if record.rrule is not None:
+        rules.rrule(rrulestr(_normalize_until(record.rrule, start.tzinfo is not None), dtstart=start))
+    for value in record.rdates or ():
+        rules.rdate(_align(value, start, zone))
+    for value in record.exdates or ():
+        rules.exdate(_align(value, start, zone))
+    return rules
+
+
+def overlaps(event_start, event_end, start, end):
+    """
+    Returns true if an event overlaps the aware UTC interval [start, end).
+    An event without duration overlaps if it starts in the interval.
+    """
+    event_start = to_utc(event_start)
+    event_end = to_utc(event_end)
+    if event_end == event_start:
+        return start <= event_start < end
+    return event_start < end and event_end > start
+
+
+def occurrence_key(occurrence):
+    return to_epoch(occurrence[1])
+
+
+class EventSeries:
+    """
+    All VEVENT components of one event (one UID): the master with its RRULE, RDATEs and EXDATEs and the
+    overridden instances identified by their RECURRENCE-ID. The occurrences are computed on the client,
+    so calendar queries do not need server-side expansion.
+    """
+
+    def __init__(self, components, zone=None):
+        """
+        Args:
+            :param components: list of Component objects, see parse_components
+            :param zone: tzinfo the recurrences of a floating event are interpreted in, the zone of
+                parse_components
+        """
+        self.zone = zone or timezone.utc
+        self.master = None
+        self.overrides = {}
+        # longest duration of the components in seconds
+        self.max_length = 0
+        for component in components:
+            if component.recurrence_id is None:
+                self.master = component
+            else:
+                self.overrides[component.recurrence_id] = component
+            self.max_length = max(self.max_length, to_epoch(component.end) - to_epoch(component.start))
+
+    def occurrences(self, start, end, reverse=False, only_starting=False):
+        """
+        Yields the occurrences overlapping the time interval in the order of their start. Recurrences are
+        computed lazily, so a caller that stops after n occurrences does not expand the whole interval.
+        Overridden recurrences are replaced by their override.
+
+        Args:
+            :param start: aware UTC begin of the time interval
+            :param end: aware UTC end of the time interval
+            :param reverse: yield the latest occurrence first
+            :param only_starting: leave out the occurrences that started before start
+
+        Returns:
+            :return generator of (component, start, end) tuples, start and end are dates for full day events
+        """
+        overrides = [(override, override.start, override.end) for override in self.overrides.values()
+                     if overlaps(override.start, override.end, start, end)]
+        if not overrides:
+            occurrences = self._master_occurrences(start, end, reverse)
+        else:
+            overrides.sort(key=occurrence_key, reverse=reverse)
+            occurrences = heapq.merge(self._master_occurrences(start, end, reverse), overrides, key=occurrence_key,
+                                      reverse=reverse)
+        if only_starting:
+            first = to_epoch(start)
+            return (occurrence for occurrence in occurrences if occurrence_key(occurrence) >= first)
+        return occurrences
+
+    def _master_occurrences(self, start, end, reverse=False):
+        master = self.master
+        if master is None:
+            return
+        if master.rruleset is None:
+            if overlaps(master.start, master.end, start, end):
+                yield master, master.start, master.end
+            return
+
+        full_day = not isinstance(master.start, datetime)
+        duration = master.end - master.start
+        search_start, search_end = start - duration, end
+        if full_day:
+            # the rruleset of a full day event yields naive datetimes
+            search_start = search_start.replace(tzinfo=None)
+            search_end = search_end.replace(tzinfo=None)
+        elif master.floating:
+            search_start = search_start.astimezone(self.zone).replace(tzinfo=None)
+            search_end = search_end.astimezone(self.zone).replace(tzinfo=None)
+
+        if reverse:
+            # dateutil can not iterate backwards, the recurrences of the interval are reversed
+            recurrences = reversed(master.rruleset.between(search_start, search_end, inc=True))
+        else:
+            recurrences = master.rruleset.xafter(search_start, inc=True)
+        for recurrence in recurrences:
+            if not reverse and recurrence > search_end:
+                return
+            if full_day:
+                recurrence = recurrence.date()
+            elif master.floating:
+                recurrence = recurrence.replace(tzinfo=self.zone)
+            if self.overrides and to_utc(recurrence) in self.overrides:
+                continue
+            if overlaps(recurrence, recurrence + duration, start, end):
+                yield master, recurrence, recurrence + duration
@@ -0,0 +1,75 @@
+from datetime import date
+from functools import lru_cache
+
+from .timezones import to_local
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+WEEKDAYS = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+MONTHS = ('January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October',
+          'November', 'December')
+# days of the month whose ordinal suffix is not "th"
+ORDINAL_SUFFIXES = {1: 'st', 2: 'nd', 3: 'rd', 21: 'st', 22: 'nd', 23: 'rd', 31: 'st'}
+
+
+def ordinal(number):
+    """
+    Returns the ordinal of a day of the month, e.g. "1st", "12th" or "22nd"
+    """
+    return f"{number}{ORDINAL_SUFFIXES.get(number, 'th')}"
+
+
+def spoken_date(start, zone=None):
+    """
+    Returns the spoken date of an event e.g. "on Saturday, 7th of May"
+
+    Args:
+        :param start: start of the event in UTC epoch seconds
+        :param zone: tzinfo of the spoken date, None for UTC
+
+    Returns:
+        :return spoken date as string
+    """
+    return spoken_day(to_local(start, zone) // DAY)
+
+
+def spoken_time(start, end, zone=None):
+    """
+    Returns the spoken time of an event e.g. "from 06:00PM to 07:00PM"
+
+    Args:
+        :param start: start of the event in UTC epoch seconds
+        :param end: end of the event in UTC epoch seconds
+        :param zone: tzinfo of the spoken time, None for UTC
+
+    Returns:
+        :return spoken time as string
+    """
+    return spoken_time_of_day(to_local(start, zone) % DAY, to_local(end, zone) % DAY)
+
+
+@lru_cache(maxsize=1024)
+def spoken_day(day):
+    """
+    Returns the spoken date for a number of days since 1970-01-01
+    """
+    value = date.fromordinal(day + EPOCH_ORDINAL)
+    return f"on {WEEKDAYS[value.weekday()]}, {ordinal(value.day)} of {MONTHS[value.month - 1]}"
+
+
+@lru_cache(maxsize=1024)
+def spoken_time_of_day(start, end):
+    """
+    Returns the spoken time for start and end given in seconds since midnight
+    """
+    return f"from {clock_time(start)} to {clock_time(end)}"
+
+
+def clock_time(seconds):
+    """
+    Formats seconds since midnight like '%I:%M%p', e.g. 06:30PM
+    """
+    hour, minute = divmod(seconds // 60, 60)
+    return f"{hour % 12 or 12:02d}:{minute:02d}{'AM' if hour < 12 else 'PM'}"
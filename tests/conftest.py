@@ -0,0 +1,38 @@
+"""
+Fixtures of the skill tests. The tests run outside of a Mycroft installation, the skill modules are imported
+as a package without executing the __init__.py of the skill (see benchmarks.skill_module), and the calendars
+are served by the stand-in CalDAV server of the benchmarks.
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks import skill_module  # noqa: E402
+from benchmarks.caldav_server import CalDavServer  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    with CalDavServer() as server:
+        yield server
+
+
+@pytest.fixture
+def connect(server):
+    """
+    Returns a function that opens a CalDavCalendar of the stand-in server, the calendars are closed afterwards
+    """
+    caldav_code = skill_module('caldav_code')
+    calendars = []
+
+    def connect(**kwargs):
+        calendar = caldav_code.CalDavCalendar(server.username, server.password, url=server.url, **kwargs)
+        calendars.append(calendar)
+        return calendar
+
+    yield connect
+    for calendar in calendars:
+        calendar.close()
@@ -0,0 +1,189 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from dateutil import tz
+
+from benchmarks import skill_module
+from benchmarks.caldav_server import CalDavServer
+
+caldav_code = skill_module('caldav_code')
+discovery_cache = skill_module('discovery_cache')
+ical_parser = skill_module('ical_parser')
+
+NOW = datetime.now(timezone.utc).replace(microsecond=0)
+
+# VTIMEZONE of Europe/Berlin under a TZID that is no Olson name
+BERLIN_DEFINITION = ('BEGIN:VTIMEZONE', 'TZID:Custom Berlin',
+                     'BEGIN:STANDARD', 'DTSTART:19701025T030000', 'RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU',
+                     'TZOFFSETFROM:+0200', 'TZOFFSETTO:+0100', 'END:STANDARD',
+                     'BEGIN:DAYLIGHT', 'DTSTART:19700329T020000', 'RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU',
+                     'TZOFFSETFROM:+0100', 'TZOFFSETTO:+0200', 'END:DAYLIGHT', 'END:VTIMEZONE')
+
+
+def event(uid, summary, start, end, rule=None):
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//test//EN', 'BEGIN:VEVENT', f"UID:{uid}",
+             'DTSTAMP:20220101T000000Z', f"DTSTART:{start:%Y%m%dT%H%M%SZ}", f"DTEND:{end:%Y%m%dT%H%M%SZ}",
+             f"SUMMARY:{summary}"]
+    if rule is not None:
+        lines.append(f"RRULE:{rule}")
+    lines += ['END:VEVENT', 'END:VCALENDAR']
+    return '\r\n'.join(lines) + '\r\n'
+
+
+def starts(events):
+    return [(e.summary, datetime.fromtimestamp(e.start, timezone.utc)) for e in events]
+
+
+@pytest.fixture
+def straddling(server):
+    """
+    A weekly series whose occurrence at the end of the first search window runs into the second one
+    """
+    weekly = NOW + timedelta(days=7, hours=-1)
+    server.add_events('personal', [event('weekly', 'Weekly', weekly, weekly + timedelta(hours=2),
+                                         'FREQ=WEEKLY;COUNT=5'),
+                                   event('b', 'B', NOW + timedelta(days=20), NOW + timedelta(days=20, hours=1))])
+    return weekly
+
+
+@pytest.mark.parametrize('use_store', [True, False])
+def test_next_n_events_with_occurrence_across_windows(straddling, connect, use_store):
+    _, events = connect(use_store=use_store).fetch_next_n_events(2)
+    assert starts(events) == [('Weekly', straddling), ('Weekly', straddling + timedelta(days=7))]
+
+
+def test_store_limit_counts_only_starting_occurrences(straddling, connect):
+    calendar = connect()
+    store = calendar.stores[0]
+    store.sync()
+    # longer than the indexed span, the series is expanded directly
+    start = NOW + timedelta(days=7)
+    events = store.events_between(start, start + timedelta(days=800), limit=1, only_starting=True)
+    assert sorted(starts(events)) == [('B', NOW + timedelta(days=20)),
+                                      ('Weekly', straddling + timedelta(days=7))]
+
+
+@pytest.mark.parametrize('use_store', [True, False])
+def test_next_n_events(server, connect, use_store):
+    server.add_events('personal', [
+        event('running', 'Running', NOW - timedelta(hours=1), NOW + timedelta(hours=1)),
+        event('later', 'Later', NOW + timedelta(days=30), NOW + timedelta(days=30, hours=1)),
+        event('soon', 'Soon', NOW + timedelta(days=2), NOW + timedelta(days=2, hours=1)),
+        event('past', 'Past', NOW - timedelta(days=1), NOW - timedelta(days=1, hours=-1)),
+    ])
+    calendar = connect(use_store=use_store)
+    _, events = calendar.fetch_next_n_events(3)
+    assert [e.summary for e in events] == ['Running', 'Soon', 'Later']
+    _, events = calendar.fetch_next_n_events(2)
+    assert [e.summary for e in events] == ['Running', 'Soon']
+
+
+@pytest.mark.parametrize('use_store', [True, False])
+def test_last_n_events(server, connect, use_store):
+    server.add_events('personal', [
+        event('old', 'Old', NOW - timedelta(days=40), NOW - timedelta(days=40, hours=-1)),
+        event('daily', 'Daily', NOW - timedelta(days=3, hours=2), NOW - timedelta(days=3, hours=1),
+              'FREQ=DAILY;COUNT=2'),
+        event('future', 'Future', NOW + timedelta(days=1), NOW + timedelta(days=1, hours=1)),
+    ])
+    calendar = connect(use_store=use_store)
+    _, events = calendar.fetch_last_n_events(2)
+    assert starts(events) == [('Daily', NOW - timedelta(days=2, hours=2)),
+                              ('Daily', NOW - timedelta(days=3, hours=2))]
+    _, events = calendar.fetch_last_n_events(5)
+    assert [e.summary for e in events] == ['Daily', 'Daily', 'Old']
+
+
+def test_event_batch_columns():
+    occurrence = skill_module('event_store').EventOccurrence
+    events = [occurrence(None, 'Long', 100, 300, False), occurrence(None, 'Holiday', 0, 86400, True),
+              occurrence(None, 'Short', 100, 200, False), occurrence(None, 'Early', 50, 60, False)]
+    batch = caldav_code.EventBatch(events)
+    assert [e.summary for e in batch.take(batch.order())] == ['Holiday', 'Early', 'Short', 'Long']
+    assert [e.summary for e in batch.take(batch.order(reverse=True, limit=2))] == ['Long', 'Short']
+    assert [e.summary for e in batch.take(batch.order(batch.timed(batch.starting_from(60))))] == ['Short', 'Long']
+
+
+@pytest.mark.parametrize('use_store', [True, False])
+def test_rejected_calendar_url_is_rediscovered(tmp_path, use_store):
+    with CalDavServer(calendars=('personal', 'work')) as server:
+        discovery = discovery_cache.DiscoveryCache(str(tmp_path / 'discovery.json'))
+        caldav_code.CalDavCalendar(server.username, server.password, url=server.url,
+                                   discovery_cache=discovery).close()
+        calendar = caldav_code.CalDavCalendar(server.username, server.password, url=server.url,
+                                              discovery_cache=discovery, use_store=use_store)
+        sources = calendar.sources()
+        # the second calendar moved since its URL was cached
+        server.calendars['office'] = server.calendars.pop('work')
+        start = NOW + timedelta(days=1)
+        server.add_events('personal', [event('a', 'Dentist', start, start + timedelta(hours=1))])
+        server.add_events('office', [event('b', 'Meeting', start, start + timedelta(hours=2))])
+        try:
+            _, events = calendar.fetch_events(NOW, NOW + timedelta(days=7))
+            assert [e.summary for e in events] == ['Dentist', 'Meeting']
+            assert str(calendar.sources()[1][0].url).endswith(server.calendar_path('office'))
+            # a query that still holds the pairs of before the rediscovery uses the replacements
+            events = calendar.fetch_calendar_events(sources[1], NOW, NOW + timedelta(days=7))
+            assert [e.summary for e in events] == ['Meeting']
+        finally:
+            calendar.close()
+
+
+@pytest.mark.parametrize('use_store', [True, False])
+def test_zone_defined_by_vtimezone_is_retrieved(server, connect, use_store):
+    berlin = tz.gettz('Europe/Berlin')
+    start = (NOW + timedelta(days=2)).astimezone(berlin).replace(hour=10, minute=0, second=0)
+    data = '\r\n'.join(['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//test//EN', *BERLIN_DEFINITION,
+                        'BEGIN:VEVENT', 'UID:custom', 'DTSTAMP:20220101T000000Z',
+                        f"DTSTART;TZID=Custom Berlin:{start:%Y%m%dT%H%M%S}", 'DURATION:PT1H',
+                        'SUMMARY:Standup', 'END:VEVENT', 'END:VCALENDAR']) + '\r\n'
+    server.add_events('personal', [data])
+    # the zone of the user differs, a floating time would be off by the difference
+    _, events = connect(use_store=use_store, zone=timezone.utc).fetch_next_n_events(1)
+    assert starts(events) == [('Standup', start.astimezone(timezone.utc))]
+
+
+def stored_event(server, uid):
+    calendar = server.calendars['personal']
+    return calendar.resources[f"{server.calendar_path('personal')}{uid}.ics"]
+
+
+@pytest.mark.parametrize('use_store', [True, False])
+def test_update_after_concurrent_change_is_applied_to_new_version(server, connect, use_store):
+    start = NOW + timedelta(days=1)
+    server.add_events('personal', [event('dentist', 'Dentist', start, start + timedelta(hours=1))])
+    calendar = connect(use_store=use_store)
+    _, (dentist,) = calendar.fetch_events(NOW, NOW + timedelta(days=7))
+    # another client moves the end after the event was read
+    server.add_events('personal', [event('dentist', 'Dentist', start, start + timedelta(hours=2))])
+    etag = stored_event(server, 'dentist')[0]
+
+    result = calendar.rename_event(dentist, 'Orthodontist')
+    assert result.ok
+    new_etag, data = stored_event(server, 'dentist')
+    assert new_etag != etag
+    record, = ical_parser.iter_vevents(data)
+    assert record.summary == 'Orthodontist'
+    assert record.end == start + timedelta(hours=2)
+    _, events = calendar.fetch_events(NOW, NOW + timedelta(days=7))
+    assert [e.summary for e in events] == ['Orthodontist']
+
+
+def test_update_gives_up_after_repeated_conflicts(server, connect):
+    start = NOW + timedelta(days=1)
+    server.add_events('personal', [event('dentist', 'Dentist', start, start + timedelta(hours=1))])
+    calendar = connect()
+    _, (dentist,) = calendar.fetch_events(NOW, NOW + timedelta(days=7))
+    attempts = []
+
+    def change(data):
+        attempts.append(data)
+        # every version is changed on the server again before it is saved
+        server.add_events('personal', [data])
+        return ical_parser.set_summary(data, 'Orthodontist')
+
+    result = calendar.update_event(dentist, change)
+    assert result.error == "The event was changed on the server"
+    assert len(attempts) == calendar.MAX_UPDATE_CONFLICTS + 1
+    record, = ical_parser.iter_vevents(stored_event(server, 'dentist')[1])
+    assert record.summary == 'Dentist'
@@ -0,0 +1,134 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from benchmarks import skill_module
+from benchmarks.synthetic import generate_calendar
+
+connection = skill_module('connection')
+discovery_cache = skill_module('discovery_cache')
+event_cache = skill_module('event_cache')
+
+BEGIN = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+END = BEGIN + timedelta(days=366)
+
+
+def event(uid, summary, start, hours=1):
+    return (f"BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//test//EN\r\nBEGIN:VEVENT\r\nUID:{uid}\r\n"
+            f"DTSTAMP:20220101T000000Z\r\nDTSTART:{start:%Y%m%dT%H%M%SZ}\r\n"
+            f"DTEND:{start + timedelta(hours=hours):%Y%m%dT%H%M%SZ}\r\nSUMMARY:{summary}\r\n"
+            f"END:VEVENT\r\nEND:VCALENDAR\r\n")
+
+
+def summaries(fetched):
+    parsed_events, events = fetched
+    return sorted(e.summary for e in events)
+
+
+def test_full_pull_matches_server(server, connect):
+    server.add_events('personal', generate_calendar(50, base_url=server.calendar_path('personal'), begin=BEGIN))
+    _, stored = connect().fetch_events(BEGIN, END)
+    _, queried = connect(use_store=False).fetch_events(BEGIN, END)
+    assert len(stored) > 0
+    assert [(e.summary, e.start, e.end) for e in stored] == [(e.summary, e.start, e.end) for e in queried]
+
+
+def test_sync_transfers_only_changes(server, connect):
+    server.add_events('personal', [event('a', 'Dentist', BEGIN + timedelta(days=1)),
+                                   event('b', 'Gym', BEGIN + timedelta(days=2))])
+    calendar = connect()
+    assert summaries(calendar.fetch_events(BEGIN, END)) == ['Dentist', 'Gym']
+
+    personal = server.calendars['personal']
+    path_a = server.calendar_path('personal') + 'a.ics'
+    path_b = server.calendar_path('personal') + 'b.ics'
+    with server.lock:
+        personal.resources[path_a] = (server.next_etag(), event('a', 'Doctor', BEGIN + timedelta(days=1)))
+        personal.change(path_a)
+        del personal.resources[path_b]
+        personal.change(path_b)
+    server.add_events('personal', [event('c', 'Lunch', BEGIN + timedelta(days=3))])
+
+    server.requests.clear()
+    calendar.stores[0].invalidate()
+    assert summaries(calendar.fetch_events(BEGIN, END)) == ['Doctor', 'Lunch']
+    # one sync-collection REPORT and one multiget of the two changed resources
+    assert server.requests['REPORT'] == 2
+    assert sum(server.requests.values()) == 2
+
+
+def test_unreachable_server_answers_from_restored_store(server, connect, tmp_path):
+    server.add_events('personal', [event('a', 'Dentist', BEGIN + timedelta(days=1))])
+    cache = event_cache.EventCache(str(tmp_path / 'events.db'))
+    discovery = discovery_cache.DiscoveryCache(str(tmp_path / 'discovery.json'))
+    assert summaries(connect(event_cache=cache, discovery_cache=discovery).fetch_events(BEGIN, END)) == ['Dentist']
+
+    calendar = connect(event_cache=cache, discovery_cache=discovery)
+    assert calendar.restore_cache()
+    server.stop()
+    calendar.stores[0].invalidate()
+    assert summaries(calendar.fetch_events(BEGIN, END)) == ['Dentist']
+
+
+def test_unreachable_server_without_store_raises(server, connect):
+    calendar = connect(use_store=False)
+    server.stop()
+    with pytest.raises(connection.CONNECTION_ERRORS):
+        calendar.fetch_events(BEGIN, END)
+
+
+def test_unreachable_server_before_first_sync_raises(server, connect):
+    calendar = connect()
+    server.stop()
+    with pytest.raises(connection.CONNECTION_ERRORS):
+        calendar.fetch_events(BEGIN, END)
+
+
+def test_limited_queries_of_the_index(server, connect):
+    server.add_events('personal', [event('running', 'Running', BEGIN - timedelta(hours=1), hours=3)] +
+                      [event(f"e{day}", f"Day {day}", BEGIN + timedelta(days=day)) for day in range(1, 11)])
+    calendar = connect()
+    store = calendar.stores[0]
+    store.sync()
+    window_end = BEGIN + timedelta(days=8)
+    assert summaries(([], store.events_between(BEGIN, window_end, limit=2))) == ['Day 1', 'Day 2', 'Running']
+    assert summaries(([], store.events_between(BEGIN, window_end, limit=2, only_starting=True))) == \
+        ['Day 1', 'Day 2']
+    assert summaries(([], store.events_between(BEGIN, window_end, limit=3, reverse=True, only_starting=True))) == \
+        ['Day 5', 'Day 6', 'Day 7']
+    assert len(store.events_between(BEGIN, window_end)) == 8
+
+
+def test_restore_answers_from_cached_occurrences(server, connect, tmp_path):
+    weekly = event('weekly', 'Weekly', BEGIN + timedelta(days=1)).replace('SUMMARY', 'RRULE:FREQ=WEEKLY\r\nSUMMARY')
+    server.add_events('personal', [weekly, event('a', 'Dentist', BEGIN + timedelta(days=2))])
+    path = str(tmp_path / 'events.db')
+    calendar = connect(event_cache=event_cache.EventCache(path))
+    calendar.fetch_events(BEGIN, END)
+
+    # a delta synchronization updates the cached resource and its occurrences
+    personal = server.calendars['personal']
+    path_a = server.calendar_path('personal') + 'a.ics'
+    with server.lock:
+        personal.resources[path_a] = (server.next_etag(), event('a', 'Doctor', BEGIN + timedelta(days=3)))
+        personal.change(path_a)
+    calendar.stores[0].invalidate()
+    expected = [(e.summary, e.start, e.end) for e in calendar.fetch_events(BEGIN, BEGIN + timedelta(days=60))[1]]
+    doctor = int((BEGIN + timedelta(days=3)).timestamp())
+    assert ('Doctor', doctor, doctor + 3600) in expected
+
+    restored = connect(event_cache=event_cache.EventCache(path))
+    assert restored.restore_cache()
+    server.stop()
+    _, events = restored.fetch_events(BEGIN, BEGIN + timedelta(days=60))
+    assert [(e.summary, e.start, e.end) for e in events] == expected
+    assert all(resource._series is None for resource in restored.stores[0].resources.values())
+
+
+def test_cache_of_another_schema_version_is_dropped(tmp_path):
+    path = str(tmp_path / 'events.db')
+    cache = event_cache.EventCache(path)
+    cache.replace('/calendar/', 'token', None, 0, 10, [('/calendar/a.ics', '"1"', 'data', 0)], [])
+    cache.connection.execute("PRAGMA user_version = 1")
+    cache.close()
+    assert event_cache.EventCache(path).load('/calendar/') is None
@@ -0,0 +1,73 @@
+from datetime import datetime, time, timedelta, timezone
+
+import pytest
+from dateutil import tz
+
+from benchmarks import skill_module
+
+free_busy = skill_module('free_busy')
+ical_parser = skill_module('ical_parser')
+
+HOUR = 3600
+
+
+def epoch(*args):
+    return int(datetime(*args, tzinfo=timezone.utc).timestamp())
+
+
+def test_merge_busy_joins_overlapping_and_adjacent_intervals():
+    intervals = [(0, 10), (5, 8), (8, 20), (20, 30), (40, 40), (50, 60)]
+    assert free_busy.merge_busy(intervals) == [[0, 30], [50, 60]]
+
+
+def test_free_intervals_between_busy_times():
+    busy = [[0, 5], [12, 14], [18, 25], [29, 40]]
+    windows = [(2, 10), (10, 20), (22, 30)]
+    assert free_busy.free_intervals(busy, windows) == [(5, 10), (10, 12), (14, 18), (25, 29)]
+    assert free_busy.free_intervals([], windows) == windows
+
+
+def test_day_windows_in_the_zone_of_the_user():
+    berlin = tz.gettz('Europe/Berlin')
+    start = datetime(2022, 3, 26, 12, tzinfo=berlin)
+    end = datetime(2022, 3, 28, 9, tzinfo=berlin)
+    # the clocks are set forward in the night before the 27th
+    assert free_busy.day_windows(start, end, berlin, 8, 20) == [
+        (epoch(2022, 3, 26, 11), epoch(2022, 3, 26, 19)),
+        (epoch(2022, 3, 27, 6), epoch(2022, 3, 27, 18)),
+        (epoch(2022, 3, 28, 6), epoch(2022, 3, 28, 7)),
+    ]
+
+
+def test_find_slots_aligns_and_limits():
+    free = [(epoch(2022, 5, 10, 8, 7), epoch(2022, 5, 10, 9)), (epoch(2022, 5, 10, 9, 30), epoch(2022, 5, 10, 10)),
+            (epoch(2022, 5, 10, 11), epoch(2022, 5, 10, 14)), (epoch(2022, 5, 10, 15), epoch(2022, 5, 10, 18))]
+    slots = free_busy.find_slots(free, HOUR // 2)
+    assert slots == [(epoch(2022, 5, 10, 8, 15), epoch(2022, 5, 10, 8, 45)),
+                     (epoch(2022, 5, 10, 9, 30), epoch(2022, 5, 10, 10)),
+                     (epoch(2022, 5, 10, 11), epoch(2022, 5, 10, 11, 30)),
+                     (epoch(2022, 5, 10, 15), epoch(2022, 5, 10, 15, 30))]
+    assert free_busy.find_slots(free, 2 * HOUR, limit=1) == [(epoch(2022, 5, 10, 11), epoch(2022, 5, 10, 13))]
+
+
+@pytest.mark.parametrize('use_store', [True, False])
+def test_find_free_slots(server, connect, use_store):
+    day = (datetime.now(timezone.utc) + timedelta(days=2)).date()
+    midnight = datetime.combine(day, time(), tzinfo=timezone.utc)
+    server.add_events('personal', [
+        '\r\n'.join(['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//test//EN', 'BEGIN:VEVENT', 'UID:meeting',
+                     f"DTSTART:{midnight + timedelta(hours=9):%Y%m%dT%H%M%SZ}",
+                     f"DTEND:{midnight + timedelta(hours=10, minutes=30):%Y%m%dT%H%M%SZ}",
+                     'SUMMARY:Meeting', 'END:VEVENT', 'END:VCALENDAR']) + '\r\n',
+        # full day events do not block the day
+        '\r\n'.join(['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//test//EN', 'BEGIN:VEVENT', 'UID:birthday',
+                     f"DTSTART;VALUE=DATE:{day:%Y%m%d}", 'SUMMARY:Birthday', 'END:VEVENT',
+                     'END:VCALENDAR']) + '\r\n',
+    ])
+    calendar = connect(use_store=use_store, zone=timezone.utc)
+    slots = calendar.find_free_slots(timedelta(hours=1), midnight, midnight + timedelta(days=1))
+    assert [(slot.start, slot.end) for slot in slots] == [
+        (ical_parser.to_epoch(midnight + timedelta(hours=8)), ical_parser.to_epoch(midnight + timedelta(hours=9))),
+        (ical_parser.to_epoch(midnight + timedelta(hours=10, minutes=30)),
+         ical_parser.to_epoch(midnight + timedelta(hours=11, minutes=30))),
+    ]
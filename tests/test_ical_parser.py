@@ -0,0 +1,129 @@
+from datetime import date, datetime, timedelta, timezone
+
+from dateutil import tz
+
+from benchmarks import skill_module
+
+ical_parser = skill_module('ical_parser')
+
+# VTIMEZONE of Europe/Berlin under a TZID that is no Olson name
+BERLIN_DEFINITION = ('BEGIN:VTIMEZONE', 'TZID:Custom Berlin',
+                     'BEGIN:STANDARD', 'DTSTART:19701025T030000', 'RRULE:FREQ=YEARLY;BYMONTH=10;BYDAY=-1SU',
+                     'TZOFFSETFROM:+0200', 'TZOFFSETTO:+0100', 'END:STANDARD',
+                     'BEGIN:DAYLIGHT', 'DTSTART:19700329T020000', 'RRULE:FREQ=YEARLY;BYMONTH=3;BYDAY=-1SU',
+                     'TZOFFSETFROM:+0100', 'TZOFFSETTO:+0200', 'END:DAYLIGHT', 'END:VTIMEZONE')
+
+
+def calendar(*lines):
+    return '\r\n'.join(('BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//test//EN') + lines + ('END:VCALENDAR',)) \
+        + '\r\n'
+
+
+def test_folded_lines_are_joined():
+    data = calendar('BEGIN:VEVENT', 'UID:folded', 'DTSTART:20220510T100000Z', 'SUMMARY:Lecture Speech',
+                    '  Interaction with a rather long', '\tand folded title', 'END:VEVENT')
+    record, = ical_parser.iter_vevents(data)
+    assert record.summary == 'Lecture Speech Interaction with a rather longand folded title'
+
+
+def test_lf_line_breaks_and_folded_parameters():
+    data = calendar('BEGIN:VEVENT', 'UID:lf', 'DTSTART;TZID=Europe', ' /Berlin:20220510T100000',
+                    'SUMMARY:Gym', 'END:VEVENT').replace('\r\n', '\n')
+    record, = ical_parser.iter_vevents(data)
+    assert record.start == datetime(2022, 5, 10, 10, tzinfo=tz.gettz('Europe/Berlin'))
+    assert record.summary == 'Gym'
+
+
+def test_fold_line_round_trip():
+    line = 'SUMMARY:' + 'Übung Datenbanken ' * 10
+    folded = ical_parser.fold_line(line)
+    assert all(len(part.encode('utf-8')) <= ical_parser.MAX_LINE_LENGTH for part in folded.split('\r\n'))
+    assert list(ical_parser.iter_content_lines(folded + '\r\n')) == [line]
+
+
+def test_text_is_unescaped():
+    data = calendar('BEGIN:VEVENT', 'UID:escaped', 'DTSTART:20220510T100000Z',
+                    r'SUMMARY:Lunch\, coffee\; cake \\ more\nnext line', 'END:VEVENT')
+    record, = ical_parser.iter_vevents(data)
+    assert record.summary == 'Lunch, coffee; cake \\ more\nnext line'
+    assert ical_parser.unescape_text(ical_parser.escape_text(record.summary)) == record.summary
+
+
+def test_quoted_parameter_with_colon():
+    data = calendar('BEGIN:VEVENT', 'UID:quoted', 'DTSTART:20220510T100000Z',
+                    'SUMMARY;ALTREP="http://example.com/a:b":Meeting', 'END:VEVENT')
+    record, = ical_parser.iter_vevents(data)
+    assert record.summary == 'Meeting'
+
+
+def test_properties_of_nested_components_are_ignored():
+    data = calendar('BEGIN:VEVENT', 'UID:alarm', 'DTSTART:20220510T100000Z', 'DTEND:20220510T110000Z',
+                    'BEGIN:VALARM', 'ACTION:DISPLAY', 'TRIGGER:-PT15M', 'SUMMARY:Reminder',
+                    'DESCRIPTION:DTSTART:20990101T000000Z', 'DTSTART:20990101T000000Z', 'END:VALARM',
+                    'SUMMARY:Dentist', 'DESCRIPTION:Bring the card', 'END:VEVENT')
+    record, = ical_parser.iter_vevents(data)
+    assert record.summary == 'Dentist'
+    assert record.start == datetime(2022, 5, 10, 10, tzinfo=timezone.utc)
+    assert record.end == datetime(2022, 5, 10, 11, tzinfo=timezone.utc)
+
+
+def test_timezone_components_are_skipped():
+    data = calendar('BEGIN:VTIMEZONE', 'TZID:Europe/Berlin', 'BEGIN:STANDARD', 'DTSTART:19701025T030000',
+                    'TZOFFSETFROM:+0200', 'TZOFFSETTO:+0100', 'END:STANDARD', 'END:VTIMEZONE',
+                    'BEGIN:VEVENT', 'UID:zoned', 'DTSTART;TZID=Europe/Berlin:20220510T100000',
+                    'DURATION:PT1H30M', 'SUMMARY:Sprint review', 'END:VEVENT')
+    record, = ical_parser.iter_vevents(data)
+    assert record.start == datetime(2022, 5, 10, 10, tzinfo=tz.gettz('Europe/Berlin'))
+    assert record.end - record.start == timedelta(hours=1, minutes=30)
+
+
+def test_series_with_override():
+    data = calendar('BEGIN:VEVENT', 'UID:series', 'DTSTART;VALUE=DATE:20220510', 'RRULE:FREQ=WEEKLY;COUNT=3',
+                    'EXDATE;VALUE=DATE:20220517,20220524', 'SUMMARY:Birthday', 'END:VEVENT',
+                    'BEGIN:VEVENT', 'UID:series', 'RECURRENCE-ID;VALUE=DATE:20220517',
+                    'DTSTART;VALUE=DATE:20220518', 'SUMMARY:Moved birthday', 'END:VEVENT')
+    master, override = ical_parser.iter_vevents(data)
+    assert master.start == date(2022, 5, 10) and master.end == date(2022, 5, 11)
+    assert master.rrule == 'FREQ=WEEKLY;COUNT=3'
+    assert master.exdates == [date(2022, 5, 17), date(2022, 5, 24)]
+    assert override.recurrence_id == date(2022, 5, 17)
+    assert override.summary == 'Moved birthday'
+
+
+def test_event_without_start_is_skipped():
+    data = calendar('BEGIN:VEVENT', 'UID:broken', 'SUMMARY:No start', 'END:VEVENT',
+                    'BEGIN:VEVENT', 'UID:ok', 'DTSTART:20220510T100000Z', 'SUMMARY:Ok', 'END:VEVENT')
+    assert [record.uid for record in ical_parser.iter_vevents(data)] == ['ok']
+
+
+def test_to_epoch_of_floating_times():
+    berlin = tz.gettz('Europe/Berlin')
+    assert ical_parser.to_epoch(date(1970, 1, 2)) == 86400
+    assert ical_parser.to_epoch(datetime(1970, 1, 1, 1)) == 3600
+    assert ical_parser.to_epoch(datetime(1970, 1, 1, 1), berlin) == 0
+    assert ical_parser.to_epoch(datetime(1970, 1, 1, 1, tzinfo=timezone.utc), berlin) == 3600
+
+
+def test_windows_zone_names_are_mapped():
+    data = calendar('BEGIN:VEVENT', 'UID:outlook', 'DTSTART;TZID=W. Europe Standard Time:20220510T100000',
+                    'DTEND;TZID=Pacific Standard Time:20220510T020000', 'SUMMARY:Call', 'END:VEVENT')
+    record, = ical_parser.iter_vevents(data)
+    assert record.start == datetime(2022, 5, 10, 8, tzinfo=timezone.utc)
+    assert record.end == datetime(2022, 5, 10, 9, tzinfo=timezone.utc)
+
+
+def test_zone_defined_by_vtimezone():
+    data = calendar(*BERLIN_DEFINITION, 'BEGIN:VEVENT', 'UID:custom', 'DTSTART;TZID=Custom Berlin:20220110T100000',
+                    'DTEND;TZID=Custom Berlin:20220710T100000', 'SUMMARY:Half year', 'END:VEVENT')
+    record, = ical_parser.iter_vevents(data)
+    assert record.start == datetime(2022, 1, 10, 9, tzinfo=timezone.utc)
+    assert record.end == datetime(2022, 7, 10, 8, tzinfo=timezone.utc)
+
+
+def test_unknown_zone_is_floating_and_logged(caplog):
+    data = calendar('BEGIN:VEVENT', 'UID:unknown', 'DTSTART;TZID=Nowhere Standard Time:20220510T100000',
+                    'SUMMARY:Lost', 'END:VEVENT')
+    record, = ical_parser.iter_vevents(data)
+    assert record.start == datetime(2022, 5, 10, 10)
+    assert 'Unknown time zone Nowhere Standard Time' in caplog.text
+
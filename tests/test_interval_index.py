@@ -0,0 +1,58 @@
+import random
+
+from benchmarks import skill_module
+
+interval_index = skill_module('interval_index')
+
+
+def build(intervals):
+    index = interval_index.IntervalIndex()
+    for key, start, end in intervals:
+        index.insert(key, start, end, (key, start, end))
+    return index
+
+
+def test_overlapping():
+    index = build([('a', 0, 10), ('b', 5, 5), ('c', 10, 20), ('d', 30, 40), ('e', -100, 100)])
+    assert index.overlapping(10, 30) == [('e', -100, 100), ('c', 10, 20)]
+    assert index.overlapping(5, 6) == [('e', -100, 100), ('a', 0, 10), ('b', 5, 5)]
+    assert index.overlapping(6, 6) == [('e', -100, 100), ('a', 0, 10)]
+    assert index.overlapping(100, 200) == []
+
+
+def test_first_after_and_last_before():
+    index = build([('a', 10, 20), ('b', 20, 30), ('c', 20, 25), ('d', 40, 50)])
+    assert index.first_after(20, 2) == [('b', 20, 30), ('c', 20, 25)]
+    assert index.first_after(21, 5) == [('d', 40, 50)]
+    assert index.first_after(0) == index.items
+    assert index.last_before(40, 2) == [('c', 20, 25), ('b', 20, 30)]
+    assert index.last_before(10, 2) == []
+    assert index.last_before(100) == index.items[::-1]
+
+
+def test_remove_key():
+    index = build([('a', 10, 20), ('b', 10, 20), ('a', 30, 40), ('b', 5, 6)])
+    assert index.remove('a') == 2
+    assert index.items == [('b', 5, 6), ('b', 10, 20)]
+    assert index.remove('a') == 0
+    assert len(index) == 2
+
+
+def test_matches_linear_scan():
+    generator = random.Random(1)
+    intervals = []
+    for i in range(500):
+        start = generator.randrange(0, 10000)
+        intervals.append((f"k{i % 50}", start, start + generator.choice((0, 1, 30, 600))))
+    index = build(intervals)
+    index.remove('k7')
+    intervals = [interval for interval in intervals if interval[0] != 'k7']
+    for _ in range(200):
+        start = generator.randrange(-100, 10100)
+        end = start + generator.randrange(0, 1000)
+        expected = [i for i in intervals if i[2] > start and i[1] < end or i[1] == i[2] and start <= i[1] < end]
+        assert sorted(index.overlapping(start, end)) == sorted(expected)
+        after = sorted(i[1] for i in intervals if i[1] >= start)[:10]
+        assert [item[1] for item in index.first_after(start, 10)] == after
+        before = sorted((i[1] for i in intervals if i[1] < start), reverse=True)[:10]
+        assert [item[1] for item in index.last_before(start, 10)] == before
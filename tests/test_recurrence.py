@@ -0,0 +1,115 @@
+from datetime import date, datetime, timezone
+from itertools import islice
+
+from dateutil import tz
+
+from benchmarks import skill_module
+
+recurrence = skill_module('recurrence')
+
+BERLIN = tz.gettz('Europe/Berlin')
+UTC = timezone.utc
+
+
+def series(*events, zone=None):
+    lines = ['BEGIN:VCALENDAR', 'VERSION:2.0', 'PRODID:-//test//EN']
+    for properties in events:
+        lines += ['BEGIN:VEVENT', 'UID:series', 'DTSTAMP:20220101T000000Z'] + list(properties) + ['END:VEVENT']
+    lines.append('END:VCALENDAR')
+    return recurrence.EventSeries(recurrence.parse_components('\r\n'.join(lines) + '\r\n', zone), zone)
+
+
+def occurrences(event_series, start, end, reverse=False, only_starting=False):
+    return [(component.summary, occurrence_start) for component, occurrence_start, _
+            in event_series.occurrences(start, end, reverse, only_starting)]
+
+
+WEEKLY = ('DTSTART;TZID=Europe/Berlin:20220307T100000', 'DTEND;TZID=Europe/Berlin:20220307T113000',
+          'RRULE:FREQ=WEEKLY;COUNT=6', 'SUMMARY:Lecture')
+MARCH = datetime(2022, 3, 1, tzinfo=UTC)
+MAY = datetime(2022, 5, 1, tzinfo=UTC)
+
+
+def starts(days):
+    return [('Lecture', datetime(2022, month, day, 10, tzinfo=BERLIN)) for month, day in days]
+
+
+def test_weekly_rule_keeps_the_local_time_across_dst():
+    assert occurrences(series(WEEKLY), MARCH, MAY) == \
+        starts([(3, 7), (3, 14), (3, 21), (3, 28), (4, 4), (4, 11)])
+    assert occurrences(series(WEEKLY), MARCH, MAY)[3][1].astimezone(UTC).hour == 8
+
+
+def test_exdates_are_left_out():
+    event_series = series(WEEKLY + ('EXDATE;TZID=Europe/Berlin:20220314T100000,20220404T100000',))
+    assert occurrences(event_series, MARCH, MAY) == starts([(3, 7), (3, 21), (3, 28), (4, 11)])
+
+
+def test_override_replaces_its_recurrence():
+    event_series = series(WEEKLY, ('RECURRENCE-ID;TZID=Europe/Berlin:20220321T100000',
+                                   'DTSTART;TZID=Europe/Berlin:20220322T140000',
+                                   'DTEND;TZID=Europe/Berlin:20220322T150000', 'SUMMARY:Moved lecture'))
+    result = occurrences(event_series, MARCH, datetime(2022, 3, 29, tzinfo=UTC))
+    assert result == starts([(3, 7), (3, 14)]) + [('Moved lecture', datetime(2022, 3, 22, 14, tzinfo=BERLIN))] + \
+        starts([(3, 28)])
+
+
+def test_override_moved_out_of_the_interval():
+    event_series = series(WEEKLY, ('RECURRENCE-ID;TZID=Europe/Berlin:20220314T100000',
+                                   'DTSTART;TZID=Europe/Berlin:20220601T100000',
+                                   'DTEND;TZID=Europe/Berlin:20220601T110000', 'SUMMARY:Moved lecture'))
+    assert occurrences(event_series, MARCH, datetime(2022, 3, 22, tzinfo=UTC)) == starts([(3, 7), (3, 21)])
+
+
+def test_reverse_order_and_lazy_limit():
+    event_series = series(WEEKLY, ('RECURRENCE-ID;TZID=Europe/Berlin:20220321T100000',
+                                   'DTSTART;TZID=Europe/Berlin:20220322T140000',
+                                   'DTEND;TZID=Europe/Berlin:20220322T150000', 'SUMMARY:Moved lecture'))
+    forward = occurrences(event_series, MARCH, MAY)
+    assert occurrences(event_series, MARCH, MAY, reverse=True) == forward[::-1]
+    # an endless rule is expanded lazily
+    endless = series(WEEKLY[:2] + ('RRULE:FREQ=WEEKLY', 'SUMMARY:Lecture'))
+    first, second = islice(endless.occurrences(MARCH, datetime(9000, 1, 1, tzinfo=UTC)), 2)
+    assert [first[1], second[1]] == [forward[0][1], forward[1][1]]
+
+
+def test_only_starting_leaves_out_running_occurrence():
+    start = datetime(2022, 3, 14, 9, 30, tzinfo=UTC)
+    assert occurrences(series(WEEKLY), start, datetime(2022, 3, 22, tzinfo=UTC)) == starts([(3, 14), (3, 21)])
+    assert occurrences(series(WEEKLY), start, datetime(2022, 3, 22, tzinfo=UTC), only_starting=True) == \
+        starts([(3, 21)])
+
+
+def test_full_day_series():
+    event_series = series(('DTSTART;VALUE=DATE:20220228', 'DTEND;VALUE=DATE:20220301', 'RRULE:FREQ=YEARLY',
+                           'EXDATE;VALUE=DATE:20230228', 'SUMMARY:Birthday'))
+    result = list(event_series.occurrences(datetime(2022, 1, 1, tzinfo=UTC), datetime(2025, 1, 1, tzinfo=UTC)))
+    assert [(start, end) for _, start, end in result] == [(date(2022, 2, 28), date(2022, 3, 1)),
+                                                          (date(2024, 2, 28), date(2024, 2, 29))]
+    # a full day event overlaps the days of its dates in UTC
+    result = event_series.occurrences(datetime(2024, 2, 28, 23, tzinfo=UTC), datetime(2024, 3, 1, tzinfo=UTC))
+    assert [start for _, start, _ in result] == [date(2024, 2, 28)]
+
+
+def test_rdate_and_until():
+    event_series = series(('DTSTART:20220301T090000Z', 'DURATION:PT30M', 'RRULE:FREQ=DAILY;UNTIL=20220303',
+                           'RDATE:20220310T090000Z', 'SUMMARY:Standup'))
+    result = occurrences(event_series, MARCH, MAY)
+    assert [start.day for _, start in result] == [1, 2, 3, 10]
+
+
+def test_single_event():
+    event_series = series(('DTSTART:20220301T090000Z', 'DTEND:20220301T100000Z', 'SUMMARY:Dentist'))
+    assert occurrences(event_series, MARCH, MAY) == [('Dentist', datetime(2022, 3, 1, 9, tzinfo=UTC))]
+    assert occurrences(event_series, datetime(2022, 3, 1, 10, tzinfo=UTC), MAY) == []
+    assert event_series.max_length == 3600
+
+
+def test_floating_series_is_interpreted_in_the_zone_of_the_user():
+    floating = ('DTSTART:20220321T100000', 'DTEND:20220321T110000', 'RRULE:FREQ=WEEKLY;COUNT=2',
+                'EXDATE;TZID=Europe/Berlin:20220328T100000', 'SUMMARY:Lecture')
+    assert occurrences(series(floating, zone=BERLIN), MARCH, MAY) == starts([(3, 21)])
+    assert occurrences(series(floating[:3] + ('SUMMARY:Lecture',), zone=BERLIN), MARCH, MAY) == \
+        starts([(3, 21), (3, 28)])
+    assert occurrences(series(floating[:3] + ('SUMMARY:Lecture',)), MARCH, MAY) == \
+        [('Lecture', datetime(2022, 3, day, 10, tzinfo=UTC)) for day in (21, 28)]
@@ -0,0 +1,124 @@
+from bisect import bisect_right
+from datetime import datetime, timezone
+
+DAY = 24 * 60 * 60
+MAX_TABLES = 16
+
+# ZoneTable of each tzinfo by id, dateutil zones are not hashable
+_tables = {}
+
+
+def utc_offset(zone, epoch):
+    """
+    Returns the UTC offset of a zone at an instant in seconds, computed by the tzinfo
+    """
+    return int(datetime.fromtimestamp(epoch, zone).utcoffset().total_seconds())
+
+
+def zone_name(zone):
+    """
+    Returns the IANA name of a tzinfo, e.g. Europe/Berlin, or None if it is unknown (e.g. for tzlocal)
+    """
+    for attribute in ('key', 'zone', '_filename'):
+        name = getattr(zone, attribute, None)
+        if isinstance(name, str):
+            # dateutil keeps the path of the zone file
+            name = name.rpartition('zoneinfo/')[2]
+            if '/' in name and not name.startswith('/'):
+                return name
+    return None
+
+
+class ZoneTable:
+    """
+    Offset table of one time zone. For each year the instants where the UTC offset changes are
+    computed once: the offset is sampled at every midnight UTC and each change is located to the
+    second by bisection. Afterwards converting an instant is a bisect in the table of its year.
+    """
+
+    def __init__(self, zone):
+        """
+        Args:
+            :param zone: tzinfo, e.g. from default_timezone()
+        """
+        self.zone = zone
+        self.years = {}
+        # (low, high, transitions, offsets) of the year table used last, most conversions of a query fall
+        # into the same year. The tables are shared between threads, so the tuple is replaced as a whole
+        # and each conversion reads it once.
+        self.selected = (0, 0, None, None)
+
+    def offset(self, epoch):
+        """
+        Returns the UTC offset in seconds at an instant given in UTC epoch seconds
+        """
+        low, high, transitions, offsets = self.selected
+        if not low <= epoch < high:
+            low, high, transitions, offsets = self._select(datetime.fromtimestamp(epoch, timezone.utc).year)
+        return offsets[bisect_right(transitions, epoch) - 1]
+
+    def local(self, epoch):
+        """
+        Converts UTC epoch seconds to wall-clock seconds of the zone (epoch seconds of the local time)
+        """
+        return epoch + self.offset(epoch)
+
+    def table(self, year):
+        """
+        Returns the offset table of a year: the instants in UTC epoch seconds where an offset starts, the
+        first one is the start of the year, and the UTC offsets in seconds from these instants on
+        """
+        table = self.years.get(year)
+        if table is None:
+            table = self.years[year] = self._build(year)
+        return table
+
+    def _select(self, year):
+        transitions, offsets = self.table(year)
+        self.selected = selected = (transitions[0], int(datetime(year + 1, 1, 1, tzinfo=timezone.utc).timestamp()),
+                                    transitions, offsets)
+        return selected
+
+    def _build(self, year):
+        start = int(datetime(year, 1, 1, tzinfo=timezone.utc).timestamp())
+        end = int(datetime(year + 1, 1, 1, tzinfo=timezone.utc).timestamp())
+        transitions = [start]
+        offsets = [utc_offset(self.zone, start)]
+        previous = start
+        for sample in range(start + DAY, end + DAY, DAY):
+            sample = min(sample, end - 1)
+            value = utc_offset(self.zone, sample)
+            if value != offsets[-1]:
+                # the offset changed in (previous, sample], find the first second with the new offset
+                low, high = previous, sample
+                while high - low > 1:
+                    middle = (low + high) // 2
+                    if utc_offset(self.zone, middle) == value:
+                        high = middle
+                    else:
+                        low = middle
+                transitions.append(high)
+                offsets.append(value)
+            previous = sample
+        return transitions, offsets
+
+
+def zone_table(zone):
+    """
+    Returns the shared ZoneTable of a tzinfo
+    """
+    table = _tables.get(id(zone))
+    if table is None or table.zone is not zone:
+        if len(_tables) >= MAX_TABLES:
+            _tables.clear()
+        table = _tables[id(zone)] = ZoneTable(zone)
+    return table
+
+
+def to_local(epoch, zone):
+    """
+    Converts UTC epoch seconds to wall-clock seconds of a zone, None stands for UTC
+    """
+    if zone is None:
+        return epoch
+    return zone_table(zone).local(epoch)
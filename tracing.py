@@ -0,0 +1,269 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import caldav
+
+# upper bounds of the histogram buckets in milliseconds, the last bucket is unbounded
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+# intent handler the current span belongs to, propagated to the worker threads by ContextExecutor
+current_intent = contextvars.ContextVar('current_intent', default=None)
+
+
+class Histogram:
+    """
+    Duration histogram of one span name and intent with fixed buckets
+    """
+    __slots__ = ('counts', 'count', 'total', 'minimum', 'maximum')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.minimum = None
+        self.maximum = None
+
+    def record(self, milliseconds):
+        self.counts[bisect_left(BUCKETS_MS, milliseconds)] += 1
+        self.count += 1
+        self.total += milliseconds
+        if self.minimum is None or milliseconds < self.minimum:
+            self.minimum = milliseconds
+        if self.maximum is None or milliseconds > self.maximum:
+            self.maximum = milliseconds
+
+    def percentile(self, fraction):
+        """
+        Returns the upper bound of the bucket that contains the given fraction of the durations
+        """
+        threshold = fraction * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if seen >= threshold:
+                return bound
+        return self.maximum
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': round(self.total, 3),
+            'min_ms': self.minimum,
+            'max_ms': self.maximum,
+            'p50_ms': self.percentile(0.5),
+            'p95_ms': self.percentile(0.95),
+            'buckets': dict(zip([str(bound) for bound in BUCKETS_MS] + ['inf'], self.counts)),
+        }
+
+
+class Span:
+    """
+    Measures the duration of a block and records it in the histogram of its name and intent
+    """
+    __slots__ = ('tracer', 'name', 'started')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.started = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.record(self.name, (time.perf_counter() - self.started) * 1000)
+        return False
+
+
+class NullSpan:
+    """
+    Span of a disabled tracer, does nothing
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+
+class IntentScope:
+    """
+    Tags the spans of a block with the name of an intent handler and measures the whole handler
+    """
+    __slots__ = ('tracer', 'name', 'token', 'span')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.token = None
+        self.span = None
+
+    def __enter__(self):
+        self.token = current_intent.set(self.name)
+        self.span = self.tracer.span('intent')
+        self.span.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.span.__exit__(*exc_info)
+        current_intent.reset(self.token)
+        return False
+
+
+class Tracer:
+    """
+    Collects latency histograms of timing spans, e.g. of the requests, parsing and formatting of an intent.
+    Each span is recorded under its name and the intent handler it ran for. A disabled tracer returns a
+    shared no-op span, so the instrumentation costs one attribute check when tracing is off.
+
+        with tracer.intent('get_next_appointment'):
+            with tracer.span('parse'):
+                ...
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        # (span name, intent) -> Histogram
+        self.histograms = {}
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+
+    def span(self, name):
+        """
+        Returns a context manager that measures a block
+
+        Args:
+            :param name: name of the measured step, e.g. parse or caldav.REPORT
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name)
+
+    def intent(self, name):
+        """
+        Returns a context manager that tags all spans of a block, also the ones in worker threads
+        of a ContextExecutor, with the name of an intent handler
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        return IntentScope(self, name)
+
+    def record(self, name, milliseconds):
+        key = (name, current_intent.get())
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.record(milliseconds)
+
+    def snapshot(self):
+        """
+        Returns the histograms as list of dicts with name and intent
+        """
+        with self.lock:
+            items = sorted(self.histograms.items(), key=lambda item: (item[0][1] or '', item[0][0]))
+            return [dict(name=name, intent=intent, **histogram.to_dict()) for (name, intent), histogram in items]
+
+    def export(self, path):
+        """
+        Writes the histograms to a JSON file
+        """
+        try:
+            with open(path, 'w') as f:
+                json.dump({'exported': time.strftime('%Y-%m-%dT%H:%M:%S'), 'spans': self.snapshot()}, f, indent=2)
+        except OSError as e:
+            logging.error(f"Span histograms could not be exported to {path}: {e}")
+
+    def prometheus_text(self):
+        """
+        Returns the histograms in the Prometheus text exposition format
+        """
+        lines = ['# TYPE calendar_skill_span_milliseconds histogram']
+        for histogram in self.snapshot():
+            labels = f'span="{histogram["name"]}",intent="{histogram["intent"] or ""}"'
+            cumulative = 0
+            for bound, count in histogram['buckets'].items():
+                cumulative += count
+                le = '+Inf' if bound == 'inf' else bound
+                lines.append(f'calendar_skill_span_milliseconds_bucket{{{labels},le="{le}"}} {cumulative}')
+            lines.append(f"calendar_skill_span_milliseconds_sum{{{labels}}} {histogram['total_ms']}")
+            lines.append(f"calendar_skill_span_milliseconds_count{{{labels}}} {histogram['count']}")
+        return '\n'.join(lines) + '\n'
+
+
+# tracer of the skill, disabled until the tracing setting is switched on
+tracer = Tracer()
+
+
+class ContextExecutor(ThreadPoolExecutor):
+    """
+    ThreadPoolExecutor that runs the submitted functions in the context of the submitting thread,
+    so spans of the workers are tagged with the intent that started them
+    """
+
+    def submit(self, fn, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+class TracedDAVClient(caldav.DAVClient):
+    """
+    DAVClient that measures every request in a span named after its method, e.g. caldav.REPORT
+    """
+
+    def request(self, url, method="GET", body="", headers={}):
+        with tracer.span(f"caldav.{method}"):
+            return super().request(url, method, body, headers)
+
+
+class MetricsServer:
+    """
+    Serves the histograms of a tracer in the Prometheus text format at http://<host>:<port>/metrics
+    """
+
+    def __init__(self, tracer, port, host='127.0.0.1'):
+        source = tracer
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] != '/metrics':
+                    self.send_error(404)
+                    return
+                body = source.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name='metrics', daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()